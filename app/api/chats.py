@@ -1,11 +1,22 @@
+from typing import Optional
 from fastapi.routing import APIRouter
-from fastapi import Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.deps import get_current_user
-from app.models.db_models import User
-from app.models.chats import ChatCreate, ChatOut
-from app.models.db_models import Chat, File
+from fastapi import Depends, HTTPException, Query
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session, contains_eager, load_only
+from app.core.deps import CurrentUser, get_current_user
+from app.core.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+)
+from app.models.chats import ChatCreate, ChatOut, ChatPage
+from app.models.db_models import Chat, Connection, File
 from app.core.database import get_db
+from app.services.agent_session_cache import AgentSessionCache
+from app.services.file_store import FileStore
+from app.services.plan_memo import PlanMemo
+from app.services.plot_store import PlotStore
 
 router = APIRouter()
 
@@ -13,7 +24,7 @@ router = APIRouter()
 @router.post("/chats", response_model=ChatOut, status_code=201)
 def create_chat(
     chat: ChatCreate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     file = (
@@ -35,24 +46,54 @@ def create_chat(
         raise HTTPException(500)
 
 
-@router.get("/chats", response_model=list[ChatOut])
+@router.get("/chats", response_model=ChatPage)
 def get_my_chats(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    q: Optional[str] = Query(None, max_length=255),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-
-    chats = (
+    """
+    The user's chats, newest first, one keyset page at a time. `q` matches
+    the displayed title (the chat's own, else its file or connection name).
+    """
+    # File and connection names come in the same query as the chats
+    query = (
         db.query(Chat)
+        .outerjoin(Chat.file)
+        .outerjoin(Chat.connection)
+        .options(
+            load_only(Chat.id, Chat.title, Chat.file_id, Chat.connection_id, Chat.created_at),
+            contains_eager(Chat.file).load_only(File.file_path, File.filename),
+            contains_eager(Chat.connection).load_only(Connection.name),
+        )
         .filter(Chat.user_id == current_user.id)
-        .order_by(Chat.created_at.desc())
-        .all()
     )
+    if q:
+        query = query.filter(
+            func.coalesce(Chat.title, File.filename, Connection.name).icontains(
+                q, autoescape=True
+            )
+        )
+    if cursor:
+        created_at, chat_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Chat.created_at, Chat.id) < (created_at, chat_id))
+
+    # One extra row tells whether another page follows
+    chats = query.order_by(Chat.created_at.desc(), Chat.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = encode_cursor(chats[-1].created_at, chats[-1].id)
 
     result = []
     for chat in chats:
         chat_data = {
             "id": chat.id,
             "title": chat.title
-            or (chat.file.filename if chat.file else "Untitled Chat"),
+            or (chat.file.filename if chat.file else None)
+            or (chat.connection.name if chat.connection else "Untitled Chat"),
             "file_id": chat.file_id,
             "connection_id": chat.connection_id,
             "created_at": chat.created_at,
@@ -62,17 +103,18 @@ def get_my_chats(
                 if chat.file
                 else None
             ),
+            "connection": {"name": chat.connection.name} if chat.connection else None,
         }
         result.append(chat_data)
 
-    return result
+    return {"chats": result, "next_cursor": next_cursor}
 
 
 @router.get("/chats/{chat_id}/dossier")
 def get_chat_dossier(
     chat_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     chat = (
         db.query(Chat)
@@ -98,7 +140,7 @@ def get_chat_dossier(
 def delete_chat(
     chat_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     chat = (
         db.query(Chat)
@@ -108,18 +150,53 @@ def delete_chat(
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
+    # Collect what the chat references before the rows are gone
+    db_file = chat.file
+    plot_urls = set()
+    for message in chat.messages:
+        plot_urls |= PlotStore.plot_urls_in_steps(message.steps)
+
     db.delete(chat)
+    db.flush()
+
+    # The upload goes with its last chat; its parquet only with the last
+    # upload of the same content (see FileStore)
+    removed_path = None
+    if (
+        db_file is not None
+        and db.query(Chat).filter(Chat.file_id == db_file.id).count() == 0
+    ):
+        db.delete(db_file)
+        # text() statements don't autoflush, and the files row references
+        # its blob until the delete is written
+        db.flush()
+        if db_file.content_sha256:
+            removed_path = FileStore().release(
+                db, db_file.user_id, db_file.content_sha256
+            )
+        else:
+            removed_path = "data/" + db_file.file_path
     db.commit()
 
-    # get file path to invalidate cache & delete from disk
-    file_path = "data/" + chat.file.file_path
-    if file_path:
+    # Drop charts that no other message points at
+    PlotStore().release(db, plot_urls)
+
+    AgentSessionCache().invalidate_chat(chat_id)
+
+    # invalidate cache & delete data file from disk
+    if removed_path:
         from app.services.excel_agent_cache import DataCache
 
+        from app.services.code_sandbox import SandboxPool
+
         cache = DataCache()
-        cache.invalidate(file_path)
+        cache.invalidate(removed_path)
+        # Workers forked while the frame was cached still pin its memory
+        SandboxPool().recycle_stale()
+        AgentSessionCache().invalidate_source(removed_path)
+        PlanMemo().invalidate_dataset(removed_path)
 
         import os
 
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if os.path.exists(removed_path):
+            os.remove(removed_path)
@@ -1,16 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine.url import URL
 from sqlalchemy.orm import Session
-from app.core.deps import get_current_user
-from app.models.db_models import Chat, Dossier, User
-from app.models.connections import ConnectionCreate, ConnectionOut
+from app.core.deps import CurrentUser, get_current_user
+from app.models.db_models import Chat, Dossier
+from app.models.connections import ConnectionCreate
 from app.models.db_models import Connection
-from app.core.database import get_db
+from app.models.jobs import JobAccepted
+from app.core.database import SessionLocal, get_db
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 import os
 
+from app.services.job_runner import JobContext, JobRunner
 from app.services.sql_agent import SQLAgent
 
 load_dotenv()
@@ -25,83 +27,60 @@ fernet = Fernet(
 )
 
 
-@router.post("/connections", response_model=ConnectionOut, status_code=201)
-def create_connection(
-    connection: ConnectionCreate,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    print("DEBUG: Received connection details:", connection)
-    url = URL.create(
-        drivername=connection.drivername,
-        username=connection.username,
-        password=connection.password,
-        host=connection.host,
-        port=connection.port,
-        database=connection.database,
-    )
-
-    try:
-        engine = create_engine(url)
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-    except Exception as conn_err:
-        print(
-            f"DEBUG: Failed to connect to database: {type(conn_err).__name__}: {str(conn_err)}"
-        )
-        raise HTTPException(status_code=400, detail="Invalid connection details")
-    finally:
-        if "engine" in locals():
-            engine.dispose()
-
-    ## DO ANALYSIS AND CREATE DOSSIER
-    try:
-        agent = SQLAgent(url.render_as_string(hide_password=False))
-        print(
-            f"DEBUG: Successfully initialized SQLAgent for connection: {connection.name}"
-        )
-    except Exception as agent_init_err:
-        print(
-            f"DEBUG: Failed to initialize SQLAgent: {type(agent_init_err).__name__}: {str(agent_init_err)}"
-        )
-        import traceback
-
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=400,
-            detail=f"Failed to connect to database: {str(agent_init_err)}",
-        )
-
-    dossier = {}
-    try:
-        dossier = agent.generate_dossier()
-        print(
-            f"DEBUG: Successfully generated dossier for connection: {connection.name}"
-        )
-    except Exception as dossier_err:
-        print(
-            f"DEBUG: Failed to generate dossier: {type(dossier_err).__name__}: {str(dossier_err)}"
-        )
-        import traceback
+def _create_connection(job: JobContext):
+    """
+    Job handler: verify the connection, infer its semantic schema, write the
+    dossier, then save connection, dossier and chat together.
+    """
+    payload = job.payload
+    url = fernet.decrypt(payload["connection_string"].encode()).decode()
+
+    with job.stage("connect"):
+        try:
+            engine = create_engine(url)
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as conn_err:
+            print(
+                f"DEBUG: Failed to connect to database: {type(conn_err).__name__}: {str(conn_err)}"
+            )
+            raise ValueError("Invalid connection details")
+        finally:
+            if "engine" in locals():
+                engine.dispose()
+
+    with job.stage("infer"):
+        try:
+            agent = SQLAgent(url)
+            print(
+                f"DEBUG: Successfully initialized SQLAgent for connection: {payload['name']}"
+            )
+        except Exception as agent_init_err:
+            print(
+                f"DEBUG: Failed to initialize SQLAgent: {type(agent_init_err).__name__}: {str(agent_init_err)}"
+            )
+            raise ValueError(f"Failed to connect to database: {str(agent_init_err)}")
 
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=400, detail="Failed to retrieve tables from the database"
+    with job.stage("dossier"):
+        try:
+            dossier = agent.generate_dossier()
+            print(
+                f"DEBUG: Successfully generated dossier for connection: {payload['name']}"
+            )
+        except Exception as dossier_err:
+            print(
+                f"DEBUG: Failed to generate dossier: {type(dossier_err).__name__}: {str(dossier_err)}"
+            )
+            raise ValueError("Failed to retrieve tables from the database")
+
+    with job.stage("save"), SessionLocal() as db:
+        new_connection = Connection(
+            user_id=job.user_id,
+            name=payload["name"],
+            engine=payload["drivername"],
+            connection_string=payload["connection_string"],
         )
-
-    encrypted_url = fernet.encrypt(
-        url.render_as_string(hide_password=False).encode()
-    ).decode()
-
-    new_connection = Connection(
-        user_id=user.id,
-        name=connection.name,
-        engine=connection.drivername,
-        connection_string=encrypted_url,
-    )
-
-    try:
-        with db.begin_nested():  # start a transaction
+        try:
             db.add(new_connection)
             db.flush()
 
@@ -115,28 +94,67 @@ def create_connection(
             db.flush()
 
             new_chat = Chat(
-                user_id=user.id,
+                user_id=job.user_id,
                 connection_id=new_connection.id,
                 dossier_id=new_dossier.id,
-                title=f"Analysis: {connection.name}",
+                title=f"Analysis: {payload['name']}",
             )
             db.add(new_chat)
-        db.commit()
-        db.refresh(new_connection)
+            db.commit()
+        except Exception as save_err:
+            print(
+                f"DEBUG: Failed to save connection data: {type(save_err).__name__}: {str(save_err)}"
+            )
+            db.rollback()
+            raise ValueError("Failed to save connection data")
+
         return {
-            "connection_id": new_connection.id,
-            "name": new_connection.name,
-            "host": connection.host,
-            "database": connection.database,
+            "connection_id": str(new_connection.id),
+            "chat_id": str(new_chat.id),
+            "name": payload["name"],
+            "host": payload["host"],
+            "database": payload["database"],
             "status": "connected",
         }
 
-    except Exception as save_err:
-        print(
-            f"DEBUG: Failed to save connection data: {type(save_err).__name__}: {str(save_err)}"
-        )
-        import traceback
 
-        traceback.print_exc()
-        db.rollback()
-        raise HTTPException(status_code=500, detail="Failed to save connection data")
+JobRunner().register("create_connection", _create_connection)
+
+
+@router.post("/connections", response_model=JobAccepted, status_code=202)
+def create_connection(
+    connection: ConnectionCreate,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Queue onboarding and return at once; follow it at the job's events URL,
+    whose final event carries the ConnectionOut fields plus chat_id.
+    """
+    print("DEBUG: Received connection request:", connection.name)
+    url = URL.create(
+        drivername=connection.drivername,
+        username=connection.username,
+        password=connection.password,
+        host=connection.host,
+        port=connection.port,
+        database=connection.database,
+    )
+
+    # Credentials only ever reach the job table encrypted
+    encrypted_url = fernet.encrypt(
+        url.render_as_string(hide_password=False).encode()
+    ).decode()
+    job_id = JobRunner().submit(
+        db,
+        user.id,
+        "create_connection",
+        {
+            "name": connection.name,
+            "drivername": connection.drivername,
+            "host": connection.host,
+            "database": connection.database,
+            "connection_string": encrypted_url,
+        },
+    )
+    return {"job_id": job_id, "status": "queued", "events_url": f"/jobs/{job_id}/events"}
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import uuid
 import pandas as pd
@@ -5,11 +6,15 @@ import aiofiles
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.deps import get_current_user
-from app.models.db_models import User, File as DBFile, Dossier, Chat
+from app.core.database import SessionLocal, get_db
+from app.core.deps import CurrentUser, get_current_user
+from app.models.db_models import File as DBFile, Dossier, Chat
+from app.models.jobs import JobAccepted
 from app.services.excel_agent import ExcelDataAgent
-from app.services.ingestion import _transform_to_parquet
+from app.services.excel_agent_cache import DataCache
+from app.services.file_store import FileStore
+from app.services.job_runner import JobContext, JobRunner
+from app.services.out_of_core import is_out_of_core
 
 router = APIRouter()
 
@@ -18,7 +23,7 @@ router = APIRouter()
 async def upload_file(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
 ):
     file_ext = os.path.splitext(file.filename)[1].lower()
     if file_ext not in [".csv", ".xlsx"]:
@@ -30,31 +35,46 @@ async def upload_file(
     os.makedirs("data", exist_ok=True)
     temp_path = f"data/{temp_filename}"
 
-    # 2. Async Stream Write (Non-Blocking I/O)
+    # 2. Async Stream Write (Non-Blocking I/O), hashing as the chunks go by
+    digest = hashlib.sha256()
+    size_bytes = 0
     try:
         async with aiofiles.open(temp_path, "wb") as out_file:
             while content := await file.read(1024 * 1024):  # 1MB Chunks
+                digest.update(content)
+                size_bytes += len(content)
                 await out_file.write(content)
     except Exception as e:
         if os.path.exists(temp_path):
             os.remove(temp_path)
         raise HTTPException(status_code=500, detail="File upload stream failed.")
 
+    # 3. Identical content from the same user reuses the stored parquet
     try:
         metadata = await run_in_threadpool(
-            _transform_to_parquet, temp_path, file.filename
+            FileStore().acquire,
+            db,
+            user.id,
+            digest.hexdigest(),
+            size_bytes,
+            temp_path,
+            file.filename,
         )
     except ValueError as ve:
+        db.rollback()
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"File processing failed: {str(e)}")
 
     new_file = DBFile(
         filename=file.filename,  # Original User Filename
         user_id=user.id,
-        file_path=metadata["filename"],  # Optimized Parquet Filename
+        file_path=metadata["filename"],  # Content-addressed Parquet Filename
+        file_size_bytes=size_bytes,
         row_count=metadata["rows"],
         columns=metadata["columns"],
+        content_sha256=digest.hexdigest(),
     )
 
     db.add(new_file)
@@ -69,49 +89,94 @@ async def upload_file(
     }
 
 
-@router.post("/files/{file_id}/analyze")
-def analyze_file(
-    file_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)
-):
-    db_file = (
-        db.query(DBFile).filter(DBFile.id == file_id, DBFile.user_id == user.id).first()
-    )
-    if not db_file:
-        raise HTTPException(status_code=404, detail="File not found")
+def _analyze_file(job: JobContext):
+    """Job handler: profile an uploaded file, write its dossier and open a chat."""
+    with SessionLocal() as db:
+        db_file = (
+            db.query(DBFile)
+            .filter(DBFile.id == job.payload["file_id"], DBFile.user_id == job.user_id)
+            .first()
+        )
+        if not db_file:
+            raise ValueError("File not found")
 
-    try:
         full_path = f"data/{db_file.file_path}"
         if not os.path.exists(full_path):
-            raise HTTPException(
-                status_code=404, detail="Physical file missing on server."
+            raise ValueError("Physical file missing on server.")
+
+        streamed = is_out_of_core(full_path)
+        with job.stage("ingest", rows=db_file.row_count, streamed=streamed):
+            if not streamed:
+                DataCache().get_data(full_path)
+        with job.stage("profile"):
+            agent = ExcelDataAgent(file_path=full_path)
+        # Identical content this user already had briefed: reuse it
+        shared = None
+        if db_file.content_sha256:
+            shared = (
+                db.query(Dossier)
+                .join(DBFile, Dossier.file_id == DBFile.id)
+                .filter(
+                    DBFile.user_id == db_file.user_id,
+                    DBFile.content_sha256 == db_file.content_sha256,
+                    DBFile.id != db_file.id,
+                )
+                .order_by(Dossier.created_at.desc())
+                .first()
+            )
+        with job.stage("dossier", reused=shared is not None):
+            if shared is not None:
+                dossier_data = {
+                    "briefing": shared.briefing,
+                    "key_entities": shared.key_entities or [],
+                    "recommended_actions": shared.recommended_actions or [],
+                }
+            else:
+                dossier_data = agent.generate_dossier()
+
+        with job.stage("save"):
+            new_dossier = Dossier(
+                file_id=db_file.id,
+                briefing=dossier_data.get("briefing", "No briefing generated."),
+                key_entities=dossier_data.get("key_entities", []),
+                recommended_actions=dossier_data.get("recommended_actions", []),
+            )
+            db.add(new_dossier)
+            db.flush()
+
+            new_chat = Chat(
+                user_id=db_file.user_id,
+                file_id=db_file.id,
+                dossier_id=new_dossier.id,
+                title=f"Analysis: {db_file.filename}",
             )
+            db.add(new_chat)
+            db.commit()
+            db.refresh(new_chat)
 
-        agent = ExcelDataAgent(file_path=full_path)
-        dossier_data = agent.generate_dossier()
-        schema = agent.schema
+    return {"status": "complete", "chat_id": str(new_chat.id), "dossier": dossier_data}
 
-    except Exception as e:
-        print(f"AI Error: {e}")
-        raise HTTPException(status_code=500, detail=f"AI Analysis failed: {str(e)}")
-
-    new_dossier = Dossier(
-        file_id=db_file.id,
-        briefing=dossier_data.get("briefing", "No briefing generated."),
-        key_entities=dossier_data.get("key_entities", []),
-        recommended_actions=dossier_data.get("recommended_actions", []),
-    )
-    db.add(new_dossier)
-    db.commit()
-    db.refresh(new_dossier)
 
-    new_chat = Chat(
-        user_id=user.id,
-        file_id=db_file.id,
-        dossier_id=new_dossier.id,
-        title=f"Analysis: {db_file.filename}",
+JobRunner().register("analyze_file", _analyze_file)
+
+
+@router.post("/files/{file_id}/analyze", response_model=JobAccepted, status_code=202)
+def analyze_file(
+    file_id: str,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Queue the analysis and return at once; follow it at the job's events
+    URL, whose final event carries {"chat_id", "dossier"}.
+    """
+    db_file = (
+        db.query(DBFile).filter(DBFile.id == file_id, DBFile.user_id == user.id).first()
     )
-    db.add(new_chat)
-    db.commit()
-    db.refresh(new_chat)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not os.path.exists(f"data/{db_file.file_path}"):
+        raise HTTPException(status_code=404, detail="Physical file missing on server.")
 
-    return {"status": "complete", "chat_id": str(new_chat.id), "dossier": dossier_data}
+    job_id = JobRunner().submit(db, user.id, "analyze_file", {"file_id": str(db_file.id)})
+    return {"job_id": job_id, "status": "queued", "events_url": f"/jobs/{job_id}/events"}
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from uuid import UUID
+from app.core.database import get_db
+from app.core.deps import CurrentUser, get_current_user
+from app.models.db_models import Job
+from app.models.jobs import JobOut
+from app.services.job_runner import JobRunner
+
+router = APIRouter()
+
+
+def _get_job(db: Session, job_id: UUID, user: CurrentUser) -> Job:
+    job = db.query(Job).filter(Job.id == job_id, Job.user_id == user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+def get_job(
+    job_id: UUID,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    return _get_job(db, job_id, user)
+
+
+@router.get("/jobs/{job_id}/events")
+def stream_job_events(
+    job_id: UUID,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    """
+    NDJSON progress: one {"type": "stage", "stage", "status"} event per
+    stage transition (including those already past), then a final
+    {"type": "job", "status", "result", "error"} event.
+    """
+    job = _get_job(db, job_id, user)
+    return StreamingResponse(
+        JobRunner().stream(str(job.id)), media_type="application/x-ndjson"
+    )
@@ -1,16 +1,28 @@
-import asyncio
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, tuple_
 from sqlalchemy.orm import Session
+from typing import Optional
 from uuid import UUID
 from app.core.database import SessionLocal, get_db
-from app.core.deps import get_current_user
-from app.models.db_models import User, Chat, Message
-from app.models.messages import MessageCreate, MessageOut
+from app.core.deps import CurrentUser, get_current_user
+from app.core.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+)
+from app.models.db_models import Chat, Message
+from app.models.messages import MessageCreate, MessageDetail, MessageOut, MessagePage
+from app.services.agent_session_cache import AgentSessionCache
 from app.services.excel_agent import ExcelDataAgent
 from app.services.sql_agent import SQLAgent
+from app.services.telemetry import traced_events
+from app.services.token_usage import TokenLedger, attributed, budget_status
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
+import hashlib
 import json
 import os
 
@@ -25,27 +37,133 @@ fernet = Fernet(
 
 router = APIRouter()
 
+# Assistant rows written before steps and code had their own columns kept the
+# whole result, json.dumps({"text", "steps", "code"}), in content
+_LEGACY_PREFIX = '{"text": '
+
+
+def _build_agent(chat: Chat):
+    """Build the agent for a chat. Returns (agent, code_type)."""
+    chat_id = chat.id
+    if chat.file_id:
+        return ExcelDataAgent("data/" + chat.file.file_path), "python"
+
+    try:
+        encrypted_conn_str = chat.connection.connection_string
+        # Handle both string and bytes
+        if isinstance(encrypted_conn_str, str):
+            encrypted_conn_str = encrypted_conn_str.encode()
+        decrypted_conn_str = fernet.decrypt(encrypted_conn_str).decode()
+        print(f"DEBUG: Successfully decrypted connection string for chat {chat_id}")
+    except Exception as decrypt_err:
+        print(
+            f"DEBUG: Failed to decrypt connection for chat {chat_id}: {type(decrypt_err).__name__}: {str(decrypt_err)}"
+        )
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to decrypt connection: {str(decrypt_err)}",
+        )
+
+    try:
+        agent = SQLAgent(decrypted_conn_str)
+        print(f"DEBUG: Successfully initialized SQLAgent for chat {chat_id}")
+    except Exception as agent_err:
+        print(
+            f"DEBUG: Failed to initialize SQLAgent for chat {chat_id}: {type(agent_err).__name__}: {str(agent_err)}"
+        )
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to connect to database: {str(agent_err)}",
+        )
+    return agent, "sql"
+
+
+def _owned_chat(db: Session, chat_id: UUID, user: CurrentUser) -> Chat:
+    chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user.id).first()
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return chat
+
+
+def _message_text(role: str, content: str) -> str:
+    """Answer text of a message, also for rows that still store the full result JSON."""
+    if role == "assistant" and content.startswith(_LEGACY_PREFIX):
+        try:
+            return json.loads(content).get("text", content)
+        except ValueError:
+            pass
+    return content
+
 
-@router.get("/messages/{chat_id}", response_model=list[MessageOut])
+@router.get("/messages/{chat_id}", response_model=MessagePage)
 def get_chat_history(
     chat_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    chat = (
-        db.query(Chat)
-        .filter(Chat.id == chat_id, Chat.user_id == current_user.id)
-        .first()
+    """
+    The latest page of a chat's messages, oldest first; `next_cursor` pages
+    back in time. Step results are left out; fetch them per message from
+    /messages/{chat_id}/{message_id}/steps.
+    """
+    _owned_chat(db, chat_id, current_user)
+
+    step_count = case(
+        (func.jsonb_typeof(Message.steps) == "array", func.jsonb_array_length(Message.steps)),
+        else_=0,
     )
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found")
+    query = db.query(
+        Message.id,
+        Message.role,
+        Message.created_at,
+        Message.content,
+        step_count.label("step_count"),
+    ).filter(Message.chat_id == chat_id)
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Message.created_at, Message.id) < (created_at, message_id))
 
-    return (
-        db.query(Message)
-        .filter(Message.chat_id == chat_id)
-        .order_by(Message.created_at.asc())
-        .all()
+    # One extra row tells whether older messages remain
+    rows = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    # Older rows stored the whole result as JSON in content: send only its
+    # text. Parsed here, not cast in SQL, so one malformed row cannot fail
+    # the page.
+    return {
+        "messages": [
+            {**row._asdict(), "content": _message_text(row.role, row.content)}
+            for row in reversed(rows)
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/messages/{chat_id}/{message_id}/steps", response_model=MessageDetail)
+def get_message_steps(
+    chat_id: UUID,
+    message_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    _owned_chat(db, chat_id, current_user)
+    message = (
+        db.query(Message.id, Message.steps, Message.related_code)
+        .filter(Message.id == message_id, Message.chat_id == chat_id)
+        .first()
     )
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {
+        "id": message.id,
+        "steps": message.steps if isinstance(message.steps, list) else [],
+        "related_code": message.related_code,
+    }
 
 
 @router.post("/messages/{chat_id}", response_model=MessageOut)
@@ -53,15 +171,16 @@ async def send_message(
     chat_id: UUID,
     msg_data: MessageCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    chat = (
-        db.query(Chat)
-        .filter(Chat.id == chat_id, Chat.user_id == current_user.id)
-        .first()
-    )
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found")
+    chat = _owned_chat(db, chat_id, current_user)
+
+    budget = budget_status(db, current_user.id)
+    if budget["state"] == "exhausted":
+        raise HTTPException(
+            status_code=429,
+            detail="Daily token budget exhausted. It resets at midnight UTC.",
+        )
 
     chat_history = (
         db.query(Message)
@@ -73,13 +192,7 @@ async def send_message(
 
     history_str = ""
     for msg in reversed(chat_history):
-        content = msg.content
-        if str(msg.role) == "assistant":
-            try:
-                content_dict = json.loads(str(msg.content))
-                content = content_dict.get("text", msg.content)
-            except Exception as parse_err:
-                print(f"DEBUG: Failed to parse assistant message content: {parse_err}")
+        content = _message_text(msg.role, msg.content)
         content = content[:300] + ("..." if len(content) > 300 else "")
         history_str += f"{msg.role.capitalize()}: {content}\n"
 
@@ -89,57 +202,47 @@ async def send_message(
     db.commit()
     db.refresh(user_msg)
 
-    code_type = "python"
-
     if chat.file_id:
         path = "data/" + chat.file.file_path
         if os.path.exists(path) is False:
             raise HTTPException(
                 status_code=404, detail="Data file not found on server."
             )
-        agent = ExcelDataAgent(path)
+        source_key = path
     elif chat.connection_id:
-        code_type = "sql"
         if not chat.connection.connection_string:
             raise HTTPException(status_code=404, detail="Connection details not found.")
-        try:
-            encrypted_conn_str = chat.connection.connection_string
-            # Handle both string and bytes
-            if isinstance(encrypted_conn_str, str):
-                encrypted_conn_str = encrypted_conn_str.encode()
-            decrypted_conn_str = fernet.decrypt(encrypted_conn_str).decode()
-            print(f"DEBUG: Successfully decrypted connection string for chat {chat_id}")
-        except Exception as decrypt_err:
-            print(
-                f"DEBUG: Failed to decrypt connection for chat {chat_id}: {type(decrypt_err).__name__}: {str(decrypt_err)}"
-            )
-            raise HTTPException(
-                status_code=400,
-                detail=f"Failed to decrypt connection: {str(decrypt_err)}",
-            )
-
-        print("DEBUG: decrypted conn str: ", decrypted_conn_str)
-        try:
-            agent = SQLAgent(decrypted_conn_str)
-            print(f"DEBUG: Successfully initialized SQLAgent for chat {chat_id}")
-        except Exception as agent_err:
-            print(
-                f"DEBUG: Failed to initialize SQLAgent for chat {chat_id}: {type(agent_err).__name__}: {str(agent_err)}"
-            )
-            raise HTTPException(
-                status_code=400,
-                detail=f"Failed to connect to database: {str(agent_err)}",
-            )
+        # Fingerprint of the stored secret: a changed connection misses the cache
+        fingerprint = hashlib.sha256(
+            str(chat.connection.connection_string).encode()
+        ).hexdigest()[:16]
+        source_key = f"connection:{chat.connection_id}:{fingerprint}"
     else:
         raise HTTPException(
             status_code=400, detail="Chat has no associated file or connection."
         )
 
+    agent, code_type = await run_in_threadpool(
+        AgentSessionCache().get_or_create,
+        str(chat_id),
+        source_key,
+        lambda: _build_agent(chat),
+    )
+
     async def _event_generator():
         final_response = {"text": "", "steps": [], "code": None}
 
         try:
-            for chunk in agent.answer(msg_data.content, history_str):
+            # Run the agent off the event loop so one slow answer cannot stall others
+            events = attributed(
+                agent.answer(msg_data.content, history_str),
+                user_id=current_user.id,
+                chat_id=chat_id,
+                economy=budget["state"] == "economy",
+            )
+            async for chunk in iterate_in_threadpool(
+                traced_events(events, agent=code_type)
+            ):
                 yield chunk + "\n"
 
                 try:
@@ -153,20 +256,12 @@ async def send_message(
                 except Exception as chunk_err:
                     print(f"DEBUG: Failed to parse chunk: {chunk_err}")
 
-                # Tiny sleep to ensure the loop yields control
-                await asyncio.sleep(0.01)
-
             with SessionLocal() as db_session:
                 assistant_msg = Message(
                     chat_id=chat_id,
                     role="assistant",
-                    content=json.dumps(
-                        {
-                            "text": final_response["text"],
-                            "steps": final_response["steps"],
-                            "code": final_response["code"],
-                        }
-                    ),
+                    # Steps and code have their own columns; content is the text only
+                    content=final_response["text"],
                     related_code={"type": code_type, "code": final_response["code"]},
                     steps=final_response["steps"],
                 )
@@ -174,6 +269,12 @@ async def send_message(
                 db_session.commit()
                 db_session.refresh(assistant_msg)
 
+                try:
+                    TokenLedger().flush(db_session)
+                except Exception as usage_err:
+                    # Kept buffered; the periodic flush retries
+                    print(f"USAGE: Flush failed: {usage_err}")
+
                 yield json.dumps({"type": "final", "message_id": str(assistant_msg.id)})
 
         except Exception as e:
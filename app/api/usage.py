@@ -0,0 +1,88 @@
+import datetime
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.core.deps import CurrentUser, get_current_user
+from app.models.db_models import Chat, TokenUsage
+from app.models.usage import UsageReport
+from app.services.token_usage import TokenLedger, budget_status
+
+router = APIRouter()
+
+_SUMS = (
+    func.coalesce(func.sum(TokenUsage.calls), 0),
+    func.coalesce(func.sum(TokenUsage.prompt_tokens), 0),
+    func.coalesce(func.sum(TokenUsage.completion_tokens), 0),
+    func.coalesce(func.sum(TokenUsage.cost_usd), 0),
+)
+
+
+def _breakdown(calls, prompt_tokens, completion_tokens, cost_usd, **extra):
+    return {
+        **extra,
+        "calls": int(calls),
+        "prompt_tokens": int(prompt_tokens),
+        "completion_tokens": int(completion_tokens),
+        "total_tokens": int(prompt_tokens) + int(completion_tokens),
+        "cost_usd": round(float(cost_usd), 6),
+    }
+
+
+@router.get("/usage", response_model=UsageReport)
+def get_usage(
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    """Token and cost breakdown for the current user over the last `days` days."""
+    try:
+        # Include calls still buffered in this process
+        TokenLedger().flush(db)
+    except Exception as e:
+        print(f"USAGE: Flush failed: {e}")
+
+    since = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(
+        days=days - 1
+    )
+    scope = (TokenUsage.user_id == user.id, TokenUsage.usage_date >= since)
+
+    def grouped(column):
+        return (
+            db.query(column, *_SUMS)
+            .filter(*scope)
+            .group_by(column)
+            .order_by((_SUMS[1] + _SUMS[2]).desc())
+            .all()
+        )
+
+    by_chat = (
+        db.query(TokenUsage.chat_id, Chat.title, *_SUMS)
+        .outerjoin(Chat, Chat.id == TokenUsage.chat_id)
+        .filter(*scope)
+        .group_by(TokenUsage.chat_id, Chat.title)
+        .order_by((_SUMS[1] + _SUMS[2]).desc())
+        .all()
+    )
+    by_day = (
+        db.query(TokenUsage.usage_date, *_SUMS)
+        .filter(*scope)
+        .group_by(TokenUsage.usage_date)
+        .order_by(TokenUsage.usage_date.desc())
+        .all()
+    )
+
+    return {
+        "days": days,
+        "budget": budget_status(db, user.id),
+        "totals": _breakdown(*db.query(*_SUMS).filter(*scope).one()),
+        "by_prompt_type": [
+            _breakdown(*row[1:], key=row[0]) for row in grouped(TokenUsage.prompt_type)
+        ],
+        "by_model": [_breakdown(*row[1:], key=row[0]) for row in grouped(TokenUsage.model)],
+        "by_chat": [
+            _breakdown(*row[2:], chat_id=row[0], title=row[1]) for row in by_chat
+        ],
+        "by_day": [_breakdown(*row[1:], usage_date=row[0]) for row in by_day],
+    }
@@ -1,41 +1,87 @@
+import hmac
+
+from dataclasses import dataclass
+from typing import Optional
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
 
-from app.core.database import get_db
-from app.core.security import SECRET_KEY, ALGORITHM
+from app.core.database import SessionLocal
+from app.core.security import SECRET_KEY, ALGORITHM, OPS_TOKEN
 from app.models.db_models import User
+from app.services.user_cache import UserCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=True)
+ops_scheme = HTTPBearer(auto_error=False)
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> User:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id_str: str | None = payload.get("sub")
-        if not user_id_str:
-            raise JWTError
-        user_id = UUID(user_id_str)
-    except (JWTError, ValueError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-        )
-    user = db.query(User).filter(User.id == user_id).first()
+@dataclass(frozen=True)
+class CurrentUser:
+    """What requests need of the authenticated user; cached per token."""
+
+    id: UUID
+    is_active: bool
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    cache = UserCache()
+    user = cache.get(token)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-        )
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id_str: str | None = payload.get("sub")
+            if not user_id_str:
+                raise JWTError
+            user_id = UUID(user_id_str)
+        except (JWTError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+            )
+        with SessionLocal() as db:
+            row = db.query(User.id, User.is_active).filter(User.id == user_id).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+            )
+        user = CurrentUser(id=row.id, is_active=bool(row.is_active))
+        # Disabled users are cached too, so their requests stay cheap to refuse
+        cache.put(token, user.id, user, payload.get("exp"))
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account is disabled",
         )
     return user
+
+
+def require_ops_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(ops_scheme),
+):
+    """Guards operational endpoints; they do not exist unless OPS_TOKEN is set."""
+    if not OPS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(
+        credentials.credentials.encode(), OPS_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid ops token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_disabled_user(mapper, connection, target):
+    if inspect(target).attrs.is_active.history.has_changes():
+        UserCache().invalidate_user(target.id)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    UserCache().invalidate_user(target.id)
@@ -47,6 +47,12 @@ Instructions:
 2. Return ONLY the corrected SQL query (no markdown, no explanations)
 """
 
+SQL_TIMEOUT_FIX_HINT = """
+The query was cancelled for running too long. Rewrite it to be cheaper:
+aggregate in the database (GROUP BY) instead of returning raw rows, add selective
+WHERE filters, avoid cross joins and correlated subqueries, and keep LIMIT small.
+"""
+
 SUMMARY_SYNTHESIS_PROMPT = """
 Synthesize findings into executive insights.
 
@@ -230,6 +236,16 @@ JSON:
 }}
 """
 
+OUT_OF_CORE_SCHEMA_NOTE = """
+Streamed dataset: {rows:,} rows, too large to load. df is NOT defined; value ranges come from
+the whole file, other samples from the first {sample_rows:,} rows. Read the data with:
+- aggregate(by=["col"], aggs={{"col": "sum|mean|min|max|count"}}, where="pandas query") -> DataFrame
+  (one row per group; omit by for totals, omit aggs for row counts in "rows")
+- head(n, columns=["col"], where="...") -> first matching rows
+- count(where="...") -> int
+- batches(columns=["col"], where="...") -> iterator of DataFrame chunks, for anything else
+Always pass columns/aggs so only the needed columns are read."""
+
 STEP_EXECUTOR_PROMPT = """
 Execute step {step_number}.
 
@@ -240,7 +256,7 @@ Task: {step_description}
 Previous: {previous_results}
 
 Generate Python code:
-- Use df (loaded DataFrame)
+- Use df (loaded DataFrame), unless the schema says the dataset is streamed
 - Assign to 'result'
 - Charts: use plt, dark_background applied, NO savefig/show
 - Tables: return filtered DataFrame
@@ -256,3 +272,66 @@ Notes:
 
 Return code only.
 """
+
+SQL_PLAN_AND_GENERATE_PROMPT = """
+Plan and write SQL for {target_db} in one pass.
+
+Schema: {schema}
+History: {history}
+Query: "{query}"
+
+Intent: GENERAL_CHAT | DATA_ACTION | OFFENSIVE
+
+For simple DATA_ACTION questions (answerable with 1-3 queries):
+- Steps: metric (single value), table (multi-row), chart (bar/line/pie/scatter)
+- Each step carries its final SQL in "sql"
+- NO summary step
+
+SQL rules:
+1. SELECT only (no INSERT/UPDATE/DELETE/DROP/ALTER)
+2. Dialects: PostgreSQL ("), MySQL (`), SQL Server ([])
+3. Use JOINs for multi-table queries, GROUP BY for aggregations
+4. Default LIMIT 1000
+5. Only columns present in the schema
+
+If the question needs more than 3 queries or a narrative synthesis, return "plan": [].
+
+JSON format:
+{{
+  "intent": "...",
+  "reasoning": "...",
+  "plan": [
+    {{"step_number": 1, "type": "metric|table|chart", "title": "💰 Title", "description": "What it shows", "chart_type": "bar|line|pie|scatter|none", "sql": "SELECT ..."}}
+  ]
+}}
+"""
+
+EXCEL_PLAN_AND_GENERATE_PROMPT = """
+Plan and write pandas code for Excel/CSV analysis in one pass.
+
+Schema: {schema}
+History: {history}
+Query: "{query}"
+
+Intent: GENERAL_CHAT | DATA_ACTION | OFFENSIVE
+
+For simple DATA_ACTION questions (answerable with 1-3 steps):
+- Steps: metric, table, chart (bar/line/scatter/pie)
+- Each step carries its Python code in "code"
+- NO summary step
+
+Code rules:
+- Use df (loaded DataFrame), pd and plt only; streamed datasets use the helpers in the schema
+- Assign to 'result'; charts also assign the plotted DataFrame to 'result'
+- Charts: dark_background applied, NO savefig/show
+- NO os/sys/subprocess/open/exec/eval
+
+If the question needs more than 3 steps or a narrative synthesis, return "plan": [].
+
+JSON:
+{{
+  "intent": "...",
+  "reasoning": "...",
+  "plan": [{{"step_number": 1, "type": "metric|chart|table", "title": "💰 Title", "description": "Task", "chart_type": "bar|line|scatter|pie|none", "code": "result = ..."}}]
+}}
+"""
@@ -8,6 +8,9 @@ dotenv.load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY", "4d8s4dm1239jsdkzxnquqlxpc")
 
+# Bearer token for /metrics, /agent-stats and /storage-health; unset, they are off
+OPS_TOKEN = os.getenv("OPS_TOKEN", "")
+
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 2000
 
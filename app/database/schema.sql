@@ -10,6 +10,21 @@ CREATE TABLE users (
     is_active BOOLEAN DEFAULT TRUE
 );
 
+-- Ingested uploads by owner and content hash. A user's identical uploads
+-- share one parquet; ref_count is the number of files rows pointing at it.
+-- Content is never shared across users.
+CREATE TABLE file_blobs (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    content_sha256 CHAR(64) NOT NULL,     -- SHA-256 of the uploaded bytes
+    file_path VARCHAR(512) NOT NULL,      -- "{sha256(user_id:content_sha256)}.parquet"
+    size_bytes BIGINT,
+    row_count INT,
+    columns JSONB,
+    ref_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, content_sha256)
+);
+
 CREATE TABLE files (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
@@ -18,7 +33,9 @@ CREATE TABLE files (
     file_size_bytes BIGINT,
     row_count INT,
     columns JSONB,                        
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    content_sha256 CHAR(64),              -- NULL for uploads before dedup
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id, content_sha256) REFERENCES file_blobs(user_id, content_sha256)
 );
 
 CREATE TABLE connections (
@@ -68,15 +85,67 @@ CREATE TABLE messages (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     chat_id UUID NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
     role VARCHAR(50) NOT NULL,            
-    content TEXT NOT NULL,                
+    content TEXT NOT NULL,                -- Answer text; step results live in steps only
     artifacts JSONB,
     related_code JSONB,                   
     steps JSONB,                          
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- LLM token usage aggregated per user, chat, day, prompt template and model.
+-- chat_id has no foreign key so usage outlives deleted chats for budgeting.
+CREATE TABLE token_usage (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    chat_id UUID,                         -- NULL for dossier generation
+    usage_date DATE NOT NULL,
+    prompt_type VARCHAR(64) NOT NULL,     -- e.g. "SQL_BRAIN_PROMPT"
+    model VARCHAR(128) NOT NULL,
+    calls INT NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(14, 6) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT token_usage_bucket UNIQUE NULLS NOT DISTINCT (
+        user_id, chat_id, usage_date, prompt_type, model
+    )
+);
+
+-- Per-user daily token budget; users without a row get TOKEN_BUDGET_DAILY
+CREATE TABLE token_budgets (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    daily_tokens BIGINT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Background jobs (file analysis, connection onboarding). progress holds the
+-- stage events streamed to the client; payload never holds plain credentials.
+CREATE TABLE jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR(32) NOT NULL,            -- "analyze_file", "create_connection"
+    status VARCHAR(16) NOT NULL DEFAULT 'queued', -- queued, running, succeeded, failed
+    stage VARCHAR(32),                    -- last reported stage
+    progress JSONB NOT NULL DEFAULT '[]'::jsonb,
+    payload JSONB,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes (Performance)
 CREATE INDEX idx_files_user_id ON files(user_id);
+CREATE INDEX idx_files_user_content ON files(user_id, content_sha256);
 CREATE INDEX idx_connections_user_id ON connections(user_id);
-CREATE INDEX idx_chats_user_id ON chats(user_id);
-CREATE INDEX idx_messages_chat_id ON messages(chat_id);
\ No newline at end of file
+-- Serves the chat list's keyset pages, newest first
+CREATE INDEX idx_chats_user_created ON chats(user_id, created_at, id);
+-- Serves chat history's keyset pages, newest first
+CREATE INDEX idx_messages_chat_created ON messages(chat_id, created_at, id);
+-- Lets a chart delete check the plots it released without scanning all messages
+CREATE INDEX idx_messages_steps ON messages USING GIN (steps jsonb_path_ops);
+CREATE INDEX idx_token_usage_user_date ON token_usage(user_id, usage_date);
+CREATE INDEX idx_jobs_user_created ON jobs(user_id, created_at);
+CREATE INDEX idx_jobs_pending ON jobs(created_at) WHERE status IN ('queued', 'running');
@@ -1,7 +1,27 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import Depends, FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from app.api import files, auth, chats, messages, connections
+from app.api import files, auth, chats, messages, connections, usage, jobs
+from app.core.database import SessionLocal
+from app.core.deps import require_ops_token
+from app.services.agent_session_cache import AgentSessionCache
+from app.services.code_sandbox import SandboxPool
+from app.services.file_store import FileStore
+from app.services.intent_classifier import IntentClassifier
+from app.services.job_runner import JobRunner
+from app.services.llm_resilience import resilience_stats
+from app.services.llm_router import LLMRouter
+from app.services.llm_scheduler import LLMScheduler
+from app.services.plan_memo import PlanMemo
+from app.services.plot_store import PLOT_GC_INTERVAL, PlotStore
+from app.services.parquet_scan import scan_stats
+from app.services.single_flight import single_flight_stats
+from app.services.user_cache import UserCache
+from app.services.telemetry import metrics
+from app.services.token_usage import USAGE_FLUSH_INTERVAL, TokenLedger
 from sqlalchemy import create_engine, text
 import os
 
@@ -27,6 +47,62 @@ app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(chats.router)
 app.include_router(messages.router)
 app.include_router(connections.router)
+app.include_router(usage.router)
+app.include_router(jobs.router)
+
+
+def _collect_plots():
+    with SessionLocal() as db:
+        return PlotStore().collect_garbage(db)
+
+
+async def _plot_gc_loop():
+    while True:
+        await asyncio.sleep(PLOT_GC_INTERVAL)
+        try:
+            await run_in_threadpool(_collect_plots)
+        except Exception as e:
+            print(f"PLOTS: GC failed: {e}")
+
+
+def _flush_token_usage():
+    with SessionLocal() as db:
+        return TokenLedger().flush(db)
+
+
+async def _usage_flush_loop():
+    while True:
+        await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+        try:
+            await run_in_threadpool(_flush_token_usage)
+        except Exception as e:
+            print(f"USAGE: Flush failed: {e}")
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # Idle executors for the first steps; each is re-forked once datasets are
+    # cached so it shares them (see SandboxPool)
+    SandboxPool().start()
+    app.state.plot_gc_task = asyncio.create_task(_plot_gc_loop())
+    app.state.usage_flush_task = asyncio.create_task(_usage_flush_loop())
+    # Picks up jobs left queued or orphaned by the previous process
+    try:
+        await run_in_threadpool(JobRunner().start)
+    except Exception as e:
+        print(f"JOBS: Failed to resume pending jobs: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    app.state.plot_gc_task.cancel()
+    app.state.usage_flush_task.cancel()
+    try:
+        await run_in_threadpool(_flush_token_usage)
+    except Exception as e:
+        print(f"USAGE: Final flush failed: {e}")
+    JobRunner().shutdown()
+    SandboxPool().shutdown()
 
 
 @app.get("/")
@@ -47,3 +123,34 @@ def test_db_connection():
 
     except Exception as e:
         return {"status": "error", "details": str(e)}
+
+
+@app.get("/storage-health", dependencies=[Depends(require_ops_token)])
+def storage_health():
+    return {"status": "ok", **PlotStore().get_stats(), "uploads": FileStore().get_stats()}
+
+
+@app.get("/agent-stats", dependencies=[Depends(require_ops_token)])
+def agent_stats():
+    return {
+        "intent_classifier": IntentClassifier().get_stats(),
+        "sessions": AgentSessionCache().get_stats(),
+        "plan_memo": PlanMemo().get_stats(),
+        "token_usage": TokenLedger().get_stats(),
+        "single_flight": single_flight_stats(),
+        "llm_scheduler": LLMScheduler().get_stats(),
+        "llm_routes": LLMRouter().get_stats(),
+        "llm_resilience": resilience_stats(),
+        "jobs": JobRunner().get_stats(),
+        "parquet_scan": scan_stats(),
+        "user_cache": UserCache().get_stats(),
+    }
+
+
+@app.get(
+    "/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_ops_token)]
+)
+def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
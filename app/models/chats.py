@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, ConfigDict
 from uuid import UUID
 
@@ -14,6 +14,10 @@ class FileInfo(BaseModel):
     filename: str
 
 
+class ConnectionInfo(BaseModel):
+    name: str
+
+
 class ChatOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -24,3 +28,10 @@ class ChatOut(BaseModel):
     created_at: datetime
     type: Optional[str] = None
     file: Optional[FileInfo] = None
+    connection: Optional[ConnectionInfo] = None
+
+
+class ChatPage(BaseModel):
+    chats: List[ChatOut]
+    # Pass as `cursor` for the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
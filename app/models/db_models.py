@@ -1,15 +1,20 @@
 import uuid
 from sqlalchemy import (
     Column,
+    CHAR,
     String,
     Boolean,
     ForeignKey,
+    ForeignKeyConstraint,
     Integer,
     BigInteger,
     Text,
     DateTime,
     CheckConstraint,
     Index,
+    Date,
+    Numeric,
+    UniqueConstraint,
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
@@ -36,8 +41,33 @@ class User(Base):
     chats = relationship("Chat", back_populates="user", cascade="all, delete-orphan")
 
 
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    content_sha256 = Column(CHAR(64), primary_key=True)
+    file_path = Column(String(512), nullable=False)
+    size_bytes = Column(BigInteger)
+    row_count = Column(Integer)
+    columns = Column(JSONB)
+    # files rows pointing at this parquet
+    ref_count = Column(Integer, nullable=False, server_default=text("0"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["user_id", "content_sha256"],
+            ["file_blobs.user_id", "file_blobs.content_sha256"],
+        ),
+        Index("idx_files_user_content", "user_id", "content_sha256"),
+    )
 
     id = Column(
         UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()")
@@ -54,6 +84,8 @@ class File(Base):
     file_size_bytes = Column(BigInteger)
     row_count = Column(Integer)
     columns = Column(JSONB)
+    # NULL for uploads stored before content-hash deduplication
+    content_sha256 = Column(CHAR(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     owner = relationship("User", back_populates="files")
@@ -137,6 +169,7 @@ class Chat(Base):
             "(file_id IS NOT NULL AND connection_id IS NULL) OR (file_id IS NULL AND connection_id IS NOT NULL)",
             name="chat_source_check",
         ),
+        Index("idx_chats_user_created", "user_id", "created_at", "id"),
     )
 
     id = Column(
@@ -146,7 +179,6 @@ class Chat(Base):
         UUID(as_uuid=True),
         ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
 
     file_id = Column(
@@ -182,6 +214,16 @@ class Chat(Base):
 class Message(Base):
     __tablename__ = "messages"
 
+    __table_args__ = (
+        Index("idx_messages_chat_created", "chat_id", "created_at", "id"),
+        Index(
+            "idx_messages_steps",
+            "steps",
+            postgresql_using="gin",
+            postgresql_ops={"steps": "jsonb_path_ops"},
+        ),
+    )
+
     id = Column(
         UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()")
     )
@@ -189,7 +231,6 @@ class Message(Base):
         UUID(as_uuid=True),
         ForeignKey("chats.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
 
     role = Column(String(50), nullable=False)
@@ -201,3 +242,85 @@ class Message(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     chat = relationship("Chat", back_populates="messages")
+
+
+class TokenUsage(Base):
+    __tablename__ = "token_usage"
+
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id",
+            "chat_id",
+            "usage_date",
+            "prompt_type",
+            "model",
+            name="token_usage_bucket",
+            postgresql_nulls_not_distinct=True,
+        ),
+        Index("idx_token_usage_user_date", "user_id", "usage_date"),
+    )
+
+    id = Column(
+        UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()")
+    )
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    # No foreign key: usage outlives deleted chats for budgeting
+    chat_id = Column(UUID(as_uuid=True), nullable=True)
+
+    usage_date = Column(Date, nullable=False)
+    prompt_type = Column(String(64), nullable=False)
+    model = Column(String(128), nullable=False)
+    calls = Column(Integer, nullable=False, server_default=text("0"))
+    prompt_tokens = Column(BigInteger, nullable=False, server_default=text("0"))
+    completion_tokens = Column(BigInteger, nullable=False, server_default=text("0"))
+    cost_usd = Column(Numeric(14, 6), nullable=False, server_default=text("0"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class TokenBudget(Base):
+    __tablename__ = "token_budgets"
+
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    daily_tokens = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    __table_args__ = (
+        Index("idx_jobs_user_created", "user_id", "created_at"),
+        Index(
+            "idx_jobs_pending",
+            "created_at",
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = Column(
+        UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()")
+    )
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    kind = Column(String(32), nullable=False)
+    status = Column(String(16), nullable=False, server_default=text("'queued'"))
+    stage = Column(String(32))
+    progress = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    payload = Column(JSONB)
+    result = Column(JSONB)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
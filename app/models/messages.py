@@ -1,7 +1,7 @@
 from datetime import datetime
 from pydantic import BaseModel
 from uuid import UUID
-from typing import Optional, Dict, Any
+from typing import Any, Dict, List, Optional
 
 
 class MessageCreate(BaseModel):
@@ -17,3 +17,26 @@ class MessageOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class MessageSummary(BaseModel):
+    """A history entry without its step results (see MessageDetail)."""
+
+    id: UUID
+    role: str
+    content: str
+    created_at: datetime
+    step_count: int = 0
+
+
+class MessagePage(BaseModel):
+    # Oldest first within the page
+    messages: List[MessageSummary]
+    # Pass as `cursor` for the page of older messages; None at the start of the chat
+    next_cursor: Optional[str] = None
+
+
+class MessageDetail(BaseModel):
+    id: UUID
+    steps: List[Dict[str, Any]] = []
+    related_code: Optional[Dict[str, Any]] = None
@@ -0,0 +1,39 @@
+from datetime import date
+from typing import List, Optional
+from pydantic import BaseModel
+from uuid import UUID
+
+
+class UsageBreakdown(BaseModel):
+    key: Optional[str] = None
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    cost_usd: float
+
+
+class ChatUsage(UsageBreakdown):
+    chat_id: Optional[UUID] = None
+    title: Optional[str] = None
+
+
+class DailyUsage(UsageBreakdown):
+    usage_date: date
+
+
+class BudgetOut(BaseModel):
+    daily_limit: Optional[int] = None
+    used_today: int
+    remaining_today: Optional[int] = None
+    state: str
+
+
+class UsageReport(BaseModel):
+    days: int
+    budget: BudgetOut
+    totals: UsageBreakdown
+    by_prompt_type: List[UsageBreakdown]
+    by_model: List[UsageBreakdown]
+    by_chat: List[ChatUsage]
+    by_day: List[DailyUsage]
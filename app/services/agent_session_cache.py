@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from app.services.single_flight import SingleFlight
+from app.services.telemetry import span
+
+
+class AgentSessionCache:
+    """
+    Keeps built agents warm per chat so follow-up messages skip decryption,
+    engine lookup, schema inference and DataFrame profiling.
+    Entries are tagged with a source key (data file path or connection
+    fingerprint) so they can be dropped when the underlying source changes.
+    """
+
+    _instance = None
+    _store: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    _lock = threading.Lock()
+    _builds = SingleFlight("agent_build")
+    TTL = 900
+    MAX_SESSIONS = 256
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AgentSessionCache, cls).__new__(cls)
+        return cls._instance
+
+    def get_or_create(
+        self, chat_id: str, source_key: str, factory: Callable[[], Tuple[Any, str]]
+    ) -> Tuple[Any, str]:
+        """
+        Return the cached (agent, code_type) for a chat, building it with
+        `factory` when missing, expired or pointing at a different source.
+        """
+        current_time = time.time()
+
+        with span("cache_lookup", cache="agent_session") as attrs, self._lock:
+            entry = self._store.get(chat_id)
+            if entry is not None:
+                if (
+                    entry["source_key"] == source_key
+                    and current_time - entry["timestamp"] < self.TTL
+                ):
+                    entry["timestamp"] = current_time
+                    attrs["hit"] = True
+                    self._store.move_to_end(chat_id)
+                    print(f"SESSION HIT: Reusing agent for chat {chat_id}")
+                    return entry["agent"], entry["code_type"]
+                del self._store[chat_id]
+
+        # Two messages racing into a cold chat share one build
+        return self._builds.do(
+            (chat_id, source_key),
+            lambda: self._build(chat_id, source_key, factory, current_time),
+        )
+
+    def _build(self, chat_id, source_key, factory, current_time) -> Tuple[Any, str]:
+        print(f"SESSION MISS: Building agent for chat {chat_id}")
+        agent, code_type = factory()
+
+        with self._lock:
+            self._store[chat_id] = {
+                "agent": agent,
+                "code_type": code_type,
+                "source_key": source_key,
+                "timestamp": current_time,
+            }
+            self._store.move_to_end(chat_id)
+            while len(self._store) > self.MAX_SESSIONS:
+                self._store.popitem(last=False)
+
+        return agent, code_type
+
+    def invalidate_chat(self, chat_id: str):
+        """Drop the session of a single chat (e.g. on chat delete)"""
+        with self._lock:
+            if self._store.pop(str(chat_id), None) is not None:
+                print(f"SESSION: Cleared chat {chat_id}")
+
+    def invalidate_source(self, source_key: str):
+        """Drop every session built on a file or connection (e.g. file deleted)"""
+        with self._lock:
+            stale = [
+                chat_id
+                for chat_id, entry in self._store.items()
+                if entry["source_key"] == source_key
+                or entry["source_key"].startswith(f"{source_key}:")
+            ]
+            for chat_id in stale:
+                del self._store[chat_id]
+        if stale:
+            print(f"SESSION: Cleared {len(stale)} sessions for {source_key}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._store)}
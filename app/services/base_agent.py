@@ -1,7 +1,189 @@
+import json
+import os
+import dotenv
 import json_repair
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 from app.services.llm import call_llm
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.token_usage import economy_mode
+
+dotenv.load_dotenv()
+
+PLAN_AND_GENERATE_ENABLED = (
+    os.getenv("PLAN_AND_GENERATE_ENABLED", "true").lower() == "true"
+)
+PLAN_AND_GENERATE_MAX_STEPS = 3
+
+INTENTS = ("GENERAL_CHAT", "DATA_ACTION", "OFFENSIVE")
+DATA_STEP_TYPES = ("metric", "table", "chart")
+CHART_TYPES = ("bar", "line", "pie", "scatter")
 
 
 class BaseAgent:
     def __init__(self):
         pass
+
+    def _prompt_schema(self) -> str:
+        """Full schema, or the compact one while the user is near their token budget."""
+        if economy_mode():
+            return getattr(self, "compact_schema", None) or self.schema
+        return self.schema
+
+    def _stream_text(
+        self,
+        messages: list,
+        temperature: float,
+        timeout: int,
+        fallback: str,
+        stage: str = "format",
+    ):
+        """
+        Stream an LLM completion to the client as `summary_delta` events.
+        Use with `yield from`; returns the assembled text for persistence.
+        """
+        parts = []
+        try:
+            for delta in call_llm(
+                messages,
+                temperature=temperature,
+                timeout=timeout,
+                stream=True,
+                stage=stage,
+            ):
+                parts.append(delta)
+                yield json.dumps({"type": "summary_delta", "delta": delta})
+        except LLMOverloaded:
+            # Shed load surfaces as an error instead of a canned fallback
+            raise
+        except Exception as e:
+            print(f"STREAM ERROR: {e}")
+            if not parts:
+                return fallback
+
+        return "".join(parts).strip() or fallback
+
+    def _plan_and_generate(
+        self,
+        messages: list,
+        code_field: str,
+        validate_code: Callable[[str], str],
+    ) -> Optional[Tuple[Dict[str, Any], Dict[str, str]]]:
+        """
+        Single round trip returning intent, plan and per-step code together.
+        Returns (brain_output, {step_number: code}) or None when the output
+        fails validation, so the caller falls back to the multi-call pipeline.
+        `validate_code` returns the cleaned code or raises.
+        """
+        try:
+            response = call_llm(
+                messages, temperature=0.0, timeout=60, stage="plan_and_generate"
+            )
+            if "```" in response:
+                response = response.replace("```json", "").replace("```", "").strip()
+            output = json_repair.loads(response)
+
+            if not isinstance(output, dict) or output.get("intent") not in INTENTS:
+                raise ValueError("missing or unknown intent")
+
+            if output["intent"] != "DATA_ACTION":
+                output["plan"] = []
+                output["combined"] = True
+                return output, {}
+
+            # Summaries are deferred; only data steps are accepted
+            steps = [
+                step
+                for step in output.get("plan") or []
+                if isinstance(step, dict) and step.get("type") != "summary"
+            ]
+            if not steps:
+                raise ValueError("question is not simple enough for a single pass")
+            if len(steps) > PLAN_AND_GENERATE_MAX_STEPS:
+                raise ValueError(f"{len(steps)} steps exceed the single-pass limit")
+
+            codes = {}
+            seen = set()
+            for step in steps:
+                step_number = step.get("step_number")
+                if isinstance(step_number, str) and step_number.isdigit():
+                    step_number = step["step_number"] = int(step_number)
+                if not isinstance(step_number, int) or step_number in seen:
+                    raise ValueError(f"invalid step_number {step_number!r}")
+                seen.add(step_number)
+                if step.get("type") not in DATA_STEP_TYPES:
+                    raise ValueError(f"unknown step type {step.get('type')!r}")
+                if not step.get("title") or not step.get("description"):
+                    raise ValueError(f"step {step_number} lacks title/description")
+
+                chart_type = step.get("chart_type") or "none"
+                if step["type"] == "chart" and chart_type not in CHART_TYPES:
+                    raise ValueError(f"step {step_number} has no usable chart_type")
+                step["chart_type"] = chart_type
+
+                code = step.pop(code_field, None)
+                if not isinstance(code, str) or not code.strip():
+                    raise ValueError(f"step {step_number} has no {code_field}")
+                codes[str(step_number)] = validate_code(code)
+
+            output["plan"] = steps
+            output["combined"] = True
+            print(f"PLAN+GENERATE: Single-pass plan with {len(steps)} steps")
+            return output, codes
+
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            print(f"PLAN+GENERATE: Falling back to multi-call pipeline ({e})")
+            return None
+
+    def _local_summary(self, all_results: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Plain answer for single-value results, skipping the formatting LLM call.
+        Returns None when the results warrant a written analysis.
+        """
+        lines = []
+        for res in all_results:
+            if res["type"] == "text":
+                value = str(res.get("data", "")).strip()
+                if not value or len(value) > 200:
+                    return None
+            elif (
+                res["type"] == "table"
+                and res.get("total_rows") == 1
+                and len(res.get("columns", [])) <= 4
+                and res.get("data")
+            ):
+                row = res["data"][0]
+                value = ", ".join(f"{col}: {row.get(col, '')}" for col in res["columns"])
+            else:
+                return None
+            title = res.get("step_description") or f"Step {res['step_number']}"
+            lines.append(f"**{title}**: {value}")
+
+        return "\n".join(lines) or None
+
+    def _budget_summary(self, all_results: List[Dict[str, Any]]) -> str:
+        """
+        Deterministic digest used instead of the formatting LLM call when the
+        user is close to their daily token budget.
+        """
+        local = self._local_summary(all_results)
+        if local:
+            return local
+
+        lines = []
+        for res in all_results:
+            title = res.get("step_description") or f"Step {res['step_number']}"
+            if res["type"] == "table":
+                value = f"{res.get('total_rows', 0)} rows"
+            elif res["type"] in ("image", "chart"):
+                value = res.get("description") or "Chart"
+            elif res["type"] == "error":
+                value = f"Failed ({res.get('data', '')})"
+            else:
+                value = str(res.get("data", ""))[:200]
+            lines.append(f"**{title}**: {value}")
+        lines.append("_Written analysis skipped: daily token budget nearly used._")
+        return "\n".join(lines)
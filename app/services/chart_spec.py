@@ -0,0 +1,163 @@
+import json
+import math
+import os
+import dotenv
+import pandas as pd
+
+from typing import Any, Dict, List, Optional
+
+dotenv.load_dotenv()
+
+# "spec" returns a declarative chart description rendered by the frontend,
+# "png" keeps the old server-side matplotlib rendering.
+CHART_MODE = os.getenv("CHART_MODE", "spec").lower()
+
+SUPPORTED_CHART_TYPES = ("bar", "line", "pie", "scatter")
+MAX_CATEGORIES = 20
+MAX_PIE_SLICES = 7
+MAX_POINTS = 500
+
+
+def spec_mode_enabled() -> bool:
+    return CHART_MODE == "spec"
+
+
+def _is_quantitative(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(
+        series
+    )
+
+
+def _field_type(series: pd.Series) -> str:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "temporal"
+    if _is_quantitative(series):
+        return "quantitative"
+    return "nominal"
+
+
+def _pick_encoding(df: pd.DataFrame, chart_type: str):
+    """Choose x and y fields for the chart. Returns (x, [y...]) or None."""
+    numeric = [c for c in df.columns if _is_quantitative(df[c])]
+    if not numeric:
+        return None
+
+    if chart_type == "scatter":
+        if len(numeric) < 2:
+            return None
+        return numeric[0], [numeric[1]]
+
+    dimensions = [c for c in df.columns if c not in numeric]
+    if dimensions:
+        # Prefer a time column for the x-axis when there is one
+        temporal = [c for c in dimensions if _field_type(df[c]) == "temporal"]
+        x = temporal[0] if temporal else dimensions[0]
+        return x, numeric
+
+    if len(numeric) >= 2:
+        return numeric[0], numeric[1:]
+
+    return None
+
+
+def _aggregate(frame: pd.DataFrame, x: str, y: List[str]) -> pd.DataFrame:
+    """Collapse duplicate x values so the client only receives one row per mark."""
+    if frame[x].is_unique:
+        return frame
+    return frame.groupby(x, sort=False, dropna=False)[y].sum().reset_index()
+
+
+def _downsample(frame: pd.DataFrame, chart_type: str, x: str, y: List[str]):
+    if chart_type == "pie":
+        frame = frame.sort_values(y[0], ascending=False)
+        if len(frame) > MAX_PIE_SLICES:
+            head = frame.head(MAX_PIE_SLICES - 1)
+            other = pd.DataFrame(
+                {x: ["Other"], y[0]: [frame[y[0]].iloc[MAX_PIE_SLICES - 1 :].sum()]}
+            )
+            return pd.concat([head, other], ignore_index=True), True
+        return frame, False
+
+    if chart_type == "bar":
+        if len(frame) > MAX_CATEGORIES:
+            # Keep the largest bars but preserve the order the data came in;
+            # positional, since the index may repeat labels
+            values = frame[y[0]].reset_index(drop=True)
+            top_positions = sorted(values.nlargest(MAX_CATEGORIES).index)
+            return frame.iloc[top_positions], True
+        return frame, False
+
+    if chart_type == "line" and _field_type(frame[x]) != "nominal":
+        frame = frame.sort_values(x)
+
+    if len(frame) > MAX_POINTS:
+        stride = math.ceil(len(frame) / MAX_POINTS)
+        return frame.iloc[::stride], True
+
+    return frame, False
+
+
+def build_chart_spec(
+    data: Any,
+    chart_type: Optional[str],
+    title: str = "",
+    x_label: str = "",
+    y_label: str = "",
+) -> Optional[Dict[str, Any]]:
+    """
+    Build a compact declarative chart spec from a DataFrame or Series.
+    Returns None when no sensible encoding can be inferred, so callers can
+    fall back to PNG rendering.
+    """
+    if isinstance(data, pd.Series):
+        data = data.reset_index()
+    if not isinstance(data, pd.DataFrame) or data.empty:
+        return None
+
+    df = data.copy()
+    df.columns = [str(c) for c in df.columns]
+
+    chart_type = (chart_type or "bar").lower()
+    if chart_type not in SUPPORTED_CHART_TYPES:
+        chart_type = "bar"
+
+    encoding = _pick_encoding(df, chart_type)
+    if encoding is None:
+        return None
+    x, y = encoding
+    if chart_type == "pie":
+        y = y[:1]
+
+    frame = df[[x] + y]
+    total_rows = len(frame)
+    if chart_type != "scatter":
+        frame = _aggregate(frame, x, y)
+    frame, sampled = _downsample(frame, chart_type, x, y)
+
+    return {
+        "version": 1,
+        "chart_type": chart_type,
+        "title": title,
+        "encoding": {
+            "x": {"field": x, "type": _field_type(df[x]), "title": x_label or x},
+            "y": [
+                {"field": field, "type": "quantitative", "title": field}
+                for field in y
+            ],
+            "y_title": y_label or (y[0] if len(y) == 1 else ""),
+        },
+        "values": json.loads(
+            frame.to_json(orient="records", date_format="iso", default_handler=str)
+        ),
+        "total_rows": total_rows,
+        "sampled": sampled,
+    }
+
+
+def describe_chart_spec(spec: Dict[str, Any]) -> str:
+    encoding = spec["encoding"]
+    y_fields = ", ".join(field["field"] for field in encoding["y"])
+    return (
+        f"Chart Title: {spec.get('title') or 'Chart'}; "
+        f"X-Axis: {encoding['x']['title']}; Y-Axis: {encoding.get('y_title') or y_fields}"
+    )
@@ -0,0 +1,433 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import dotenv
+import matplotlib.pyplot as plt
+import pandas as pd
+import pyarrow as pa
+
+from typing import Any, Dict, Optional, Union
+
+from app.services.chart_spec import build_chart_spec, describe_chart_spec
+from app.services.excel_agent_cache import DataCache
+from app.services.out_of_core import StreamedDataset, is_out_of_core
+from app.services.parquet_scan import record_pruning
+
+dotenv.load_dotenv()
+
+SANDBOX_ENABLED = os.getenv("SANDBOX_ENABLED", "true").lower() == "true"
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "30"))
+SANDBOX_WALL_SECONDS = int(os.getenv("SANDBOX_WALL_SECONDS", "60"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))
+
+# Only the rows the API actually sends back cross the process boundary
+RESULT_ROW_LIMIT = 50
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+def _encode_frame(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Serialize a DataFrame as an Arrow IPC stream, pickling only as a last resort."""
+    try:
+        table = pa.Table.from_pandas(frame)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return {"format": "arrow", "payload": sink.getvalue().to_pybytes()}
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, ValueError):
+        return {"format": "pickle", "payload": frame}
+
+
+def decode_frame(encoded: Dict[str, Any]) -> pd.DataFrame:
+    if encoded["format"] == "arrow":
+        with pa.ipc.open_stream(encoded["payload"]) as reader:
+            return reader.read_all().to_pandas()
+    return encoded["payload"]
+
+
+def execute_snippet(
+    df: Union[pd.DataFrame, StreamedDataset],
+    clean_code: str,
+    chart_type: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run sanitized pandas/matplotlib code against `df` and return a picklable
+    outcome. Runs inside a sandbox worker, or in-process when the pool is off.
+    A StreamedDataset is exposed through its helpers instead of `df`.
+    Pass `chart_type` to get a declarative chart spec for chart steps.
+    The outcome carries `timings` (seconds) split into code execution and
+    result rendering (chart spec, PNG or frame encoding).
+    """
+    timings = {"exec": 0.0}
+    started = time.perf_counter()
+    outcome = _run_snippet(df, clean_code, chart_type, timings)
+    timings["render"] = max(0.0, time.perf_counter() - started - timings["exec"])
+    outcome["timings"] = timings
+    return outcome
+
+
+def _run_snippet(
+    df: Union[pd.DataFrame, StreamedDataset],
+    clean_code: str,
+    chart_type: Optional[str],
+    timings: Dict[str, float],
+) -> Dict[str, Any]:
+    local_scope = {"pd": pd, "plt": plt, "result": None}
+    if isinstance(df, StreamedDataset):
+        local_scope.update(df.helpers())
+    else:
+        # Shallow copy: with pandas copy-on-write, generated code can never
+        # mutate the cached frame
+        local_scope["df"] = df.copy(deep=False)
+    stdout_capture = io.StringIO()
+
+    try:
+        plt.clf()
+        plt.close("all")
+
+        exec_started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(stdout_capture):
+                exec(clean_code, {"__builtins__": __builtins__}, local_scope)
+        finally:
+            timings["exec"] = time.perf_counter() - exec_started
+
+        result = local_scope.get("result")
+        result_description = local_scope.get("description", "")
+        axes = plt.gcf().get_axes()
+
+        if chart_type and isinstance(result, (pd.DataFrame, pd.Series)):
+            ax = axes[-1] if axes else None
+            spec = build_chart_spec(
+                result,
+                chart_type,
+                title=ax.get_title() if ax else "",
+                x_label=ax.get_xlabel() if ax else "",
+                y_label=ax.get_ylabel() if ax else "",
+            )
+            if spec is not None:
+                plt.close("all")
+                return {
+                    "kind": "chart",
+                    "spec": spec,
+                    "description": describe_chart_spec(spec),
+                }
+
+        if axes:
+            ax = plt.gca()
+            title = ax.get_title() or "Plot"
+            x_label = ax.get_xlabel() or "X-axis"
+            y_label = ax.get_ylabel() or "Y-axis"
+            buffer = io.BytesIO()
+            plt.savefig(buffer, format="png", bbox_inches="tight", dpi=100)
+            plt.close("all")
+            return {
+                "kind": "image",
+                "png": buffer.getvalue(),
+                "description": f"Chart Title: {title}; X-Axis: {x_label}; Y-Axis: {y_label}",
+            }
+
+        if isinstance(result, (pd.DataFrame, pd.Series)):
+            is_series = isinstance(result, pd.Series)
+            frame = result.reset_index() if is_series else result
+            frame = frame.head(RESULT_ROW_LIMIT)
+            frame.columns = [str(c) for c in frame.columns]
+            return {
+                "kind": "frame",
+                "frame": _encode_frame(frame),
+                "is_series": is_series,
+                "total_rows": len(result),
+                "description": result_description,
+            }
+
+        if result is not None:
+            return {"kind": "text", "data": str(result)}
+
+        return {"kind": "stdout", "data": stdout_capture.getvalue().strip()}
+
+    except CpuLimitExceeded:
+        plt.close("all")
+        return {
+            "kind": "error",
+            "data": f"Execution Error: exceeded the {SANDBOX_CPU_SECONDS}s CPU-time limit",
+            "error_kind": "timeout",
+            "timeout_seconds": SANDBOX_CPU_SECONDS,
+        }
+    except MemoryError:
+        plt.close("all")
+        return {
+            "kind": "error",
+            "data": f"Execution Error: exceeded the {SANDBOX_MEMORY_MB}MB memory limit",
+            "error_kind": "memory",
+        }
+    except Exception as e:
+        plt.close("all")
+        return {"kind": "error", "data": f"Execution Error: {str(e)}"}
+
+
+def _load_frame(cache: DataCache, file_path: str, window: Optional[Dict[str, Any]]):
+    """
+    The dataset, or only its rows inside `window`, plus row-group pruning
+    counts. Files past the out-of-core threshold are streamed, never loaded.
+    """
+    if is_out_of_core(file_path):
+        dataset = StreamedDataset(file_path, window)
+        return dataset, dataset.pruning
+    if window:
+        return cache.get_window(file_path, window)
+    return cache.get_data(file_path), None
+
+
+def _address_space_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _apply_limits():
+    """Cap CPU time and memory for the next task relative to current usage."""
+    try:
+        import resource
+    except ImportError:
+        return
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (used + SANDBOX_CPU_SECONDS, cpu_hard))
+
+    if SANDBOX_MEMORY_MB > 0:
+        try:
+            _, as_hard = resource.getrlimit(resource.RLIMIT_AS)
+            limit = _address_space_bytes() + SANDBOX_MEMORY_MB * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, as_hard))
+        except (OSError, ValueError) as e:
+            print(f"SANDBOX: Could not apply memory limit: {e}")
+
+
+def _clear_limits():
+    try:
+        import resource
+    except ImportError:
+        return
+
+    for limit in (resource.RLIMIT_CPU, resource.RLIMIT_AS):
+        _, hard = resource.getrlimit(limit)
+        resource.setrlimit(limit, (hard, hard))
+
+
+def _raise_cpu_limit(signum, frame):
+    raise CpuLimitExceeded()
+
+
+def _worker_main(conn):
+    """
+    Worker loop. Frames the parent had cached at fork time are shared
+    copy-on-write; anything else is read per task and not kept, so a worker
+    never holds a private copy of a dataset.
+    """
+    plt.switch_backend("Agg")
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+
+    # Inherited entries live as long as the worker: the parent retires
+    # workers whose frames it has replaced or dropped
+    DataCache.TTL = float("inf")
+    DataCache.retain_loads = False
+    cache = DataCache()
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+
+        file_path, clean_code, chart_type, window = task
+        try:
+            df, pruning = _load_frame(cache, file_path, window)
+            _apply_limits()
+            outcome = execute_snippet(df, clean_code, chart_type)
+            if pruning:
+                outcome["pruning"] = pruning
+        except Exception as e:
+            outcome = {"kind": "error", "data": f"Execution Error: {str(e)}"}
+        finally:
+            _clear_limits()
+        conn.send(outcome)
+
+
+class _Worker:
+    def __init__(self, context):
+        # Frames cached in the parent right now are what the fork inherits
+        self.datasets = DataCache().cached_versions()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn,), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pool of forked processes that execute generated pandas code with
+    CPU-time, wall-clock and memory limits. Datasets live once, in the API
+    process's DataCache: a step runs on a worker forked after its frame was
+    cached, so the frame is shared copy-on-write. Workers that lack the
+    current frame, or still hold ones the parent has invalidated or expired,
+    are replaced by a fresh fork before use. So are workers that hang or die.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SandboxPool, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._idle = queue.Queue()
+            cls._instance._workers = []
+            cls._instance._context = None
+        return cls._instance
+
+    @property
+    def enabled(self) -> bool:
+        return SANDBOX_ENABLED and "fork" in multiprocessing.get_all_start_methods()
+
+    def start(self):
+        """Fork the workers (idempotent). They are re-forked as datasets get cached."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            self._context = multiprocessing.get_context("fork")
+            for _ in range(SANDBOX_WORKERS):
+                worker = _Worker(self._context)
+                self._workers.append(worker)
+                self._idle.put(worker)
+            print(f"SANDBOX: Started {SANDBOX_WORKERS} executor processes")
+
+    @staticmethod
+    def _is_stale(worker: _Worker, current: Dict[str, int]) -> bool:
+        """Whether the worker pins frames the parent no longer caches."""
+        return any(current.get(path) != version for path, version in worker.datasets.items())
+
+    def _shared_frame(self, file_path: str, window: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Cache the step's frame in this process so workers can inherit it,
+        and return the current frame versions. Windowed steps on uncached
+        files and streamed files are scanned by the worker instead.
+        """
+        cache = DataCache()
+        if not window and not is_out_of_core(file_path):
+            cache.get_data(file_path)
+        return cache.cached_versions()
+
+    def recycle_stale(self) -> int:
+        """Replace idle workers that pin invalidated frames; returns how many."""
+        if not self.enabled:
+            return 0
+        current = DataCache().cached_versions()
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        replaced = 0
+        for worker in idle:
+            if self._is_stale(worker, current):
+                worker = self._replace(worker)
+                replaced += 1
+            self._idle.put(worker)
+        return replaced
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        fresh = _Worker(self._context)
+        with self._lock:
+            self._workers = [w for w in self._workers if w is not worker] + [fresh]
+        return fresh
+
+    def run(
+        self,
+        file_path: str,
+        clean_code: str,
+        chart_type: Optional[str] = None,
+        timeout: Optional[float] = None,
+        window: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute code against the dataset at `file_path` and return its outcome.
+        `timeout` is the wall-clock deadline for this step; the worker is
+        killed and replaced when it passes. With a `window` (see
+        parquet_scan.time_window) `df` holds only the rows inside it.
+        """
+        timeout = timeout or SANDBOX_WALL_SECONDS
+        if not self.enabled:
+            # No cancellation in-process: only the sandbox enforces deadlines
+            df, pruning = _load_frame(DataCache(), file_path, window)
+            if pruning:
+                record_pruning(pruning)
+            return execute_snippet(df, clean_code, chart_type)
+
+        self.start()
+        current = self._shared_frame(file_path, window)
+        worker = self._idle.get()
+        try:
+            if self._is_stale(worker, current) or (
+                file_path in current and worker.datasets.get(file_path) != current[file_path]
+            ):
+                worker = self._replace(worker)
+            worker.conn.send((file_path, clean_code, chart_type, window))
+            if worker.conn.poll(timeout):
+                outcome = worker.conn.recv()
+                # Counted here: workers' own counters never reach /agent-stats
+                if outcome.get("pruning"):
+                    record_pruning(outcome.pop("pruning"))
+                return outcome
+
+            print(f"SANDBOX: Killing worker {worker.process.pid} after {timeout}s deadline")
+            worker = self._replace(worker)
+            return {
+                "kind": "error",
+                "data": f"Execution Error: exceeded the {timeout}s wall-clock limit",
+                "error_kind": "timeout",
+                "timeout_seconds": timeout,
+            }
+        except (EOFError, OSError) as e:
+            print(f"SANDBOX: Worker {worker.process.pid} died: {e}")
+            worker = self._replace(worker)
+            return {
+                "kind": "error",
+                "data": "Execution Error: the executor process was terminated (resource limit exceeded)",
+                "error_kind": "crashed",
+            }
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+                worker.kill()
+            self._workers = []
+            self._idle = queue.Queue()
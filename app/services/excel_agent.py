@@ -1,12 +1,8 @@
 import json
-import uuid
 import pandas as pd
 import re
 import os
 import dotenv
-import io
-import contextlib
-import matplotlib.pyplot as plt
 import json_repair
 
 from typing import Dict, Any, List
@@ -16,26 +12,59 @@ from app.core.prompts import (
     ANALYSIS_FORMAT_PROMPT,
     DOSSIER_PROMPT,
     EXCEL_BRAIN_PROMPT,
+    EXCEL_PLAN_AND_GENERATE_PROMPT,
+    OUT_OF_CORE_SCHEMA_NOTE,
     STEP_EXECUTOR_PROMPT,
 )
-from app.services.base_agent import BaseAgent
+from app.services.base_agent import BaseAgent, PLAN_AND_GENERATE_ENABLED
+from app.services.chart_spec import describe_chart_spec, spec_mode_enabled
+from app.services.code_sandbox import (
+    SANDBOX_WALL_SECONDS,
+    SandboxPool,
+    decode_frame,
+)
 from app.services.excel_agent_cache import DataCache
+from app.services.parquet_scan import sort_column, time_window
+from app.services.intent_classifier import IntentClassifier, schema_vocabulary
+from app.services.out_of_core import (
+    OUT_OF_CORE_SAMPLE_ROWS,
+    StreamedDataset,
+    is_out_of_core,
+)
+from app.services.plan_memo import PlanMemo, dataset_version
 from app.services.llm import call_llm
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.plot_store import PlotStore
+from app.services.telemetry import record_span
+from app.services.token_usage import economy_mode
 
 dotenv.load_dotenv()
 
 
 class ExcelDataAgent(BaseAgent):
     def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.step_timeout = SANDBOX_WALL_SECONDS
         self.cache_manager = DataCache()
-        self.df = self.cache_manager.get_data(file_path)
+        # Past the out-of-core threshold only a leading sample is held in
+        # memory; generated code streams the file (see out_of_core)
+        self.dataset = StreamedDataset(file_path) if is_out_of_core(file_path) else None
+        if self.dataset is not None:
+            self.df = self.dataset.head(OUT_OF_CORE_SAMPLE_ROWS)
+            self.row_count = self.dataset.num_rows
+        else:
+            self.df = self.cache_manager.get_data(file_path)
+            self.row_count = len(self.df)
 
         # Smart Schema Generation
         schema_parts = []
+        compact_parts = []
         for col in self.df.columns:
             dtype = self.df[col].dtype
+            compact_parts.append(f"- {col} ({dtype})")
             if pd.api.types.is_numeric_dtype(dtype):
-                sample = f"Range: {self.df[col].min()} to {self.df[col].max()}"
+                low, high = self._column_range(col)
+                sample = f"Range: {low} to {high}"
             else:
                 if self.df[col].nunique() < 20:
                     top_vals = self.df[col].unique()[:5].tolist()
@@ -44,15 +73,55 @@ class ExcelDataAgent(BaseAgent):
                     sample = f"Unique Values: {self.df[col].nunique()} from {len(self.df)} records"
             schema_parts.append(f"- {col} ({dtype}): {sample}")
 
+        if self.dataset is not None:
+            note = OUT_OF_CORE_SCHEMA_NOTE.format(
+                rows=self.row_count, sample_rows=len(self.df)
+            ).strip()
+            schema_parts.append(note)
+            compact_parts.append(note)
+
+        # Files sorted by a time column at ingestion can skip row groups for
+        # steps that only need a date range (see parquet_scan)
+        self.time_column = sort_column(file_path)
+        if self.time_column is None or not pd.api.types.is_datetime64_any_dtype(
+            self.df[self.time_column]
+        ):
+            self.time_column = None
+        else:
+            hint = (
+                f"Rows are sorted by {self.time_column}. A step that only needs rows "
+                f'in a date range may add "time_range": {{"start": "YYYY-MM-DD", '
+                f'"end": "YYYY-MM-DD"}} (inclusive); the step then only sees those rows.'
+            )
+            schema_parts.append(hint)
+            compact_parts.append(hint)
+
         self.schema = "\n".join(schema_parts)
+        # Names and types only, for users near their token budget
+        self.compact_schema = "\n".join(compact_parts)
+        self.vocabulary = schema_vocabulary(self.df.columns)
+
+        # A re-uploaded or rewritten file gets a new version and misses the memo
+        file_stat = os.stat(file_path)
+        self.dataset_version = dataset_version(
+            file_stat.st_mtime_ns, file_stat.st_size, self.schema
+        )
         print("SCHEMA: ", self.schema)
 
+    def _column_range(self, col: str):
+        """Min and max over the whole dataset, not just the in-memory sample."""
+        if self.dataset is not None:
+            bounds = self.dataset.column_range(col)
+            if bounds is not None:
+                return bounds
+        return self.df[col].min(), self.df[col].max()
+
     def _consult_brain(self, user_query: str, history_str: str = ""):
         messages = [
             {
                 "role": "system",
-                "content": BRAIN_PROMPT.format(
-                    schema=self.schema,
+                "content": EXCEL_BRAIN_PROMPT.format(
+                    schema=self._prompt_schema(),
                     history=history_str if history_str else "No previous conversation.",
                     query=user_query,
                 ),
@@ -60,7 +129,7 @@ class ExcelDataAgent(BaseAgent):
         ]
 
         try:
-            response = call_llm(messages, temperature=0.1, timeout=60)
+            response = call_llm(messages, temperature=0.1, timeout=60, stage="brain")
 
             if "```" in response:
                 response = response.replace("```json", "").replace("```", "").strip()
@@ -72,11 +141,14 @@ class ExcelDataAgent(BaseAgent):
 
             return brain_output
 
+        except LLMOverloaded:
+            raise
         except Exception as e:
             print(f"DEBUG: Brain malfunction: {e}")
             return {
                 "intent": "DATA_ACTION",
                 "reasoning": "Fallback due to JSON parsing error.",
+                "fallback": True,
                 "plan": [
                     {
                         "step_number": 1,
@@ -87,6 +159,26 @@ class ExcelDataAgent(BaseAgent):
                 ],
             }
 
+    def _plan_and_generate_code(self, user_query: str, history_str: str = ""):
+        """Intent, plan and pandas code for every step in one LLM call."""
+        messages = [
+            {
+                "role": "system",
+                "content": EXCEL_PLAN_AND_GENERATE_PROMPT.format(
+                    schema=self._prompt_schema(),
+                    history=history_str if history_str else "No previous conversation.",
+                    query=user_query,
+                ),
+            }
+        ]
+        return self._plan_and_generate(messages, "code", self._validate_generated_code)
+
+    def _validate_generated_code(self, code: str) -> str:
+        clean_code = self._sanitize_code(code)
+        if "result" not in clean_code:
+            raise ValueError("generated code does not assign 'result'")
+        return clean_code
+
     def _generate_step_code(
         self, user_query, step: Dict[str, Any], prev_results: List[Dict[str, Any]]
     ):
@@ -97,7 +189,7 @@ class ExcelDataAgent(BaseAgent):
                 prev_summary.append(
                     f"Step {i}: Returned table with {res.get('total_rows', 0)} rows"
                 )
-            elif res["type"] == "image":
+            elif res["type"] in ("image", "chart"):
                 prev_summary.append(
                     f"Step {i}: Created chart - {res.get('description', '')}"
                 )
@@ -112,13 +204,17 @@ class ExcelDataAgent(BaseAgent):
         step_desc = step["description"]
         if step.get("chart_type") and step["chart_type"] != "none":
             step_desc += f" (Create a {step['chart_type']} visualization)"
+            if spec_mode_enabled():
+                step_desc += (
+                    " Also assign the aggregated DataFrame being plotted to 'result'."
+                )
 
         messages = [
             {
                 "role": "system",
                 "content": STEP_EXECUTOR_PROMPT.format(
                     step_number=step["step_number"],
-                    schema=self.schema,
+                    schema=self._prompt_schema(),
                     query=user_query,
                     step_type=step["type"],
                     step_description=step_desc,
@@ -128,8 +224,12 @@ class ExcelDataAgent(BaseAgent):
         ]
 
         try:
-            code = call_llm(messages, temperature=0.0, timeout=60)
+            code = call_llm(
+                messages, temperature=0.0, timeout=60, stage="code_generation"
+            )
             return code
+        except LLMOverloaded:
+            raise
         except Exception as e:
             print(
                 f"DEBUG: Step code generation failed for step {step['step_number']}: {e}"
@@ -170,99 +270,92 @@ class ExcelDataAgent(BaseAgent):
 
         return clean_code
 
-    def _execute_code(self, clean_code: str):
-        """Execute sanitized Python code with timeout and return structured result"""
-        local_scope = {"df": self.df, "pd": pd, "plt": plt, "result": None}
-        stdout_capture = io.StringIO()
-
-        try:
-            plt.clf()
-            plt.close("all")
-
-            with contextlib.redirect_stdout(stdout_capture):
-                exec(clean_code, {"__builtins__": __builtins__}, local_scope)
-
-            result = local_scope.get("result")
-            result_description = local_scope.get("description", "")
-            print(f"DEBUG: Query Description: {result_description}")
-
-            # Check if a plot was created
-            if plt.gcf().get_axes():
-                ax = plt.gca()
-                title = ax.get_title() or "Plot"
-                x_label = ax.get_xlabel() or "X-axis"
-                y_label = ax.get_ylabel() or "Y-axis"
-                description = (
-                    f"Chart Title: {title}; X-Axis: {x_label}; Y-Axis: {y_label}"
-                )
-
-                os.makedirs("static/plots", exist_ok=True)
-                file_name = f"plot_{uuid.uuid4()}.png"
-                file_path = os.path.join("static", "plots", file_name)
-                plt.savefig(file_path, bbox_inches="tight", dpi=100)
-                plt.close("all")
-
-                return {
-                    "type": "image",
-                    "data": f"/static/plots/{file_name}",
-                    "mime": "image/png",
-                    "description": description,
-                }
-
-            if isinstance(result, pd.DataFrame):
-                if result.empty:
-                    return {
-                        "type": "text",
-                        "data": "Query returned an empty result set.",
-                    }
-                return {
-                    "type": "table",
-                    "data": result.head(50).fillna("").to_dict(orient="records"),
-                    "columns": list(result.columns),
-                    "total_rows": len(result),
-                    "description": result_description,
-                }
-
-            elif isinstance(result, pd.Series):
-                if result.empty:
-                    return {"type": "text", "data": "Query returned an empty result."}
+    def _execute_code(self, clean_code: str, step: Dict[str, Any] | None = None):
+        """Execute sanitized Python code with a per-step deadline and return structured result"""
+        chart_type = None
+        if (
+            spec_mode_enabled()
+            and step is not None
+            and step.get("chart_type", "none") != "none"
+        ):
+            chart_type = step["chart_type"]
+
+        window = None
+        if step is not None and self.time_column:
+            window = time_window(self.time_column, step.get("time_range"))
+
+        # Runs in a sandbox process with CPU, wall-clock and memory limits
+        outcome = SandboxPool().run(
+            self.file_path, clean_code, chart_type, timeout=self.step_timeout, window=window
+        )
+        kind = outcome["kind"]
+        timings = outcome.get("timings")
+        if timings:
+            record_span("code_execution", timings["exec"], error=kind == "error")
+            if kind in ("chart", "image"):
+                record_span("chart_render", timings["render"], mode=kind)
+
+        if kind == "chart":
+            spec = outcome["spec"]
+            if not spec.get("title") and step is not None:
+                spec["title"] = step.get("title", "")
+            return {
+                "type": "chart",
+                "data": spec,
+                "description": describe_chart_spec(spec),
+            }
 
-                df_temp = result.reset_index()
-                df_temp.columns = (
-                    ["index", "value"]
-                    if len(df_temp.columns) == 2
-                    else list(df_temp.columns)
-                )
+        if kind == "image":
+            return {
+                "type": "image",
+                "data": PlotStore().save_png(outcome["png"]),
+                "mime": "image/png",
+                "description": outcome["description"],
+            }
 
+        if kind == "frame":
+            result = decode_frame(outcome["frame"])
+            print(f"DEBUG: Query Description: {outcome['description']}")
+            if outcome["total_rows"] == 0:
                 return {
-                    "type": "table",
-                    "data": df_temp.head(50).fillna("").to_dict(orient="records"),
-                    "columns": list(df_temp.columns),
-                    "total_rows": len(df_temp),
-                    "description": result_description,
+                    "type": "text",
+                    "data": (
+                        "Query returned an empty result."
+                        if outcome["is_series"]
+                        else "Query returned an empty result set."
+                    ),
                 }
+            if outcome["is_series"] and len(result.columns) == 2:
+                result.columns = ["index", "value"]
+            return {
+                "type": "table",
+                "data": result.fillna("").to_dict(orient="records"),
+                "columns": list(result.columns),
+                "total_rows": outcome["total_rows"],
+                "description": outcome["description"],
+            }
 
-            elif result is not None:
-                return {"type": "text", "data": str(result)}
+        if kind == "stdout":
+            if outcome["data"]:
+                return {"type": "text", "data": outcome["data"]}
+            return {
+                "type": "text",
+                "data": "Code executed successfully but produced no output. Try assigning your result to the 'result' variable.",
+            }
 
-            else:
-                output = stdout_capture.getvalue().strip()
-                if output:
-                    return {"type": "text", "data": output}
-                else:
-                    return {
-                        "type": "text",
-                        "data": "Code executed successfully but produced no output. Try assigning your result to the 'result' variable.",
-                    }
+        if kind == "error":
+            # Keep error_kind/timeout_seconds so callers can tell timeouts apart
+            return {
+                "type": "error",
+                **{k: v for k, v in outcome.items() if k != "kind"},
+            }
 
-        except Exception as e:
-            plt.close("all")
-            return {"type": "error", "data": f"Execution Error: {str(e)}"}
+        return {"type": kind, "data": outcome["data"]}
 
     def _format_final_response(
         self, user_query: str, all_results: List[Dict[str, Any]]
-    ) -> str:
-        """Convert technical result into natural language response"""
+    ):
+        """Convert technical result into natural language response, streamed token by token"""
         # If the brain decided on general chat, this function might not be needed
         # but we keep it for data action summaries.
 
@@ -272,7 +365,7 @@ class ExcelDataAgent(BaseAgent):
                 summary_parts.append(
                     f"Step {i}: Displayed {result.get('total_rows', 0)} rows of data"
                 )
-            elif result["type"] == "image":
+            elif result["type"] in ("image", "chart"):
                 summary_parts.append(
                     f"Step {i}: Created visualization - {result.get('description', '')}"
                 )
@@ -291,12 +384,16 @@ class ExcelDataAgent(BaseAgent):
             }
         ]
 
-        try:
-            response = call_llm(messages, temperature=0.7, timeout=30)
-            return response
-        except Exception as e:
-            print(f"FORMAT ERROR: {e}")
-            return f"Analysis complete. {combined_summary}"
+        # Streams summary_delta events; `yield from` returns the full text
+        return (
+            yield from self._stream_text(
+                messages,
+                temperature=0.7,
+                timeout=30,
+                fallback=f"Analysis complete. {combined_summary}",
+                stage="format",
+            )
+        )
 
     def answer(self, user_query: str, history_str: str = ""):
         # 1. Consult the Brain (Unified Routing + Planning)
@@ -308,7 +405,23 @@ class ExcelDataAgent(BaseAgent):
             }
         )
 
-        brain_output = self._consult_brain(user_query, history_str)
+        # Trivial greetings/abuse are answered locally without the brain LLM call
+        brain_output = IntentClassifier().classify(user_query, self.vocabulary)
+        prepared_codes = {}
+        replayed = False
+        if brain_output is None:
+            # Repeated question on the same dataset version: replay plan and code
+            memo = PlanMemo().get(self.file_path, self.dataset_version, user_query)
+            combined = None
+            if memo:
+                brain_output, prepared_codes = memo["brain_output"], memo["codes"]
+                replayed = True
+            elif PLAN_AND_GENERATE_ENABLED:
+                combined = self._plan_and_generate_code(user_query, history_str)
+            if combined:
+                brain_output, prepared_codes = combined
+            elif not memo:
+                brain_output = self._consult_brain(user_query, history_str)
         intent = brain_output.get("intent", "DATA_ACTION")
 
         # 2. Handle Non-Data Intents
@@ -362,6 +475,7 @@ class ExcelDataAgent(BaseAgent):
 
         all_results = []
         all_code = []
+        step_codes = {}
 
         for step in plan_steps:
             yield json.dumps(
@@ -373,12 +487,15 @@ class ExcelDataAgent(BaseAgent):
                 }
             )
 
-            # Generate Code
-            raw_code = self._generate_step_code(user_query, step, all_results)
+            # Generate Code (unless already planned together or memoized)
+            raw_code = prepared_codes.get(str(step["step_number"])) or (
+                self._generate_step_code(user_query, step, all_results)
+            )
 
             try:
                 clean_code = self._sanitize_code(raw_code)
                 all_code.append(clean_code)
+                step_codes[str(step["step_number"])] = clean_code
             except Exception as e:
                 yield json.dumps(
                     {
@@ -393,7 +510,7 @@ class ExcelDataAgent(BaseAgent):
                 continue
 
             # Execute Code
-            exec_result = self._execute_code(clean_code)
+            exec_result = self._execute_code(clean_code, step)
             exec_result["step_number"] = step["step_number"]
             exec_result["step_description"] = step["title"]
             exec_result["step_type"] = step["type"]
@@ -402,8 +519,27 @@ class ExcelDataAgent(BaseAgent):
 
             yield json.dumps({"type": "step_result", "data": exec_result})
 
-        # 4. Final Summary
-        summary = self._format_final_response(user_query, all_results)
+        # Only fully successful plans are worth replaying
+        succeeded = len(all_results) == len(plan_steps) and all(
+            res["type"] != "error" for res in all_results
+        )
+        if replayed and not succeeded:
+            PlanMemo().discard(self.file_path, self.dataset_version, user_query)
+        elif not replayed and succeeded and not brain_output.get("fallback"):
+            PlanMemo().put(
+                self.file_path,
+                self.dataset_version,
+                user_query,
+                brain_output,
+                step_codes,
+            )
+
+        # 4. Final Summary (single-pass plans answer single values locally)
+        summary = brain_output.get("combined") and self._local_summary(all_results)
+        if not summary and economy_mode():
+            summary = self._budget_summary(all_results)
+        if not summary:
+            summary = yield from self._format_final_response(user_query, all_results)
 
         # Construct full code log
         code_log = ""
@@ -428,13 +564,16 @@ class ExcelDataAgent(BaseAgent):
     def _calculate_stats(self) -> str:
         """Run tactical scan of dataframe to extract key metrics"""
         stats = []
-        stats.append(f"Total Records: {len(self.df):,}")
+        stats.append(f"Total Records: {self.row_count:,}")
         stats.append(f"Total Columns: {len(self.df.columns)}")
+        if self.dataset is not None:
+            stats.append(
+                f"Streamed dataset: top values below come from the first {len(self.df):,} rows"
+            )
 
         for col in self.df.select_dtypes(include=["datetime", "datetimetz"]).columns:
             try:
-                start = self.df[col].min()
-                end = self.df[col].max()
+                start, end = self._column_range(col)
                 stats.append(f"Timeframe ({col}): {start} to {end}")
             except:
                 pass
@@ -451,9 +590,12 @@ class ExcelDataAgent(BaseAgent):
 
         for col in self.df.select_dtypes(include=["number"]).columns[:5]:
             try:
+                mn, mx = self._column_range(col)
+                if self.dataset is not None:
+                    # A full pass for the mean is not worth it on a streamed file
+                    stats.append(f"'{col}': Min={mn:,.2f}, Max={mx:,.2f}")
+                    continue
                 avg = self.df[col].mean()
-                mx = self.df[col].max()
-                mn = self.df[col].min()
                 stats.append(f"'{col}': Min={mn:,.2f}, Max={mx:,.2f}, Avg={avg:,.2f}")
             except:
                 pass
@@ -469,7 +611,7 @@ class ExcelDataAgent(BaseAgent):
             {
                 "role": "user",
                 "content": DOSSIER_PROMPT.format(
-                    schema=self.schema,
+                    schema=self._prompt_schema(),
                     preview=preview,
                     stats=stats_summary,
                     source_type="Excel spreadsheet",
@@ -478,7 +620,7 @@ class ExcelDataAgent(BaseAgent):
         ]
 
         try:
-            response_text = call_llm(messages, temperature=0.4, timeout=60)
+            response_text = call_llm(messages, temperature=0.4, timeout=60, stage="dossier")
 
             if "```" in response_text:
                 response_text = (
@@ -499,7 +641,7 @@ class ExcelDataAgent(BaseAgent):
         except Exception as e:
             print(f"Error generating dossier: {e}")
             return {
-                "briefing": f"I analyzed your data ({len(self.df):,} rows).",
+                "briefing": f"I analyzed your data ({self.row_count:,} rows).",
                 "key_entities": list(self.df.columns[:5]),
                 "recommended_actions": ["Show me the data", "Count rows"],
             }
@@ -1,34 +1,86 @@
+import itertools
+import os
 import pandas as pd
+import threading
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+
+from app.services.parquet_scan import scan, slice_window
+
+from app.services.single_flight import SingleFlight
+from app.services.telemetry import span
 
 
 class DataCache:
     _instance = None
     _store: Dict[str, Any] = {}
+    # Bumped on invalidate so an in-flight load cannot resurrect stale data
+    _generations: Dict[str, int] = {}
+    _lock = threading.Lock()
+    _loads = SingleFlight("dataframe_load")
+    # Identifies each loaded frame, so sandbox workers can tell whether they
+    # inherited the one currently cached
+    _versions = itertools.count(1)
     TTL = 1800
+    # Sandbox workers turn this off: they only use frames inherited from the
+    # parent, and read anything else without keeping a private copy
+    retain_loads = True
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DataCache, cls).__new__(cls)
         return cls._instance
 
+    def _fresh(self, file_path: str):
+        """Cached frame if present and unexpired (caller holds the lock)."""
+        entry = self._store.get(file_path)
+        if entry is None:
+            return None
+        current_time = time.time()
+        if current_time - entry["timestamp"] < self.TTL:
+            entry["timestamp"] = current_time
+            return entry["df"]
+        print(f"CACHE: Expired entry for {file_path}")
+        del self._store[file_path]
+        return None
+
     def get_data(self, file_path: str) -> pd.DataFrame:
         """
         Retrieves DataFrame from RAM if available and fresh.
-        Otherwise, loads it from the disk.
+        Otherwise, loads it from the disk; concurrent misses for the same
+        file share a single read.
         """
-        current_time = time.time()
+        with span("cache_lookup", cache="dataframe") as attrs:
+            with self._lock:
+                df = self._fresh(file_path)
+            if df is not None:
+                attrs["hit"] = True
+                return df
 
-        if file_path in self._store:
-            entry = self._store[file_path]
+        return self._loads.do(file_path, lambda: self._load(file_path))
 
-            if current_time - entry["timestamp"] < self.TTL:
-                entry["timestamp"] = current_time
-                return entry["df"]
-            else:
-                print(f"CACHE: Expired entry for {file_path}")
-                del self._store[file_path]
+    def get_window(
+        self, file_path: str, window: Dict[str, Any]
+    ) -> Tuple[pd.DataFrame, Optional[Dict[str, int]]]:
+        """
+        Rows inside a time window (see parquet_scan.time_window). A cached
+        frame is sliced in memory; otherwise only the overlapping row groups
+        are read from disk and nothing is cached. Returns the frame and the
+        row-group counts of the scan (None when served from memory).
+        """
+        with self._lock:
+            df = self._fresh(file_path)
+        if df is not None:
+            return slice_window(df, window), None
+        return scan(file_path, window)
+
+    def _load(self, file_path: str) -> pd.DataFrame:
+        with self._lock:
+            # A load that finished just before this one became leader
+            df = self._fresh(file_path)
+            generation = self._generations.get(file_path, 0)
+        if df is not None:
+            return df
 
         print(f"CACHE MISS: Loading from disk -> {file_path}")
         try:
@@ -38,15 +90,37 @@ class DataCache:
                 df = pd.read_csv(file_path)
             else:
                 df = pd.read_parquet(file_path)
-
-            self._store[file_path] = {"df": df, "timestamp": current_time}
-            return df
         except Exception as e:
             print(f"CACHE ERROR: {e}")
             raise e
 
+        with self._lock:
+            if self.retain_loads and self._generations.get(file_path, 0) == generation:
+                self._store[file_path] = {
+                    "df": df,
+                    "timestamp": time.time(),
+                    "version": next(self._versions),
+                }
+        return df
+
+    def cached_versions(self) -> Dict[str, int]:
+        """Version of every frame held right now, keyed by file path."""
+        with self._lock:
+            return {path: entry["version"] for path, entry in self._store.items()}
+
     def invalidate(self, file_path: str):
         """Manually remove a file from memory (e.g., on chat delete)"""
-        if file_path in self._store:
-            del self._store[file_path]
+        with self._lock:
+            self._generations[file_path] = self._generations.get(file_path, 0) + 1
+            removed = self._store.pop(file_path, None)
+        if removed is not None:
             print(f"CACHE: Manually cleared {file_path}")
+
+
+def _reset_lock_after_fork():
+    # Sandbox workers may be forked while another thread holds the lock
+    DataCache._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lock_after_fork)
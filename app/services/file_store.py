@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+from typing import Any, Dict, Optional
+from sqlalchemy import text
+
+from app.services.ingestion import _transform_to_parquet
+
+DATA_DIR = "data"
+
+# Serializes acquire/release of one user's content hash across processes for
+# the rest of the transaction, so a release never deletes a parquet file that
+# a concurrent upload of the same content is about to reuse. Ingesting
+# happens before the lock is taken.
+_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtextextended(:user_id || ':' || :sha, 0))"
+
+_LOOKUP_SQL = """
+    SELECT file_path FROM file_blobs
+    WHERE user_id = CAST(:user_id AS uuid) AND content_sha256 = :sha
+"""
+
+_REUSE_SQL = """
+    UPDATE file_blobs SET ref_count = ref_count + 1
+    WHERE user_id = CAST(:user_id AS uuid) AND content_sha256 = :sha
+    RETURNING file_path, row_count, columns
+"""
+
+_INSERT_SQL = """
+    INSERT INTO file_blobs
+        (user_id, content_sha256, file_path, size_bytes, row_count, columns, ref_count)
+    VALUES
+        (CAST(:user_id AS uuid), :sha, :file_path, :size_bytes, :row_count,
+         CAST(:columns AS jsonb), 1)
+"""
+
+_REPAIR_SQL = """
+    UPDATE file_blobs
+    SET file_path = :file_path, row_count = :row_count, columns = CAST(:columns AS jsonb)
+    WHERE user_id = CAST(:user_id AS uuid) AND content_sha256 = :sha
+"""
+
+_RELEASE_SQL = """
+    UPDATE file_blobs SET ref_count = ref_count - 1
+    WHERE user_id = CAST(:user_id AS uuid) AND content_sha256 = :sha
+    RETURNING ref_count, file_path
+"""
+
+_DELETE_SQL = """
+    DELETE FROM file_blobs
+    WHERE user_id = CAST(:user_id AS uuid) AND content_sha256 = :sha AND ref_count <= 0
+"""
+
+
+def blob_key(user_id, sha256: str) -> str:
+    """Prefix of a user's parquet for some content; never equal across users."""
+    return hashlib.sha256(f"{user_id}:{sha256}".encode()).hexdigest()
+
+
+class FileStore:
+    """
+    Content-addressed storage for ingested uploads. A user's files with the
+    same SHA-256 share one parquet (and with it the DataCache entry, plan
+    memo and dossier); `file_blobs.ref_count` counts the files rows pointing
+    at it, and the parquet is deleted when the last one goes. Blobs are
+    scoped to their owner, so an upload reveals nothing about other users'.
+
+    Both methods run inside the caller's transaction; the caller commits.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FileStore, cls).__new__(cls)
+            cls._instance._stats = {"ingested": 0, "deduplicated": 0, "released": 0}
+        return cls._instance
+
+    @staticmethod
+    def _intact(row) -> bool:
+        return row is not None and os.path.exists(os.path.join(DATA_DIR, row["file_path"]))
+
+    def acquire(
+        self,
+        db,
+        user_id,
+        sha256: str,
+        size_bytes: int,
+        temp_path: str,
+        original_filename: str,
+    ) -> Dict[str, Any]:
+        """
+        Reference the user's parquet for this content, ingesting `temp_path`
+        only if no intact copy exists. Returns the `_transform_to_parquet`
+        metadata. The temp file is always removed.
+        """
+        key = {"user_id": str(user_id), "sha": sha256}
+        staged = None
+        try:
+            # Ingest outside the lock, into a private name, so concurrent
+            # uploads never queue behind a transform
+            existing = db.execute(text(_LOOKUP_SQL), key).mappings().first()
+            if not self._intact(existing):
+                staged = _transform_to_parquet(
+                    temp_path, original_filename, file_id=f"staged_{uuid.uuid4()}"
+                )
+
+            db.execute(text(_LOCK_SQL), key)
+            existing = db.execute(text(_REUSE_SQL), key).mappings().first()
+            if self._intact(existing):
+                with self._lock:
+                    self._stats["deduplicated"] += 1
+                print(f"FILES: Reusing {existing['file_path']} for {original_filename}")
+                return {
+                    "file_id": sha256,
+                    "filename": existing["file_path"],
+                    "rows": existing["row_count"],
+                    "columns": existing["columns"],
+                }
+
+            if staged is None:
+                # The copy seen before locking was released meanwhile; rare
+                # enough to ingest under the lock
+                staged = _transform_to_parquet(
+                    temp_path, original_filename, file_id=f"staged_{uuid.uuid4()}"
+                )
+            # A fresh name per ingest, so removing a released copy after its
+            # commit can never hit one ingested again meanwhile
+            filename = f"{blob_key(user_id, sha256)}_{uuid.uuid4().hex[:12]}.parquet"
+            os.replace(
+                os.path.join(DATA_DIR, staged["filename"]), os.path.join(DATA_DIR, filename)
+            )
+            metadata = {**staged, "file_id": sha256, "filename": filename}
+            staged = None
+            params = {
+                **key,
+                "file_path": filename,
+                "size_bytes": size_bytes,
+                "row_count": metadata["rows"],
+                "columns": json.dumps(metadata["columns"]),
+            }
+            # A row without its parquet (lost or deleted by hand) is repaired
+            db.execute(text(_REPAIR_SQL if existing else _INSERT_SQL), params)
+            with self._lock:
+                self._stats["ingested"] += 1
+            return metadata
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if staged is not None:
+                staged_path = os.path.join(DATA_DIR, staged["filename"])
+                if os.path.exists(staged_path):
+                    os.remove(staged_path)
+
+    def release(self, db, user_id, sha256: str) -> Optional[str]:
+        """
+        Drop one reference. When it was the last, delete the blob row and
+        return the parquet's path; otherwise return None. The caller removes
+        the file once the transaction has committed, so a rollback never
+        leaves rows pointing at a missing parquet. Any pending ORM delete of
+        the files row must be flushed first: the row references the blob.
+        """
+        key = {"user_id": str(user_id), "sha": sha256}
+        db.execute(text(_LOCK_SQL), key)
+        row = db.execute(text(_RELEASE_SQL), key).mappings().first()
+        if row is None or row["ref_count"] > 0:
+            return None
+
+        db.execute(text(_DELETE_SQL), key)
+        file_path = os.path.join(DATA_DIR, row["file_path"])
+        with self._lock:
+            self._stats["released"] += 1
+        print(f"FILES: Released {file_path}")
+        return file_path
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        handled = stats["ingested"] + stats["deduplicated"]
+        stats["dedup_ratio"] = round(stats["deduplicated"] / handled, 3) if handled else 0.0
+        return stats
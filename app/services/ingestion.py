@@ -1,11 +1,140 @@
 import pandas as pd
 import os
+import re
+import warnings
 from fastapi import HTTPException
 import uuid
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
+from typing import List, Optional, Tuple
 
-def _transform_to_parquet(temp_file_path: str, original_filename: str):
+from app.services.out_of_core import is_out_of_core
+
+from app.services.parquet_scan import (
+    PARQUET_COMPRESSION,
+    PARQUET_ROW_GROUP_ROWS,
+    SORT_COLUMN_KEY,
+)
+
+_TIME_NAME = re.compile(r"date|time|day|period|_at$|_on$")
+_KEY_NAME = re.compile(r"^id$|_id$|^key$|_key$")
+
+
+def _sort_column(df: pd.DataFrame) -> Optional[str]:
+    """
+    Column to sort by so row-group statistics can prune scans: the first
+    datetime column, else a date-like text column (converted in place when
+    every value parses), else an integer key.
+    """
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+    for col in df.columns:
+        if not _TIME_NAME.search(col) or not pd.api.types.is_string_dtype(df[col]):
+            continue
+        values = df[col].dropna()
+        if values.empty:
+            continue
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            parsed = pd.to_datetime(df[col], errors="coerce", format="mixed")
+        if parsed.notna().sum() == len(values):
+            df[col] = parsed
+            return col
+    for col in df.columns:
+        if _KEY_NAME.search(col) and pd.api.types.is_integer_dtype(df[col]):
+            return col
+    return None
+
+
+def _write_parquet(df: pd.DataFrame, path: str, sort_column: Optional[str]):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if sort_column:
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}), SORT_COLUMN_KEY: sort_column.encode()}
+        )
+    pq.write_table(
+        table,
+        path,
+        row_group_size=PARQUET_ROW_GROUP_ROWS,
+        compression=PARQUET_COMPRESSION,
+        write_statistics=True,
+    )
+
+
+def _normalize_columns(columns: pd.Index) -> pd.Index:
+    return (
+        columns.str.strip()
+        .str.lower()
+        .str.replace(" ", "_")
+        .str.replace(r"[^\w]", "", regex=True)
+    )
+
+
+def _stream_csv_to_parquet(temp_file_path: str, path: str) -> Tuple[int, List[str]]:
+    """
+    Convert a CSV too large for memory batch by batch. Types are inferred
+    from the first block, and the output keeps file order: sorting would
+    need the whole file.
+    """
+    reader = pacsv.open_csv(
+        temp_file_path, read_options=pacsv.ReadOptions(block_size=64 * 1024 * 1024)
+    )
+    names = list(_normalize_columns(pd.Index(reader.schema.names)))
+    schema = pa.schema(
+        [field.with_name(name) for field, name in zip(reader.schema, names)]
+    )
+    rows, pending, pending_rows = 0, [], 0
+    with pq.ParquetWriter(
+        path, schema, compression=PARQUET_COMPRESSION, write_statistics=True
+    ) as writer:
+        for batch in reader:
+            pending.append(pa.RecordBatch.from_arrays(batch.columns, schema=schema))
+            pending_rows += batch.num_rows
+            if pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                writer.write_table(
+                    pa.Table.from_batches(pending), row_group_size=PARQUET_ROW_GROUP_ROWS
+                )
+                rows += pending_rows
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(
+                pa.Table.from_batches(pending), row_group_size=PARQUET_ROW_GROUP_ROWS
+            )
+            rows += pending_rows
+    return rows, names
+
+
+def _transform_to_parquet(
+    temp_file_path: str, original_filename: str, file_id: str = None
+):
     try:
+        # Content-addressed callers pass the upload's hash as the id
+        file_uuid = file_id or str(uuid.uuid4())
+        parquet_filename = f"{file_uuid}.parquet"
+
+        os.makedirs("data", exist_ok=True)
+        parquet_path = f"data/{parquet_filename}"
+        # Readers never see a half-written file under the final name
+        partial_path = f"{parquet_path}.{os.getpid()}.tmp"
+
+        if temp_file_path.endswith(".csv") and is_out_of_core(temp_file_path):
+            try:
+                rows, columns = _stream_csv_to_parquet(temp_file_path, partial_path)
+                os.replace(partial_path, parquet_path)
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+            return {
+                "file_id": file_uuid,
+                "filename": parquet_filename,
+                "rows": rows,
+                "columns": columns,
+                "sort_column": None,
+            }
+
         if temp_file_path.endswith(".csv"):
             df = pd.read_csv(temp_file_path)
         elif temp_file_path.endswith(".xlsx"):
@@ -13,26 +142,24 @@ def _transform_to_parquet(temp_file_path: str, original_filename: str):
         else:
             raise ValueError("Unsupported format. Please upload CSV or Excel.")
 
-        df.columns = (
-            df.columns.str.strip()
-            .str.lower()
-            .str.replace(" ", "_")
-            .str.replace(r"[^\w]", "", regex=True)
-        )
-
-        file_uuid = str(uuid.uuid4())
-        parquet_filename = f"{file_uuid}.parquet"
+        df.columns = _normalize_columns(df.columns)
 
-        os.makedirs("data", exist_ok=True)
-        parquet_path = f"data/{parquet_filename}"
+        # Sorted row groups have narrow min/max ranges that filters can skip
+        sort_column = _sort_column(df)
+        if sort_column:
+            df = df.sort_values(
+                sort_column, kind="stable", na_position="last", ignore_index=True
+            )
 
-        df.to_parquet(parquet_path, index=False)
+        _write_parquet(df, partial_path, sort_column)
+        os.replace(partial_path, parquet_path)
 
         metadata = {
             "file_id": file_uuid,
             "filename": parquet_filename,  # The system name (UUID.parquet)
             "rows": df.shape[0],
             "columns": list(df.columns),
+            "sort_column": sort_column,
         }
 
         return metadata
@@ -0,0 +1,343 @@
+import json
+import os
+import threading
+import time
+import traceback
+import dotenv
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+
+from app.core.database import SessionLocal
+from app.services.telemetry import metrics
+from app.services.token_usage import usage_scope
+
+dotenv.load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# How often progress streams re-check jobs run by another process
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# Running jobs without a heartbeat for this long were orphaned by a restart
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "900"))
+# How often a process touches the jobs it is running; well under JOB_STALE_AFTER
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "60"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+TERMINAL = (SUCCEEDED, FAILED)
+
+_INSERT_SQL = """
+    INSERT INTO jobs (user_id, kind, payload)
+    VALUES (:user_id, :kind, CAST(:payload AS jsonb))
+    RETURNING id
+"""
+
+# Only one worker (in any process) claims a queued job
+_CLAIM_SQL = """
+    UPDATE jobs SET status = 'running', started_at = now(), updated_at = now()
+    WHERE id = :id AND status = 'queued'
+    RETURNING user_id, kind, payload
+"""
+
+_PROGRESS_SQL = """
+    UPDATE jobs
+    SET stage = :stage,
+        progress = progress || jsonb_build_array(CAST(:event AS jsonb)),
+        updated_at = now()
+    WHERE id = :id
+"""
+
+# A long single stage emits no progress; this keeps it from looking orphaned
+_HEARTBEAT_SQL = """
+    UPDATE jobs SET updated_at = now()
+    WHERE id = ANY(CAST(:ids AS uuid[])) AND status = 'running'
+"""
+
+_FINISH_SQL = """
+    UPDATE jobs
+    SET status = :status, result = CAST(:result AS jsonb), error = :error,
+        finished_at = now(), updated_at = now()
+    WHERE id = :id
+"""
+
+_REQUEUE_SQL = """
+    UPDATE jobs SET status = 'queued', updated_at = now()
+    WHERE status = 'running' AND updated_at < now() - make_interval(secs => :stale)
+"""
+
+_PENDING_SQL = "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+
+_SNAPSHOT_SQL = """
+    SELECT status, stage, progress, result, error FROM jobs WHERE id = :id
+"""
+
+metrics.describe("consigliere_job_seconds", "Background job duration by kind and outcome.")
+metrics.describe("consigliere_job_stage_seconds", "Background job stage duration.")
+
+
+class JobContext:
+    """Handed to job handlers: their inputs plus a way to report progress."""
+
+    def __init__(
+        self, runner: "JobRunner", job_id: str, kind: str, user_id: str, payload: dict
+    ):
+        self._runner = runner
+        self.job_id = job_id
+        self.kind = kind
+        self.user_id = user_id
+        self.payload = payload
+
+    @contextmanager
+    def stage(self, name: str, **detail):
+        """Report a stage as running, then done with its duration."""
+        self._runner._emit(
+            self.job_id, {"type": "stage", "stage": name, "status": "running", **detail}
+        )
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self._runner._emit(
+                self.job_id, {"type": "stage", "stage": name, "status": "failed"}
+            )
+            raise
+        seconds = time.perf_counter() - started
+        metrics.observe("consigliere_job_stage_seconds", seconds, kind=self.kind, stage=name)
+        self._runner._emit(
+            self.job_id,
+            {"type": "stage", "stage": name, "status": "done", "ms": round(seconds * 1000, 1)},
+        )
+
+
+class JobRunner:
+    """
+    In-process worker pool for slow onboarding work (file analysis, database
+    connections). Jobs are rows in the jobs table, so their status and
+    progress survive restarts and can be followed from any process; queued
+    jobs, and running jobs orphaned by a restart, are picked up on `start`.
+    A job counts as orphaned once its process stops heartbeating it.
+
+    Handlers are registered per kind and receive a JobContext; what they
+    return is stored as the job's result, what they raise as its error.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobRunner, cls).__new__(cls)
+            cls._instance._handlers = {}
+            cls._instance._executor = None
+            cls._instance._stopped = threading.Event()
+            # job_id -> {"events", "status", "result", "error"} for jobs run here
+            cls._instance._live = {}
+            cls._instance._cond = threading.Condition()
+            cls._instance._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "resumed": 0}
+        return cls._instance
+
+    def register(self, kind: str, handler: Callable[[JobContext], Any]):
+        self._handlers[kind] = handler
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=JOB_WORKERS, thread_name_prefix="job"
+                )
+                self._stopped = threading.Event()
+                threading.Thread(
+                    target=self._heartbeat,
+                    args=(self._stopped,),
+                    name="job-heartbeat",
+                    daemon=True,
+                ).start()
+            return self._executor
+
+    def start(self):
+        self._ensure_executor()
+        with SessionLocal() as db:
+            db.execute(text(_REQUEUE_SQL), {"stale": JOB_STALE_AFTER})
+            db.commit()
+            pending = [str(row[0]) for row in db.execute(text(_PENDING_SQL))]
+        resumed = sum(1 for job_id in pending if self._enqueue(job_id))
+        with self._lock:
+            self._stats["resumed"] += resumed
+        if resumed:
+            print(f"JOBS: Resumed {resumed} pending jobs")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._stopped.set()
+        if executor is not None:
+            # Unstarted jobs stay queued in the table for the next start
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, db, user_id, kind: str, payload: Dict[str, Any]) -> str:
+        """Persist a job and queue it; returns the job id."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = str(
+            db.execute(
+                text(_INSERT_SQL),
+                {"user_id": str(user_id), "kind": kind, "payload": json.dumps(payload)},
+            ).scalar()
+        )
+        db.commit()
+        with self._lock:
+            self._stats["submitted"] += 1
+        self._enqueue(job_id)
+        return job_id
+
+    def _enqueue(self, job_id: str) -> bool:
+        """Queue a job here unless this process already has; True if queued."""
+        with self._cond:
+            if job_id in self._live:
+                return False
+            self._live[job_id] = {
+                "events": [],
+                "status": QUEUED,
+                "result": None,
+                "error": None,
+            }
+        self._ensure_executor().submit(self._run, job_id)
+        return True
+
+    def _run(self, job_id: str):
+        with SessionLocal() as db:
+            claimed = db.execute(text(_CLAIM_SQL), {"id": job_id}).first()
+            db.commit()
+        if claimed is None:
+            # Another process got there first; its progress is in the table
+            with self._cond:
+                self._live.pop(job_id, None)
+                self._cond.notify_all()
+            return
+
+        user_id, kind, payload = str(claimed[0]), claimed[1], claimed[2] or {}
+        with self._cond:
+            self._live[job_id]["status"] = RUNNING
+            self._cond.notify_all()
+
+        context = JobContext(self, job_id, kind, user_id, payload)
+        started = time.perf_counter()
+        result, error = None, None
+        try:
+            with usage_scope(user_id):
+                result = self._handlers[kind](context)
+        except Exception as e:
+            traceback.print_exc()
+            error = str(e) or type(e).__name__
+        status = FAILED if error else SUCCEEDED
+        metrics.observe(
+            "consigliere_job_seconds", time.perf_counter() - started, kind=kind, status=status
+        )
+        print(f"JOBS: {kind} {job_id} {status}")
+
+        try:
+            with SessionLocal() as db:
+                db.execute(
+                    text(_FINISH_SQL),
+                    {
+                        "id": job_id,
+                        "status": status,
+                        "result": None if result is None else json.dumps(result, default=str),
+                        "error": error,
+                    },
+                )
+                db.commit()
+        except Exception as e:
+            print(f"JOBS: Failed to record {status} for {job_id}: {e}")
+
+        with self._cond:
+            entry = self._live.pop(job_id, None)
+            if entry is not None:
+                entry.update(status=status, result=result, error=error)
+            self._stats[status] += 1
+            self._cond.notify_all()
+
+    def _heartbeat(self, stopped: threading.Event):
+        """Touch the jobs running here so no restarting process requeues them."""
+        while not stopped.wait(JOB_HEARTBEAT_INTERVAL):
+            with self._cond:
+                running = [
+                    job_id for job_id, entry in self._live.items() if entry["status"] == RUNNING
+                ]
+            if not running:
+                continue
+            try:
+                with SessionLocal() as db:
+                    db.execute(text(_HEARTBEAT_SQL), {"ids": running})
+                    db.commit()
+            except Exception as e:
+                print(f"JOBS: Failed to record heartbeat: {e}")
+
+    def _emit(self, job_id: str, event: Dict[str, Any]):
+        with self._cond:
+            entry = self._live.get(job_id)
+            if entry is not None:
+                entry["events"].append(event)
+                self._cond.notify_all()
+        try:
+            with SessionLocal() as db:
+                db.execute(
+                    text(_PROGRESS_SQL),
+                    {"id": job_id, "stage": event.get("stage"), "event": json.dumps(event)},
+                )
+                db.commit()
+        except Exception as e:
+            # Progress is best effort; the job itself carries on
+            print(f"JOBS: Failed to record progress for {job_id}: {e}")
+
+    def snapshot(self, db, job_id: str) -> Optional[Dict[str, Any]]:
+        row = db.execute(text(_SNAPSHOT_SQL), {"id": job_id}).mappings().first()
+        return dict(row) if row else None
+
+    def events(self, job_id: str, after: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Progress events after the first `after`, waiting up to
+        JOB_POLL_INTERVAL for new ones, plus the job's current state
+        ({"status", "result", "error"}).
+        """
+        with self._cond:
+            entry = self._live.get(job_id)
+            if entry is not None:
+                self._cond.wait_for(
+                    lambda: len(entry["events"]) > after or entry["status"] in TERMINAL,
+                    timeout=JOB_POLL_INTERVAL,
+                )
+                return list(entry["events"][after:]), {
+                    key: entry[key] for key in ("status", "result", "error")
+                }
+
+        # Run by another process, or already finished: follow the table
+        with SessionLocal() as db:
+            job = self.snapshot(db, job_id) or {"status": FAILED, "error": "Job not found"}
+        events = (job.get("progress") or [])[after:]
+        if not events and job["status"] not in TERMINAL:
+            time.sleep(JOB_POLL_INTERVAL)
+        return events, {key: job.get(key) for key in ("status", "result", "error")}
+
+    def stream(self, job_id: str):
+        """NDJSON progress for a job, ending with its outcome."""
+        sent = 0
+        while True:
+            events, state = self.events(job_id, sent)
+            for event in events:
+                yield json.dumps(event) + "\n"
+            sent += len(events)
+            if state["status"] in TERMINAL and not events:
+                yield json.dumps({"type": "job", **state}, default=str) + "\n"
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            live = [entry["status"] for entry in self._live.values()]
+        return {
+            **self._stats,
+            "queued": live.count(QUEUED),
+            "running": live.count(RUNNING),
+            "workers": JOB_WORKERS,
+        }
@@ -1,8 +1,32 @@
+import hashlib
+import json
 import os
+import time
 import dotenv
 from litellm import completion
 import litellm
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_exponential,
+)
+
+from app.services.llm_resilience import (
+    CircuitBreakers,
+    LLMError,
+    hedged,
+    is_rate_limit,
+    is_retryable,
+    provider_for,
+    to_llm_error,
+)
+from app.services.llm_router import LLMRouter
+from app.services.llm_scheduler import LLMOverloaded, LLMScheduler
+from app.services.single_flight import SingleFlight
+from app.services.telemetry import record_span, span
+from app.services.token_usage import TokenLedger
 
 dotenv.load_dotenv()
 
@@ -13,30 +37,271 @@ litellm.suppress_debug_info = True
 MODEL_NAME = os.getenv("MODEL_NAME", "ollama/llama2:7b")  # default to local
 
 # MODEL_NAME = "ollama/llama2:7b"
-if MODEL_NAME == "ollama/llama2:7b":
-    litellm.api_base = "http://localhost:11434"
+OLLAMA_API_BASE = "http://localhost:11434"
+
+# USD per 1K tokens; overrides litellm's price table (e.g. for self-hosted models)
+LLM_PROMPT_COST_PER_1K = os.getenv("LLM_PROMPT_COST_PER_1K")
+LLM_COMPLETION_COST_PER_1K = os.getenv("LLM_COMPLETION_COST_PER_1K")
+
+# Seconds the scheduler stops dispatching to a model after a rate-limit error
+LLM_RATE_LIMIT_PAUSE = float(os.getenv("LLM_RATE_LIMIT_PAUSE", "5"))
+# Seconds after which a failing model stops retrying and its fallback takes over
+LLM_RETRY_BUDGET = float(os.getenv("LLM_RETRY_BUDGET", "20"))
+
+_in_flight = SingleFlight("llm")
+
+
+def _usage_tokens(usage):
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+def _usage_cost(model: str, prompt_tokens: int, completion_tokens: int, route: dict) -> float:
+    prompt_rate = route.get("prompt_cost_per_1k")
+    completion_rate = route.get("completion_cost_per_1k")
+    if prompt_rate is None and completion_rate is None and model == MODEL_NAME:
+        # The global override prices MODEL_NAME only
+        prompt_rate, completion_rate = LLM_PROMPT_COST_PER_1K, LLM_COMPLETION_COST_PER_1K
+    if prompt_rate is not None or completion_rate is not None:
+        return (
+            prompt_tokens * float(prompt_rate or 0)
+            + completion_tokens * float(completion_rate or 0)
+        ) / 1000
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        return prompt_cost + completion_cost
+    except Exception:
+        # Unknown to litellm's price table
+        return 0.0
+
+
+def _account(
+    messages: list, tokens: dict, model: str, stage: str, seconds: float, fallback: bool
+):
+    """
+    Record usage for the caller's user and chat (see token_usage.usage_scope)
+    and latency and cost for the stage (see llm_router.LLMRouter).
+    """
+    router = LLMRouter()
+    cost = _usage_cost(
+        model, tokens["prompt_tokens"], tokens["completion_tokens"], router.route(stage)
+    )
+    TokenLedger().record(
+        messages, model, tokens["prompt_tokens"], tokens["completion_tokens"], cost
+    )
+    router.record(stage, model, seconds, cost, fallback=fallback)
+
+
+def _api_base(model: str, route: dict):
+    if model in route.get("api_bases", {}):
+        return route["api_bases"][model]
+    if route.get("api_base") and model == route["model"]:
+        return route["api_base"]
+    if model == "ollama/llama2:7b":
+        return OLLAMA_API_BASE
+    return None
+
+
+def _iter_deltas(
+    response,
+    messages: list,
+    started: float,
+    ticket,
+    model: str,
+    stage: str,
+    fallback: bool,
+    provider: str,
+):
+    """
+    Yield text deltas from a streamed completion, timed until the last token.
+    Holds the scheduler slot until the stream ends, so consume or close it.
+    """
+    usage = None
+    try:
+        for chunk in response:
+            # The usage-only chunk at the end carries no choices
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except Exception as e:
+        print(f"LLM STREAM ERROR: {e}")
+        if is_retryable(e):
+            CircuitBreakers().failure(provider)
+        raise LLMError(f"LLM stream interrupted: {str(e)}", model=model) from e
+    finally:
+        tokens = _usage_tokens(usage)
+        seconds = time.perf_counter() - started
+        record_span("llm", seconds, model=model, stage=stage, stream=True, **tokens)
+        _account(messages, tokens, model, stage, seconds, fallback)
+        LLMScheduler().release(
+            model, ticket, tokens["prompt_tokens"] + tokens["completion_tokens"]
+        )
+
+
+def _hedge_model(route: dict, model: str, temperature: float, stream: bool):
+    """Second model to race against `model`, if the route hedges this call."""
+    if stream or temperature != 0 or not route.get("hedge_after"):
+        return None
+    hedge_model = route.get("hedge_model") or next(iter(route.get("fallbacks", [])), None)
+    return hedge_model if hedge_model and hedge_model != model else None
+
+
+def call_llm(
+    messages: list,
+    temperature: float = 0.0,
+    timeout: int = 60,
+    stream: bool = False,
+    stage: str = "default",
+):
+    """
+    Return the completion text, or with `stream=True` an iterator of text
+    deltas. Retries only cover opening the stream, not tokens already sent,
+    and only transient errors (see llm_resilience.is_retryable).
+
+    `stage` names the call site (see llm_router.STAGES); its route picks the
+    model, may override `timeout`, and lists fallback models tried in order
+    once the primary has failed or its provider's circuit is open. A route
+    with `hedge_after` also sends deterministic (temperature 0) requests to
+    `hedge_model` when the primary has not answered by then.
+
+    Identical non-streaming requests already in flight (same dossier schema,
+    same question from several users) share that request's response; the
+    tokens are accounted to the caller that sent it.
+
+    Raises LLMError, or LLMOverloaded when the request was shed.
+    """
+    router = LLMRouter()
+    route = router.route(stage)
+    if route.get("timeout"):
+        timeout = route["timeout"]
+
+    chain = router.models(stage)
+    for position, model in enumerate(chain):
+        fallback = position > 0
+        started = time.perf_counter()
+        try:
+            if stream:
+                return _call_llm(
+                    model, messages, temperature, timeout, True, stage, fallback
+                )
+
+            def send(model=model, fallback=fallback):
+                return _call_llm(
+                    model, messages, temperature, timeout, False, stage, fallback
+                )
+
+            hedge_model = None if fallback else _hedge_model(route, model, temperature, stream)
+            if hedge_model:
+                request = lambda: hedged(
+                    send, lambda: send(hedge_model), float(route["hedge_after"]), stage
+                )
+            else:
+                request = send
+
+            key = hashlib.sha256(
+                json.dumps(
+                    {"model": model, "messages": messages, "temperature": temperature},
+                    sort_keys=True,
+                    default=str,
+                ).encode()
+            ).hexdigest()
+            return _in_flight.do(key, request)
+        except Exception as e:
+            router.record(
+                stage, model, time.perf_counter() - started, fallback=fallback, error=True
+            )
+            if position == len(chain) - 1:
+                raise
+            print(f"LLM FALLBACK: {stage} {model} failed ({e}); trying {chain[position + 1]}")
 
 
 @retry(
-    stop=stop_after_attempt(3),
+    stop=stop_after_attempt(3) | stop_after_delay(LLM_RETRY_BUDGET),
     wait=wait_exponential(multiplier=1, min=2, max=10),
+    retry=retry_if_exception(is_retryable),
     reraise=True,
 )
-def call_llm(messages: list, temperature: float = 0.0, timeout: int = 60) -> str:
+def _call_llm(
+    model: str,
+    messages: list,
+    temperature: float = 0.0,
+    timeout: int = 60,
+    stream: bool = False,
+    stage: str = "default",
+    fallback: bool = False,
+):
+    route = LLMRouter().route(stage)
+    api_base = _api_base(model, route)
+    extra = {"api_base": api_base} if api_base else {}
+
+    # An open circuit fails fast, before queueing for a slot
+    breakers = CircuitBreakers()
+    provider = provider_for(model, api_base)
+    breakers.allow(provider, model)
+
+    # Each attempt queues for a slot; backoff between attempts holds none
+    scheduler = LLMScheduler()
     try:
-        response = completion(
-            model=MODEL_NAME,
-            messages=messages,
-            temperature=temperature,
-            timeout=timeout,
-        )
+        ticket = scheduler.acquire(model, messages)
+    except LLMOverloaded:
+        breakers.cancel(provider)
+        raise
+
+    tokens_used = 0
+    handed_to_stream = False
+    try:
+        started = time.perf_counter()
+        if stream:
+            response = completion(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                timeout=timeout,
+                stream=True,
+                stream_options={"include_usage": True},
+                **extra,
+            )
+            breakers.success(provider)
+            handed_to_stream = True
+            return _iter_deltas(
+                response, messages, started, ticket, model, stage, fallback, provider
+            )
+
+        with span("llm", model=model, stage=stage) as attrs:
+            response = completion(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                timeout=timeout,
+                **extra,
+            )
+            tokens = _usage_tokens(getattr(response, "usage", None))
+            attrs.update(tokens)
+        breakers.success(provider)
+        _account(messages, tokens, model, stage, time.perf_counter() - started, fallback)
+        tokens_used = tokens["prompt_tokens"] + tokens["completion_tokens"]
         return response.choices[0].message.content.strip()
-    except litellm.exceptions.RateLimitError as e:
-        print(f"RATE LIMIT HIT: {e}")
-        raise Exception("Rate limit exceeded. Please wait a moment and try again.")
-    except litellm.exceptions.Timeout as e:
-        print(f"TIMEOUT: {e}")
-        raise Exception("LLM request timed out. Try a simpler query.")
     except Exception as e:
-        print(f"LLM ERROR: {e}")
-        raise Exception(f"LLM service error: {str(e)}")
+        error = to_llm_error(e, model)
+        if error.retryable:
+            breakers.failure(provider)
+        else:
+            # The provider answered; the request itself was rejected
+            breakers.success(provider)
+        if is_rate_limit(e):
+            scheduler.pause(model, LLM_RATE_LIMIT_PAUSE)
+        print(f"LLM ERROR ({'retryable' if error.retryable else 'fatal'}): {e}")
+        raise error from e
+    finally:
+        if not handed_to_stream:
+            scheduler.release(model, ticket, tokens_used)
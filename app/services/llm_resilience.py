@@ -0,0 +1,259 @@
+import contextvars
+import os
+import threading
+import time
+import dotenv
+import litellm
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.telemetry import metrics
+
+dotenv.load_dotenv()
+
+# Consecutive retryable failures that open a provider's circuit
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+# Seconds an open circuit rejects calls before letting one probe through
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# Threads shared by hedged calls (each hedged call holds up to two)
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "16"))
+
+# litellm exception names; looked up by name so older releases without one
+# of them still import
+_RETRYABLE_ERRORS = (
+    "RateLimitError",
+    "Timeout",
+    "APIConnectionError",
+    "ServiceUnavailableError",
+    "InternalServerError",
+)
+_FATAL_ERRORS = (
+    "AuthenticationError",
+    "PermissionDeniedError",
+    "BadRequestError",
+    "NotFoundError",
+    "ContextWindowExceededError",
+    "ContentPolicyViolationError",
+    "UnprocessableEntityError",
+    "BudgetExceededError",
+)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+metrics.describe("consigliere_llm_breaker_open", "1 while a provider's circuit is open.")
+metrics.describe(
+    "consigliere_llm_breaker_rejections_total", "LLM calls failed fast by an open circuit."
+)
+metrics.describe("consigliere_llm_hedges_total", "Hedged LLM calls by winning request.")
+
+
+class LLMError(Exception):
+    """An LLM call failed; `retryable` says whether trying again may help."""
+
+    def __init__(self, message: str, retryable: bool = False, model: Optional[str] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.model = model
+
+
+class LLMUnavailable(LLMError):
+    """The model's provider circuit is open; fail fast so a fallback can answer."""
+
+
+def _is_any(exc: BaseException, names: Tuple[str, ...]) -> bool:
+    exceptions = getattr(litellm, "exceptions", None)
+    for name in names:
+        cls = getattr(exceptions, name, None)
+        if cls is not None and isinstance(exc, cls):
+            return True
+    return False
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Transient failures (timeouts, rate limits, 5xx, dropped connections) are
+    retryable; requests the provider rejected (auth, bad request, context
+    window, content policy) fail the same way every time. Shed load is not
+    retried either: the request already waited its turn in the queue.
+    """
+    if isinstance(exc, LLMError):
+        return exc.retryable
+    if isinstance(exc, LLMOverloaded):
+        return False
+    if _is_any(exc, _RETRYABLE_ERRORS):
+        return True
+    if _is_any(exc, _FATAL_ERRORS):
+        return False
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    # Unclassified errors are network-level more often than not
+    return True
+
+
+def is_rate_limit(exc: BaseException) -> bool:
+    return _is_any(exc, ("RateLimitError",)) or getattr(exc, "status_code", None) == 429
+
+
+def to_llm_error(exc: BaseException, model: str) -> LLMError:
+    """Wrap a provider exception with a user-facing message and its class."""
+    if is_rate_limit(exc):
+        message = "Rate limit exceeded. Please wait a moment and try again."
+    elif _is_any(exc, ("Timeout",)) or isinstance(exc, TimeoutError):
+        message = "LLM request timed out. Try a simpler query."
+    else:
+        message = f"LLM service error: {str(exc)}"
+    return LLMError(message, retryable=is_retryable(exc), model=model)
+
+
+def provider_for(model: str, api_base: Optional[str] = None) -> str:
+    """Circuit key: the endpoint when one is configured, else litellm's provider prefix."""
+    if api_base:
+        return api_base
+    return model.split("/", 1)[0] if "/" in model else model
+
+
+class _Breaker:
+    __slots__ = ("state", "failures", "opened_at", "probing", "stats")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.stats = {"opened": 0, "rejected": 0, "failures": 0}
+
+
+class CircuitBreakers:
+    """
+    One circuit per provider. After LLM_BREAKER_FAILURES consecutive
+    retryable failures the circuit opens and calls fail fast with
+    LLMUnavailable, so the router moves straight to a fallback instead of
+    waiting out timeouts and backoff. After LLM_BREAKER_COOLDOWN one probe
+    is let through; its outcome closes or re-opens the circuit.
+
+    Every `allow` must be followed by `success`, `failure` or `cancel`.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CircuitBreakers, cls).__new__(cls)
+            cls._instance._breakers = {}
+        return cls._instance
+
+    def _breaker(self, provider: str) -> _Breaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            breaker = self._breakers[provider] = _Breaker()
+        return breaker
+
+    def allow(self, provider: str, model: str):
+        with self._lock:
+            breaker = self._breaker(provider)
+            if breaker.state == OPEN:
+                if time.monotonic() - breaker.opened_at >= LLM_BREAKER_COOLDOWN:
+                    breaker.state = HALF_OPEN
+                    breaker.probing = False
+            if breaker.state == OPEN or (breaker.state == HALF_OPEN and breaker.probing):
+                breaker.stats["rejected"] += 1
+                metrics.inc("consigliere_llm_breaker_rejections_total", provider=provider)
+                raise LLMUnavailable(
+                    f"LLM service error: {model} is unavailable after repeated failures.",
+                    model=model,
+                )
+            if breaker.state == HALF_OPEN:
+                breaker.probing = True
+
+    def success(self, provider: str):
+        """The provider answered (a rejected request counts: it is reachable)."""
+        with self._lock:
+            breaker = self._breaker(provider)
+            breaker.failures = 0
+            breaker.probing = False
+            if breaker.state != CLOSED:
+                print(f"CIRCUIT: {provider} closed")
+                breaker.state = CLOSED
+                metrics.set("consigliere_llm_breaker_open", 0, provider=provider)
+
+    def failure(self, provider: str):
+        with self._lock:
+            breaker = self._breaker(provider)
+            breaker.failures += 1
+            breaker.stats["failures"] += 1
+            breaker.probing = False
+            if breaker.state == HALF_OPEN or breaker.failures >= LLM_BREAKER_FAILURES:
+                if breaker.state != OPEN:
+                    print(f"CIRCUIT: {provider} opened after {breaker.failures} failures")
+                    breaker.stats["opened"] += 1
+                breaker.state = OPEN
+                breaker.opened_at = time.monotonic()
+                metrics.set("consigliere_llm_breaker_open", 1, provider=provider)
+
+    def cancel(self, provider: str):
+        """The call never reached the provider (e.g. it was shed)."""
+        with self._lock:
+            self._breaker(provider).probing = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                provider: {
+                    "state": breaker.state,
+                    "consecutive_failures": breaker.failures,
+                    **breaker.stats,
+                }
+                for provider, breaker in self._breakers.items()
+            }
+
+
+_hedge_pool = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+_hedge_lock = threading.Lock()
+_hedge_stats = {"calls": 0, "hedged": 0, "hedge_won": 0}
+
+
+def hedged(
+    primary: Callable[[], Any], backup: Callable[[], Any], delay: float, stage: str
+) -> Any:
+    """
+    Run `primary`; if it has not answered after `delay` seconds, start
+    `backup` as well and return whichever succeeds first. Only for
+    deterministic prompts, where both answers are interchangeable. The
+    slower request is not cancelled (providers bill it anyway) and its
+    result is dropped. Both run in the caller's context, so usage and
+    spans are attributed as usual.
+    """
+    with _hedge_lock:
+        _hedge_stats["calls"] += 1
+    first = _hedge_pool.submit(contextvars.copy_context().run, primary)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    with _hedge_lock:
+        _hedge_stats["hedged"] += 1
+    second = _hedge_pool.submit(contextvars.copy_context().run, backup)
+    pending = {first: "primary", second: "hedge"}
+    error = None
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            winner = pending.pop(future)
+            if future.exception() is None:
+                metrics.inc("consigliere_llm_hedges_total", stage=stage, winner=winner)
+                if winner == "hedge":
+                    with _hedge_lock:
+                        _hedge_stats["hedge_won"] += 1
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+def resilience_stats() -> Dict[str, Any]:
+    with _hedge_lock:
+        hedges = dict(_hedge_stats)
+    return {"breakers": CircuitBreakers().get_stats(), "hedges": hedges}
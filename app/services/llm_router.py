@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import dotenv
+
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from app.services.telemetry import metrics
+
+dotenv.load_dotenv()
+
+DEFAULT_MODEL = os.getenv("MODEL_NAME", "ollama/llama2:7b")
+
+# LLM call sites. Each can be routed to its own model with its own timeout
+# and fallback chain.
+STAGES = (
+    "brain",  # _consult_brain: intent + plan
+    "plan_and_generate",  # single-pass plan with code/SQL
+    "sql_generation",  # _generate_sql
+    "sql_fix",  # _fix_sql
+    "code_generation",  # pandas step code
+    "chart_code",  # _generate_chart_code
+    "summary",  # _execute_summary_step
+    "format",  # _format_final_response
+    "dossier",  # generate_dossier
+)
+
+# Route keys: model, timeout (seconds, overrides the call site), fallbacks
+# (models tried in order when the primary fails), api_base, and
+# prompt_cost_per_1k / completion_cost_per_1k for models litellm cannot price.
+# Loaded from LLM_ROUTES (JSON) or the JSON file at LLM_ROUTES_FILE, e.g.
+#   {"format": {"model": "gemini/gemini-2.0-flash", "timeout": 20},
+#    "sql_generation": {"model": "openrouter/...", "fallbacks": ["gemini/..."]}}
+# Stages without an entry use "default", which defaults to MODEL_NAME.
+LLM_ROUTES = os.getenv("LLM_ROUTES", "")
+LLM_ROUTES_FILE = os.getenv("LLM_ROUTES_FILE", "")
+
+metrics.describe("consigliere_llm_stage_seconds", "LLM call latency by stage and model.")
+metrics.describe("consigliere_llm_cost_usd_total", "LLM spend in USD by stage and model.")
+metrics.describe("consigliere_llm_fallbacks_total", "Calls answered by a fallback model.")
+
+
+def _load_routes() -> Dict[str, Dict[str, Any]]:
+    routes: Dict[str, Dict[str, Any]] = {}
+    if LLM_ROUTES_FILE:
+        with open(LLM_ROUTES_FILE) as routes_file:
+            routes = json.load(routes_file)
+    elif LLM_ROUTES:
+        routes = json.loads(LLM_ROUTES)
+
+    unknown = set(routes) - set(STAGES) - {"default"}
+    if unknown:
+        raise ValueError(f"LLM_ROUTES has unknown stages: {', '.join(sorted(unknown))}")
+
+    default = {"model": DEFAULT_MODEL, "timeout": None, "fallbacks": []}
+    default.update(routes.get("default", {}))
+    resolved = {"default": default}
+    for stage in STAGES:
+        route = dict(default)
+        route.update(routes.get(stage, {}))
+        resolved[stage] = route
+    return resolved
+
+
+class LLMRouter:
+    """
+    Per-stage routing table for LLM calls plus latency and cost accounting
+    per stage and model.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LLMRouter, cls).__new__(cls)
+            cls._instance._routes = _load_routes()
+            cls._instance._stats = defaultdict(
+                lambda: {"calls": 0, "errors": 0, "fallbacks": 0, "ms": 0.0, "cost_usd": 0.0}
+            )
+        return cls._instance
+
+    def route(self, stage: str) -> Dict[str, Any]:
+        return self._routes.get(stage) or self._routes["default"]
+
+    def models(self, stage: str) -> List[str]:
+        """Primary model followed by its fallbacks, without duplicates."""
+        route = self.route(stage)
+        chain = [route["model"], *route.get("fallbacks", [])]
+        return list(dict.fromkeys(chain))
+
+    def record(
+        self,
+        stage: str,
+        model: str,
+        seconds: float,
+        cost_usd: float = 0.0,
+        fallback: bool = False,
+        error: bool = False,
+    ):
+        metrics.observe("consigliere_llm_stage_seconds", seconds, stage=stage, model=model)
+        if cost_usd:
+            metrics.inc("consigliere_llm_cost_usd_total", cost_usd, stage=stage, model=model)
+        if fallback:
+            metrics.inc("consigliere_llm_fallbacks_total", stage=stage, model=model)
+        with self._lock:
+            entry = self._stats[(stage, model)]
+            entry["calls"] += 1
+            entry["errors"] += 1 if error else 0
+            entry["fallbacks"] += 1 if fallback else 0
+            entry["ms"] += seconds * 1000
+            entry["cost_usd"] += cost_usd
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {key: dict(entry) for key, entry in self._stats.items()}
+        report: Dict[str, Any] = {}
+        for (stage, model), entry in sorted(stats.items()):
+            calls = entry["calls"]
+            report.setdefault(stage, {})[model] = {
+                "calls": calls,
+                "errors": entry["errors"],
+                "fallbacks": entry["fallbacks"],
+                "avg_ms": round(entry["ms"] / calls, 1) if calls else 0.0,
+                "cost_usd": round(entry["cost_usd"], 6),
+            }
+        return {
+            "routes": {
+                stage: {key: value for key, value in route.items() if "cost" not in key}
+                for stage, route in self._routes.items()
+            },
+            "stages": report,
+        }
@@ -0,0 +1,286 @@
+import json
+import os
+import threading
+import time
+import dotenv
+
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+from app.services.telemetry import metrics, record_span
+from app.services.token_usage import current_user_id, prompt_type
+
+dotenv.load_dotenv()
+
+# Priority classes, most urgent first
+INTERACTIVE, SUMMARY, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = ("interactive", "summary", "background")
+
+# Prompt template -> priority class; templates not listed are interactive
+PROMPT_PRIORITIES = {
+    "ANALYSIS_FORMAT_PROMPT": SUMMARY,
+    "SUMMARY_SYNTHESIS_PROMPT": SUMMARY,
+    "DOSSIER_PROMPT": BACKGROUND,
+}
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))  # 0 = unlimited
+# Per-model overrides: {"gemini/gemma-3-27b-it": {"concurrency": 4, "tpm": 60000}}
+LLM_MODEL_LIMITS = json.loads(os.getenv("LLM_MODEL_LIMITS", "{}") or "{}")
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_MAX_QUEUE_PER_USER = int(os.getenv("LLM_MAX_QUEUE_PER_USER", "8"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+# A queued request gains one priority class per this many seconds of waiting
+LLM_PRIORITY_AGING = float(os.getenv("LLM_PRIORITY_AGING", "10"))
+# Completion tokens reserved against the TPM window until usage is known
+LLM_COMPLETION_ESTIMATE = int(os.getenv("LLM_COMPLETION_ESTIMATE", "512"))
+
+_TPM_WINDOW = 60.0
+# Waiters re-check TPM windows and provider pauses at least this often
+_POLL_INTERVAL = 0.25
+
+metrics.describe("consigliere_llm_queue_depth", "LLM requests waiting for a slot.")
+metrics.describe("consigliere_llm_in_flight", "LLM requests holding a slot.")
+metrics.describe("consigliere_llm_shed_total", "LLM requests rejected by admission control.")
+
+
+class LLMOverloaded(Exception):
+    """Raised when admission control sheds a request instead of queueing it."""
+
+
+def estimate_tokens(messages: list) -> int:
+    """Rough prompt size (4 chars per token) plus the reserved completion."""
+    chars = sum(len(str(message.get("content") or "")) for message in messages)
+    return chars // 4 + LLM_COMPLETION_ESTIMATE
+
+
+class _Ticket:
+    __slots__ = ("user", "priority", "tokens", "enqueued", "granted", "window_entry")
+
+    def __init__(self, user: str, priority: int, tokens: int):
+        self.user = user
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.window_entry = None
+
+
+class _ModelQueue:
+    def __init__(self, model: str):
+        limits = LLM_MODEL_LIMITS.get(model, {})
+        self.model = model
+        self.concurrency = int(limits.get("concurrency", LLM_MAX_CONCURRENCY))
+        self.tpm = int(limits.get("tpm", LLM_TPM_LIMIT))
+        # Per priority class: user -> FIFO of tickets, rotated for fairness
+        self.queues = [OrderedDict() for _ in PRIORITY_NAMES]
+        self.in_flight = 0
+        self.window = deque()  # [granted_at, tokens]
+        self.paused_until = 0.0
+        self.stats = {"granted": 0, "shed": 0, "timeouts": 0}
+
+    def depth(self, priority: Optional[int] = None) -> int:
+        queues = self.queues if priority is None else [self.queues[priority]]
+        return sum(len(tickets) for queue in queues for tickets in queue.values())
+
+    def user_depth(self, user: str) -> int:
+        return sum(len(queue.get(user, ())) for queue in self.queues)
+
+    def window_tokens(self, now: float) -> int:
+        while self.window and now - self.window[0][0] >= _TPM_WINDOW:
+            self.window.popleft()
+        return sum(entry[1] for entry in self.window)
+
+    def remove(self, ticket: _Ticket):
+        queue = self.queues[ticket.priority]
+        tickets = queue.get(ticket.user)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del queue[ticket.user]
+
+
+class LLMScheduler:
+    """
+    Admission control and dispatch for LLM calls, per model:
+
+    - at most `concurrency` requests in flight and `tpm` tokens per minute
+    - priority classes (interactive > summary > background) with aging, so
+      dossiers and summaries never delay a user waiting on a plan or SQL
+    - round robin across users within a class, so one user's burst does not
+      queue everyone else behind it
+    - requests are shed with LLMOverloaded when queues are too deep or a
+      slot does not free up within LLM_QUEUE_TIMEOUT
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(LLMScheduler, cls).__new__(cls)
+                    instance._cond = threading.Condition()
+                    instance._models = {}
+                    cls._instance = instance
+        return cls._instance
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._models.get(model)
+        if queue is None:
+            queue = self._models[model] = _ModelQueue(model)
+        return queue
+
+    def priority_for(self, messages: list) -> int:
+        return PROMPT_PRIORITIES.get(prompt_type(messages), INTERACTIVE)
+
+    def acquire(
+        self, model: str, messages: list, priority: Optional[int] = None
+    ) -> _Ticket:
+        """Block until the request may be sent; pair with `release`."""
+        if priority is None:
+            priority = self.priority_for(messages)
+        user = current_user_id() or "anonymous"
+        ticket = _Ticket(user, priority, estimate_tokens(messages))
+
+        with self._cond:
+            queue = self._queue(model)
+            self._admit(queue, ticket)
+            queue.queues[priority].setdefault(user, deque()).append(ticket)
+            self._dispatch(queue)
+
+            deadline = ticket.enqueued + LLM_QUEUE_TIMEOUT
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue.remove(ticket)
+                    queue.stats["timeouts"] += 1
+                    self._publish(queue)
+                    metrics.inc("consigliere_llm_shed_total", model=model, reason="timeout")
+                    raise LLMOverloaded(
+                        f"The assistant is at capacity: no {model} slot freed up "
+                        f"within {LLM_QUEUE_TIMEOUT:.0f}s. Please try again shortly."
+                    )
+                self._cond.wait(min(remaining, _POLL_INTERVAL))
+                self._dispatch(queue)
+
+        record_span(
+            "llm_queue",
+            time.monotonic() - ticket.enqueued,
+            model=model,
+            priority=PRIORITY_NAMES[priority],
+        )
+        return ticket
+
+    def _admit(self, queue: _ModelQueue, ticket: _Ticket):
+        """Shed early rather than queue work that cannot start in time."""
+        depth = queue.depth()
+        reason = None
+        if depth >= LLM_MAX_QUEUE:
+            reason = "queue_full"
+        elif ticket.priority == BACKGROUND and depth >= LLM_MAX_QUEUE // 2:
+            # Keep the second half of the queue for people waiting on answers
+            reason = "background_shed"
+        elif queue.user_depth(ticket.user) >= LLM_MAX_QUEUE_PER_USER:
+            reason = "user_queue_full"
+        if reason is None:
+            return
+
+        queue.stats["shed"] += 1
+        metrics.inc("consigliere_llm_shed_total", model=queue.model, reason=reason)
+        raise LLMOverloaded(
+            f"The assistant is at capacity ({depth} requests queued for "
+            f"{queue.model}). Please try again in a few seconds."
+        )
+
+    def _next_ticket(self, queue: _ModelQueue, now: float) -> Optional[_Ticket]:
+        """Head ticket of the most urgent class after aging (caller holds the lock)."""
+        best = None
+        best_rank = None
+        for priority, users in enumerate(queue.queues):
+            if not users:
+                continue
+            head = next(iter(users.values()))[0]
+            aged = int((now - head.enqueued) / LLM_PRIORITY_AGING) if LLM_PRIORITY_AGING else 0
+            rank = (priority - aged, priority)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = head, rank
+        return best
+
+    def _dispatch(self, queue: _ModelQueue):
+        wall_now = time.time()
+        now = time.monotonic()
+        granted = False
+        while queue.in_flight < queue.concurrency and wall_now >= queue.paused_until:
+            ticket = self._next_ticket(queue, now)
+            if ticket is None:
+                break
+            if queue.tpm:
+                used = queue.window_tokens(now)
+                # An oversized request still runs once the window is empty
+                if used and used + ticket.tokens > queue.tpm:
+                    break
+
+            users = queue.queues[ticket.priority]
+            tickets = users[ticket.user]
+            tickets.popleft()
+            # Rotate the user to the back of the class so others go next
+            del users[ticket.user]
+            if tickets:
+                users[ticket.user] = tickets
+
+            ticket.window_entry = [now, ticket.tokens]
+            queue.window.append(ticket.window_entry)
+            ticket.granted = True
+            queue.in_flight += 1
+            queue.stats["granted"] += 1
+            granted = True
+
+        if granted:
+            self._cond.notify_all()
+        self._publish(queue)
+
+    def release(self, model: str, ticket: _Ticket, tokens_used: int = 0):
+        """Free the slot; `tokens_used` replaces the estimate in the TPM window."""
+        with self._cond:
+            queue = self._queue(model)
+            queue.in_flight -= 1
+            if tokens_used and ticket.window_entry is not None:
+                ticket.window_entry[1] = tokens_used
+            self._dispatch(queue)
+
+    def pause(self, model: str, seconds: float):
+        """Stop dispatching to a model that reported a rate limit."""
+        with self._cond:
+            queue = self._queue(model)
+            queue.paused_until = max(queue.paused_until, time.time() + seconds)
+
+    def _publish(self, queue: _ModelQueue):
+        for priority, name in enumerate(PRIORITY_NAMES):
+            metrics.set(
+                "consigliere_llm_queue_depth",
+                queue.depth(priority),
+                model=queue.model,
+                priority=name,
+            )
+        metrics.set("consigliere_llm_in_flight", queue.in_flight, model=queue.model)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                model: {
+                    "in_flight": queue.in_flight,
+                    "concurrency": queue.concurrency,
+                    "queued": {
+                        name: queue.depth(priority)
+                        for priority, name in enumerate(PRIORITY_NAMES)
+                    },
+                    "tpm_limit": queue.tpm or None,
+                    "tokens_last_minute": queue.window_tokens(now),
+                    "paused_for_seconds": max(0.0, round(queue.paused_until - time.time(), 1)),
+                    **queue.stats,
+                }
+                for model, queue in self._models.items()
+            }
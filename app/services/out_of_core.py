@@ -0,0 +1,251 @@
+import os
+import re
+import dotenv
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.services.parquet_scan import window_filter
+
+dotenv.load_dotenv()
+
+# Datasets larger than this in memory (MB) are never loaded whole; generated
+# code reads them as record batches instead. 0 disables out-of-core mode.
+OUT_OF_CORE_THRESHOLD_MB = int(os.getenv("OUT_OF_CORE_THRESHOLD_MB", "1024"))
+# Rows per record batch; peak memory is roughly one batch plus partial results
+OUT_OF_CORE_BATCH_ROWS = int(os.getenv("OUT_OF_CORE_BATCH_ROWS", "65536"))
+# Leading rows profiled for the schema and dossier
+OUT_OF_CORE_SAMPLE_ROWS = 10000
+
+# Partial aggregates are merged once this many batches have accumulated
+_MERGE_EVERY = 16
+
+_PARTIALS = {
+    "sum": ("sum",),
+    "count": ("count",),
+    "mean": ("sum", "count"),
+    "min": ("min",),
+    "max": ("max",),
+}
+# How partial results of each kind combine across batches
+_MERGE = {"sum": "sum", "count": "sum", "min": "min", "max": "max", "rows": "sum"}
+
+
+def _decoded_bytes(file_path: str) -> int:
+    """
+    Roughly what a file takes once loaded. Parquet is encoded and compressed
+    on disk, so fixed-width columns count as rows x width and the rest by
+    their uncompressed chunk sizes; pandas can still need more for text.
+    Other formats count as their file size.
+    """
+    if not file_path.endswith(".parquet"):
+        return os.path.getsize(file_path)
+    parquet_file = pq.ParquetFile(file_path)
+    metadata = parquet_file.metadata
+    chunk_bytes: Dict[str, int] = {}
+    for group in range(metadata.num_row_groups):
+        row_group = metadata.row_group(group)
+        for index in range(row_group.num_columns):
+            chunk = row_group.column(index)
+            name = chunk.path_in_schema.split(".")[0]
+            chunk_bytes[name] = chunk_bytes.get(name, 0) + chunk.total_uncompressed_size
+    total = 0
+    for field in parquet_file.schema_arrow:
+        try:
+            total += metadata.num_rows * max(field.type.bit_width // 8, 1)
+        except ValueError:
+            # Variable width (strings, nested)
+            total += chunk_bytes.get(field.name, 0)
+    return total
+
+
+def is_out_of_core(file_path: str) -> bool:
+    if OUT_OF_CORE_THRESHOLD_MB <= 0:
+        return False
+    try:
+        return _decoded_bytes(file_path) > OUT_OF_CORE_THRESHOLD_MB * 1024 * 1024
+    except (OSError, pa.ArrowException):
+        return False
+
+
+class StreamedDataset:
+    """
+    A parquet file too large to load, read as a stream of record batches.
+    Column projections and the step's time window (see
+    parquet_scan.time_window) are pushed down to the reader; `where`, a
+    DataFrame.query expression, is applied to each batch. Memory stays
+    bounded by the batch size and the number of groups in a result.
+    """
+
+    def __init__(self, file_path: str, window: Optional[Dict[str, Any]] = None):
+        self.file_path = file_path
+        self._dataset = ds.dataset(file_path, format="parquet")
+        self._filter = None
+        self.pruning = None
+        if window:
+            field_type = self._dataset.schema.field(window["column"]).type
+            self._filter = window_filter(window, field_type)
+            self.pruning = {"read": 0, "pruned": 0}
+            for fragment in self._dataset.get_fragments():
+                read = sum(
+                    piece.num_row_groups for piece in fragment.split_by_row_group(self._filter)
+                )
+                self.pruning["read"] += read
+                self.pruning["pruned"] += fragment.num_row_groups - read
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._dataset.schema.names)
+
+    @property
+    def num_rows(self) -> int:
+        return self._dataset.count_rows(filter=self._filter)
+
+    def column_range(self, column: str) -> Optional[Tuple[Any, Any]]:
+        """Min and max from row-group statistics, without reading any data."""
+        metadata = pq.ParquetFile(self.file_path).metadata
+        index = self._dataset.schema.get_field_index(column)
+        low = high = None
+        for group in range(metadata.num_row_groups):
+            stats = metadata.row_group(group).column(index).statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            low = stats.min if low is None else min(low, stats.min)
+            high = stats.max if high is None else max(high, stats.max)
+        return None if low is None else (low, high)
+
+    def _read_columns(self, columns: Optional[List[str]], where: Optional[str]):
+        if columns is None:
+            return None
+        needed = list(columns)
+        # Columns the filter refers to are read too, then dropped
+        for name in self.columns:
+            if where and name not in needed and re.search(rf"\b{re.escape(name)}\b", where):
+                needed.append(name)
+        return needed
+
+    def batches(
+        self, columns: Optional[List[str]] = None, where: Optional[str] = None
+    ) -> Iterator[pd.DataFrame]:
+        """DataFrame chunks of the matching rows, in file order."""
+        scanner = self._dataset.scanner(
+            columns=self._read_columns(columns, where),
+            filter=self._filter,
+            batch_size=OUT_OF_CORE_BATCH_ROWS,
+        )
+        for batch in scanner.to_batches():
+            frame = batch.to_pandas()
+            if where:
+                frame = frame.query(where)
+            if columns is not None:
+                frame = frame[columns]
+            if len(frame):
+                yield frame
+
+    def head(
+        self, n: int = 10, columns: Optional[List[str]] = None, where: Optional[str] = None
+    ) -> pd.DataFrame:
+        """First `n` matching rows; stops reading as soon as it has them."""
+        frames, remaining = [], n
+        for frame in self.batches(columns, where):
+            frames.append(frame.head(remaining))
+            remaining -= len(frames[-1])
+            if remaining <= 0:
+                break
+        if not frames:
+            schema = self._dataset.schema
+            names = columns if columns is not None else schema.names
+            return schema.empty_table().to_pandas()[names]
+        return pd.concat(frames, ignore_index=True)
+
+    def count(self, where: Optional[str] = None) -> int:
+        if not where:
+            return self.num_rows
+        return sum(len(frame) for frame in self.batches(where=where))
+
+    def aggregate(
+        self,
+        by: Optional[Any] = None,
+        aggs: Optional[Dict[str, Any]] = None,
+        where: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Group by `by` (a column or list) and aggregate incrementally.
+        `aggs` maps columns to one of sum, mean, min, max, count (or a list
+        of them); without `aggs` each group's row count is returned as
+        `rows`. Result columns are named after their source column, or
+        `{column}_{func}` when a column has several functions.
+        """
+        by = [by] if isinstance(by, str) else list(by or [])
+        aggs = {
+            column: [funcs] if isinstance(funcs, str) else list(funcs)
+            for column, funcs in (aggs or {}).items()
+        }
+        for column, funcs in aggs.items():
+            for func in funcs:
+                if func not in _PARTIALS:
+                    raise ValueError(
+                        f"Unsupported aggregation '{func}' for '{column}'; "
+                        f"use one of {', '.join(_PARTIALS)}"
+                    )
+
+        keys = by or ["__all"]
+        spec = {"rows": (None, "size")}
+        for column, funcs in aggs.items():
+            for func in funcs:
+                for partial in _PARTIALS[func]:
+                    spec[f"{column}__{partial}"] = (column, partial)
+
+        def merge(partials: List[pd.DataFrame]) -> pd.DataFrame:
+            combined = pd.concat(partials)
+            return combined.groupby(level=keys, dropna=False).agg(
+                {name: _MERGE[name.rsplit("__", 1)[-1]] for name in combined.columns}
+            )
+
+        partials = []
+        columns = list(dict.fromkeys(by + list(aggs)))
+        for frame in self.batches(columns=columns, where=where):
+            if not by:
+                frame = frame.assign(__all=0)
+            grouped = frame.groupby(keys, dropna=False)
+            partial = pd.DataFrame({"rows": grouped.size()})
+            for name, (column, func) in spec.items():
+                if column is not None:
+                    partial[name] = grouped[column].agg(func)
+            partials.append(partial)
+            if len(partials) >= _MERGE_EVERY:
+                partials = [merge(partials)]
+
+        if partials:
+            totals = merge(partials)
+        else:
+            # No matching rows: still shaped like a result, keyed by `by`
+            empty_keys = pd.MultiIndex.from_arrays([[] for _ in keys], names=keys)
+            totals = pd.DataFrame(columns=list(spec), index=empty_keys)
+        result = pd.DataFrame(index=totals.index)
+        for column, funcs in aggs.items():
+            for func in funcs:
+                name = column if len(funcs) == 1 else f"{column}_{func}"
+                if func == "mean":
+                    result[name] = totals[f"{column}__sum"] / totals[f"{column}__count"]
+                else:
+                    result[name] = totals[f"{column}__{func}"]
+        if not aggs:
+            result["rows"] = totals["rows"]
+
+        if not by:
+            return result.reset_index(drop=True)
+        return result.reset_index()
+
+    def helpers(self) -> Dict[str, Any]:
+        """Names generated code uses in place of `df`."""
+        return {
+            "dataset": self,
+            "aggregate": self.aggregate,
+            "head": self.head,
+            "count": self.count,
+            "batches": self.batches,
+        }
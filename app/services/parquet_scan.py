@@ -0,0 +1,150 @@
+import os
+import threading
+import dotenv
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.telemetry import metrics, span
+
+dotenv.load_dotenv()
+
+# Rows per row group: small enough that a date range skips most of a large
+# file, large enough that per-group overhead stays negligible
+PARQUET_ROW_GROUP_ROWS = int(os.getenv("PARQUET_ROW_GROUP_ROWS", "65536"))
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+# Schema metadata key naming the column an ingested file is sorted by
+SORT_COLUMN_KEY = b"consigliere.sort_column"
+
+metrics.describe(
+    "consigliere_parquet_row_groups_total",
+    "Parquet row groups read or skipped by statistics-based pruning.",
+)
+
+_stats_lock = threading.Lock()
+_stats = {"scans": 0, "row_groups_read": 0, "row_groups_pruned": 0}
+
+
+def sort_column(file_path: str) -> Optional[str]:
+    """The column the file was sorted by at ingestion, if any."""
+    try:
+        metadata = pq.read_schema(file_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    value = metadata.get(SORT_COLUMN_KEY)
+    return value.decode() if value else None
+
+
+def time_window(column: str, time_range: Any) -> Optional[Dict[str, Any]]:
+    """
+    Turn a plan step's `time_range` ({"start", "end"}, both inclusive and
+    optional) into a half-open window on `column`, or None when it is
+    missing or unparseable. Dates without a time cover the whole end day.
+    """
+    if not column or not isinstance(time_range, dict):
+        return None
+    start, end = time_range.get("start"), time_range.get("end")
+    try:
+        start = pd.Timestamp(start) if start else None
+        stop = pd.Timestamp(end) if end else None
+    except (TypeError, ValueError):
+        return None
+    if stop is not None and stop == stop.normalize():
+        stop += pd.Timedelta(days=1)
+    if start is None and stop is None:
+        return None
+    if start is not None and stop is not None and start >= stop:
+        return None
+    return {
+        "column": column,
+        "start": start.isoformat() if start is not None else None,
+        "stop": stop.isoformat() if stop is not None else None,
+    }
+
+
+def _bound(value: str, field_type: pa.DataType) -> pa.Scalar:
+    timestamp = pd.Timestamp(value)
+    if pa.types.is_timestamp(field_type):
+        if field_type.tz and timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize(field_type.tz)
+        elif not field_type.tz and timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert(None)
+        return pa.scalar(timestamp, type=field_type)
+    if pa.types.is_date(field_type):
+        return pa.scalar(timestamp.date(), type=field_type)
+    return pa.scalar(value).cast(field_type)
+
+
+def window_filter(window: Dict[str, Any], field_type: pa.DataType):
+    field = ds.field(window["column"])
+    expression = None
+    if window.get("start") is not None:
+        expression = field >= _bound(window["start"], field_type)
+    if window.get("stop") is not None:
+        upper = field < _bound(window["stop"], field_type)
+        expression = upper if expression is None else expression & upper
+    return expression
+
+
+def slice_window(df: pd.DataFrame, window: Dict[str, Any]) -> pd.DataFrame:
+    """The rows of an in-memory frame inside `window`."""
+    values = df[window["column"]]
+    mask = pd.Series(True, index=df.index)
+    tz = getattr(values.dtype, "tz", None)
+    for key, keep in (("start", values.__ge__), ("stop", values.__lt__)):
+        if window.get(key) is not None:
+            bound = pd.Timestamp(window[key])
+            if tz is not None and bound.tzinfo is None:
+                bound = bound.tz_localize(tz)
+            elif tz is None and bound.tzinfo is not None:
+                bound = bound.tz_convert(None)
+            mask &= keep(bound)
+    return df[mask]
+
+
+def scan(file_path: str, window: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Read the rows of a parquet file inside `window` (see `time_window`),
+    decoding only the row groups whose min/max statistics overlap it.
+    Returns the frame and {"read", "pruned"} row-group counts; pass those
+    to `record_pruning` in the process that reports stats.
+    """
+    dataset = ds.dataset(file_path, format="parquet")
+    expression = window_filter(window, dataset.schema.field(window["column"]).type)
+
+    counts = {"read": 0, "pruned": 0}
+    tables = []
+    with span("parquet_scan") as attrs:
+        for fragment in dataset.get_fragments():
+            total = fragment.num_row_groups
+            pieces = fragment.split_by_row_group(expression)
+            read = sum(piece.num_row_groups for piece in pieces)
+            counts["read"] += read
+            counts["pruned"] += total - read
+            for piece in pieces:
+                tables.append(piece.to_table(filter=expression, schema=dataset.schema))
+        table = pa.concat_tables(tables) if tables else dataset.schema.empty_table()
+        attrs.update(row_groups_read=counts["read"], row_groups_pruned=counts["pruned"])
+        attrs["rows"] = table.num_rows
+    return table.to_pandas(), counts
+
+
+def record_pruning(counts: Dict[str, int]):
+    with _stats_lock:
+        _stats["scans"] += 1
+        _stats["row_groups_read"] += counts["read"]
+        _stats["row_groups_pruned"] += counts["pruned"]
+    metrics.inc("consigliere_parquet_row_groups_total", counts["read"], result="read")
+    metrics.inc("consigliere_parquet_row_groups_total", counts["pruned"], result="pruned")
+
+
+def scan_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["row_groups_read"] + stats["row_groups_pruned"]
+    stats["pruned_ratio"] = round(stats["row_groups_pruned"] / total, 3) if total else 0.0
+    return stats
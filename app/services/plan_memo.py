@@ -0,0 +1,136 @@
+import copy
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.services.telemetry import span
+
+# Questions that lean on earlier turns can't be replayed from a memo
+_FOLLOW_UP_RE = re.compile(
+    r"^(and|also|now|then|what about|how about|same|but|instead)\b"
+    r"|\b(it|that|those|these|them|this one|same|previous|above|again)\b"
+)
+
+
+def normalize_question(question: str) -> str:
+    lowered = question.lower().strip()
+    lowered = re.sub(r"[^\w\s%.-]", " ", lowered)
+    return " ".join(lowered.split()).rstrip(".")
+
+
+def dataset_version(*parts: Any) -> str:
+    """Stable fingerprint of whatever identifies a dataset revision (schema, mtime, ...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class PlanMemo:
+    """
+    Memoizes validated plans and the final working code/SQL per step, keyed
+    by normalized question plus dataset key and version. A repeated question
+    on an unchanged dataset skips brain planning, code generation and fix
+    loops and goes straight to execution.
+    """
+
+    _instance = None
+    _store: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    _lock = threading.Lock()
+    _stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+    TTL = 86400
+    MAX_ENTRIES = 2048
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PlanMemo, cls).__new__(cls)
+        return cls._instance
+
+    @staticmethod
+    def is_memoizable(question: str) -> bool:
+        return not _FOLLOW_UP_RE.search(normalize_question(question))
+
+    def _key(self, dataset_key: str, version: str, question: str) -> str:
+        return f"{dataset_key}|{version}|{normalize_question(question)}"
+
+    def get(
+        self, dataset_key: str, version: str, question: str
+    ) -> Optional[Dict[str, Any]]:
+        """Return {"brain_output", "codes"} for a repeated question, or None."""
+        if not self.is_memoizable(question):
+            return None
+
+        key = self._key(dataset_key, version, question)
+        current_time = time.time()
+        with span("cache_lookup", cache="plan_memo") as attrs, self._lock:
+            entry = self._store.get(key)
+            if entry is None or current_time - entry["timestamp"] >= self.TTL:
+                if entry is not None:
+                    del self._store[key]
+                self._stats["misses"] += 1
+                return None
+            self._store.move_to_end(key)
+            self._stats["hits"] += 1
+            attrs["hit"] = True
+
+        print(f"MEMO HIT: Replaying plan for '{normalize_question(question)}'")
+        return {
+            "brain_output": copy.deepcopy(entry["brain_output"]),
+            "codes": dict(entry["codes"]),
+        }
+
+    def put(
+        self,
+        dataset_key: str,
+        version: str,
+        question: str,
+        brain_output: Dict[str, Any],
+        codes: Dict[str, str],
+    ):
+        """Store a plan whose steps all executed successfully."""
+        if not self.is_memoizable(question):
+            return
+
+        key = self._key(dataset_key, version, question)
+        with self._lock:
+            # A new version of the dataset makes older entries unreachable
+            stale = [
+                k
+                for k in self._store
+                if k.startswith(f"{dataset_key}|") and not k.startswith(f"{dataset_key}|{version}|")
+            ]
+            for k in stale:
+                del self._store[k]
+
+            self._store[key] = {
+                "brain_output": brain_output,
+                "codes": dict(codes),
+                "timestamp": time.time(),
+            }
+            self._store.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._store) > self.MAX_ENTRIES:
+                self._store.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def discard(self, dataset_key: str, version: str, question: str):
+        """Forget an entry whose replay failed."""
+        with self._lock:
+            self._store.pop(self._key(dataset_key, version, question), None)
+
+    def invalidate_dataset(self, dataset_key: str):
+        """Drop every memo for a dataset (file re-uploaded/deleted, schema changed)."""
+        with self._lock:
+            stale = [k for k in self._store if k.startswith(f"{dataset_key}|")]
+            for k in stale:
+                del self._store[k]
+        if stale:
+            print(f"MEMO: Cleared {len(stale)} plans for dataset")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._store)}
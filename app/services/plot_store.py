@@ -0,0 +1,196 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import dotenv
+
+from typing import Any, Dict, Iterable, Set
+from sqlalchemy import text
+
+dotenv.load_dotenv()
+
+PLOTS_DIR = os.path.join("static", "plots")
+PLOTS_URL_PREFIX = "/static/plots/"
+
+# Plots younger than this are never collected: the message that references
+# them is only persisted once the answer stream finishes.
+PLOT_GC_GRACE = int(os.getenv("PLOT_GC_GRACE", "3600"))
+PLOT_GC_INTERVAL = int(os.getenv("PLOT_GC_INTERVAL", "3600"))
+
+# All plot URLs referenced by image steps in persisted messages
+_REFERENCED_PLOTS_SQL = """
+    SELECT elem->>'data' AS url, COUNT(*) AS refs
+    FROM messages, jsonb_array_elements(messages.steps) AS elem
+    WHERE jsonb_typeof(messages.steps) = 'array'
+      AND elem->>'type' = 'image'
+    GROUP BY elem->>'data'
+"""
+
+# Whether any message still has an image step pointing at one URL; served by
+# the GIN index on messages.steps
+_PLOT_REFERENCED_SQL = """
+    SELECT 1 FROM messages WHERE steps @> CAST(:probe AS jsonb) LIMIT 1
+"""
+
+
+class PlotStore:
+    """
+    Content-addressed storage for rendered charts. Identical charts map to the
+    same `{sha256}.png`, and files no longer referenced by any message are
+    reclaimed by `collect_garbage`.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _total_bytes: int = 0
+    _total_files: int = 0
+    _last_gc: Dict[str, float] = {}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PlotStore, cls).__new__(cls)
+            os.makedirs(PLOTS_DIR, exist_ok=True)
+            cls._instance._rescan()
+        return cls._instance
+
+    def _rescan(self):
+        total_bytes = 0
+        total_files = 0
+        with os.scandir(PLOTS_DIR) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".png"):
+                    total_bytes += entry.stat().st_size
+                    total_files += 1
+        with self._lock:
+            self._total_bytes = total_bytes
+            self._total_files = total_files
+
+    def save_figure(self, figure) -> str:
+        """Render a matplotlib figure and return its content-addressed URL."""
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format="png", bbox_inches="tight", dpi=100)
+        return self.save_png(buffer.getvalue())
+
+    def save_png(self, payload: bytes) -> str:
+        """Store already-rendered PNG bytes and return their content-addressed URL."""
+        file_name = f"{hashlib.sha256(payload).hexdigest()}.png"
+        file_path = os.path.join(PLOTS_DIR, file_name)
+
+        with self._lock:
+            if os.path.exists(file_path):
+                # Refresh mtime so the grace period covers the new reference
+                os.utime(file_path)
+                print(f"PLOTS: Reusing stored chart {file_name}")
+            else:
+                temp_path = f"{file_path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as out_file:
+                    out_file.write(payload)
+                os.replace(temp_path, file_path)
+                self._total_bytes += len(payload)
+                self._total_files += 1
+
+        return f"{PLOTS_URL_PREFIX}{file_name}"
+
+    @staticmethod
+    def plot_urls_in_steps(steps) -> Set[str]:
+        """Extract stored plot URLs from a message's `steps` JSON."""
+        urls = set()
+        if not isinstance(steps, list):
+            return urls
+        for step in steps:
+            if (
+                isinstance(step, dict)
+                and step.get("type") == "image"
+                and str(step.get("data", "")).startswith(PLOTS_URL_PREFIX)
+            ):
+                urls.add(step["data"])
+        return urls
+
+    def _reference_counts(self, db) -> Dict[str, int]:
+        rows = db.execute(text(_REFERENCED_PLOTS_SQL)).fetchall()
+        return {row.url: row.refs for row in rows if row.url}
+
+    def _is_referenced(self, db, url: str) -> bool:
+        probe = json.dumps([{"type": "image", "data": url}])
+        return db.execute(text(_PLOT_REFERENCED_SQL), {"probe": probe}).first() is not None
+
+    def _remove_stale(self, file_name: str, now: float) -> int:
+        """
+        Delete a plot unless it is inside PLOT_GC_GRACE. Checked under the
+        lock save_png reuses files with, so a chart an in-flight answer has
+        just reused (and not yet persisted) is never removed.
+        """
+        file_path = os.path.join(PLOTS_DIR, os.path.basename(file_name))
+        with self._lock:
+            try:
+                stat = os.stat(file_path)
+                if now - stat.st_mtime < PLOT_GC_GRACE:
+                    return 0
+                os.remove(file_path)
+            except FileNotFoundError:
+                return 0
+            self._total_bytes -= stat.st_size
+            self._total_files -= 1
+        return stat.st_size
+
+    def release(self, db, urls: Iterable[str]) -> int:
+        """
+        Drop plots whose last reference just went away (e.g. after a chat
+        delete). Must be called after the referencing rows are committed.
+        Plots still inside the grace period are left for `collect_garbage`.
+        """
+        urls = {url for url in urls if url.startswith(PLOTS_URL_PREFIX)}
+        if not urls:
+            return 0
+
+        now = time.time()
+        freed = 0
+        for url in urls:
+            if not self._is_referenced(db, url):
+                freed += self._remove_stale(url[len(PLOTS_URL_PREFIX) :], now)
+        if freed:
+            print(f"PLOTS: Released {freed} bytes")
+        return freed
+
+    def collect_garbage(self, db) -> Dict[str, int]:
+        """Delete stored plots that no message references anymore."""
+        started = time.time()
+        referenced = {
+            url[len(PLOTS_URL_PREFIX) :] for url in self._reference_counts(db)
+        }
+
+        removed_files = 0
+        freed_bytes = 0
+        with os.scandir(PLOTS_DIR) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(".png"):
+                    continue
+                if entry.name in referenced:
+                    continue
+                freed = self._remove_stale(entry.name, started)
+                if freed:
+                    freed_bytes += freed
+                    removed_files += 1
+
+        self._rescan()
+        self._last_gc = {
+            "timestamp": started,
+            "duration_seconds": round(time.time() - started, 3),
+            "removed_files": removed_files,
+            "freed_bytes": freed_bytes,
+        }
+        print(
+            f"PLOTS: GC removed {removed_files} files ({freed_bytes} bytes), "
+            f"{self._total_files} files / {self._total_bytes} bytes remain"
+        )
+        return self._last_gc
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current plot storage footprint."""
+        return {
+            "plot_files": self._total_files,
+            "plot_bytes": self._total_bytes,
+            "last_gc": dict(self._last_gc),
+        }
@@ -221,6 +221,39 @@ class SemanticInferenceEngine:
         return result[0] if result else 0
 
 
+def compact_schema(schema_json: str) -> str:
+    """
+    Token-lean rendering of an `infer()` schema: tables, columns with type
+    and role, and keys, without profiles or indentation.
+    """
+    try:
+        schema_model = json.loads(schema_json)
+    except (TypeError, ValueError):
+        return schema_json
+
+    tables = []
+    for table in schema_model.get("tables", []):
+        compact_table = {
+            "name": table["name"],
+            "columns": [
+                f"{col['name']} {col['type']} {col.get('role', '')}".strip()
+                for col in table.get("columns", [])
+            ],
+        }
+        if table.get("schema"):
+            compact_table["schema"] = table["schema"]
+        if table.get("primary_keys"):
+            compact_table["primary_keys"] = table["primary_keys"]
+        if table.get("foreign_keys"):
+            compact_table["foreign_keys"] = table["foreign_keys"]
+        tables.append(compact_table)
+
+    return json.dumps(
+        {"tables": tables, "relationships": schema_model.get("relationships", [])},
+        separators=(",", ":"),
+    )
+
+
 if __name__ == "__main__":
     from sqlalchemy import create_engine
 
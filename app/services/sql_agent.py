@@ -3,16 +3,37 @@ import json_repair
 import pandas as pd
 import re
 import os
-import uuid
+import time
+import contextvars
 import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from sqlalchemy import create_engine, inspect, text
 from typing import List, Dict, Any
 import logging
 
-from app.services.semantic_inference_engine import SemanticInferenceEngine
-from app.services.base_agent import BaseAgent
+from app.services.semantic_inference_engine import (
+    SemanticInferenceEngine,
+    compact_schema,
+)
+from app.services.base_agent import BaseAgent, PLAN_AND_GENERATE_ENABLED
+from app.services.intent_classifier import (
+    IntentClassifier,
+    schema_vocabulary_from_json,
+)
+from app.services.chart_spec import (
+    build_chart_spec,
+    describe_chart_spec,
+    spec_mode_enabled,
+)
 from app.services.llm import call_llm
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.plan_memo import PlanMemo, dataset_version
+from app.services.plot_store import PlotStore
 from app.services.sql_agent_cache import SQLAgentCache
+from app.services.sql_validator import SQLValidator
+from app.services.telemetry import span
+from app.services.token_usage import economy_mode
 from app.core.prompts import (
     SQL_GENERATOR_PROMPT,
     DOSSIER_PROMPT,
@@ -22,12 +43,62 @@ from app.core.prompts import (
     SQL_FIX_PROMPT,
     SUMMARY_SYNTHESIS_PROMPT,
     CHART_GENERATOR_PROMPT,
+    SQL_TIMEOUT_FIX_HINT,
+    SQL_PLAN_AND_GENERATE_PROMPT,
 )
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-statement deadline (seconds) for generated SQL, 0 disables it
+SQL_STATEMENT_TIMEOUT = int(os.getenv("SQL_STATEMENT_TIMEOUT", "30"))
+
+# Check generated SQL against the schema model and EXPLAIN before running it
+SQL_PREVALIDATE = os.getenv("SQL_PREVALIDATE", "true").lower() == "true"
+
+# Concurrent repair candidates per failed query (1 = one serial fix at a time)
+SQL_REPAIR_CANDIDATES = int(os.getenv("SQL_REPAIR_CANDIDATES", "3"))
+# Cost cap: repair LLM calls allowed per query across all rounds
+SQL_REPAIR_MAX_CALLS = int(os.getenv("SQL_REPAIR_MAX_CALLS", "6"))
+# Candidates are sampled at varied temperatures for diversity
+REPAIR_TEMPERATURES = (0.2, 0.5, 0.8, 1.0)
+
+# Planner-only statements per dialect; dialects without one skip EXPLAIN
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+
+class StatementTimeout(Exception):
+    """Raised when a generated query runs past the statement timeout."""
+
+
+class SQLValidationError(Exception):
+    """Raised when generated SQL fails schema checks or EXPLAIN."""
+
+
+def _is_timeout_error(exc: Exception) -> bool:
+    """Recognize driver errors caused by a statement timeout or cancellation."""
+    orig = getattr(exc, "orig", exc)
+    if getattr(orig, "pgcode", None) == "57014":  # PostgreSQL query_canceled
+        return True
+    args = getattr(orig, "args", ())
+    if args and args[0] in (3024, 1969):  # MySQL / MariaDB execution time exceeded
+        return True
+    message = str(exc).lower()
+    return any(
+        marker in message
+        for marker in (
+            "statement timeout",
+            "maximum statement execution time",
+            "query timeout expired",
+            "interrupted",
+        )
+    )
+
 
 class SQLAgent(BaseAgent):
     def __init__(self, connection_string: str):
@@ -40,40 +111,39 @@ class SQLAgent(BaseAgent):
         self.target_db = connection_string.split(":")[0]
         self.max_retries = 3
         self.result_limit = 50  # Configurable result limit
+        self.statement_timeout = SQL_STATEMENT_TIMEOUT
 
-        # Ensure plots directory exists
-        os.makedirs("static/plots", exist_ok=True)
+        # Schema from cache, or inferred once even if agents start concurrently
+        self.schema = self.cache_manager.load_schema(
+            connection_string,
+            lambda: SemanticInferenceEngine(self.engine).infer(),
+        )
+        logger.info(f"SQLAgent initialized with schema: {len(self.schema)} chars")
 
-        # Try to get schema from cache
-        cached_schema = self.cache_manager.get_schema(connection_string)
-        if cached_schema:
-            self.schema = cached_schema
-            logger.info(
-                f"SQLAgent initialized with cached schema: {len(self.schema)} chars"
-            )
-        else:
-            # Generate schema and cache it
-            self.semantic_engine = SemanticInferenceEngine(self.engine)
-            self.schema = self.semantic_engine.infer()
-            self.cache_manager.set_schema(connection_string, self.schema)
-            logger.info(
-                f"SQLAgent initialized with new schema: {len(self.schema)} chars"
-            )
+        self.compact_schema = compact_schema(self.schema)
+        self.vocabulary = schema_vocabulary_from_json(self.schema)
+        self.validator = SQLValidator(self.schema, self.engine.dialect.name)
+
+        # Plans are memoized per connection and schema revision
+        self.dataset_key = self.cache_manager._hash_connection_string(connection_string)
+        self.dataset_version = dataset_version(self.schema)
 
     def _generate_sql(self, user_query: str) -> str:
         """Generate SQL query from natural language."""
         system_content = (
             SQL_GENERATOR_PROMPT.format(
-                schema=self.schema, query=user_query, target_db=self.target_db
+                schema=self._prompt_schema(), query=user_query, target_db=self.target_db
             )
             + "\n"
             + STRICT_SQL_RULES
         )
         messages = [{"role": "system", "content": system_content}]
-        response = call_llm(messages, temperature=0.0)
+        response = call_llm(messages, temperature=0.0, stage="sql_generation")
         return self._clean_sql(response)
 
-    def _fix_sql(self, bad_query: str, error_msg: str) -> str:
+    def _fix_sql(
+        self, bad_query: str, error_msg: str, temperature: float = 0.2
+    ) -> str:
         """Attempt to fix a failed SQL query."""
         messages = [
             {
@@ -82,11 +152,11 @@ class SQLAgent(BaseAgent):
                     target_db=self.target_db,
                     error=error_msg,
                     query=bad_query,
-                    schema=self.schema,
+                    schema=self._prompt_schema(),
                 ),
             }
         ]
-        response = call_llm(messages, temperature=0.2)
+        response = call_llm(messages, temperature=temperature, stage="sql_fix")
         return self._clean_sql(response)
 
     def _clean_sql(self, response: str) -> str:
@@ -120,26 +190,76 @@ class SQLAgent(BaseAgent):
                 return False
         return True
 
+    @contextmanager
+    def _statement_deadline(self, conn):
+        """Apply a dialect-specific statement timeout to the connection."""
+        seconds = self.statement_timeout
+        dialect = self.engine.dialect.name
+        dbapi_conn = conn.connection.dbapi_connection
+        cleanup = None
+
+        if seconds:
+            try:
+                if dialect == "postgresql":
+                    # SET LOCAL only lasts for this transaction
+                    conn.execute(
+                        text(f"SET LOCAL statement_timeout = {int(seconds * 1000)}")
+                    )
+                elif dialect == "mysql":
+                    if getattr(self.engine.dialect, "is_mariadb", False):
+                        conn.execute(text(f"SET SESSION max_statement_time = {seconds}"))
+                    else:
+                        conn.execute(
+                            text(f"SET SESSION MAX_EXECUTION_TIME = {int(seconds * 1000)}")
+                        )
+                elif dialect == "mssql" and hasattr(dbapi_conn, "timeout"):
+                    dbapi_conn.timeout = int(seconds)  # pyodbc query timeout
+                elif dialect == "oracle" and hasattr(dbapi_conn, "call_timeout"):
+                    dbapi_conn.call_timeout = int(seconds * 1000)
+                elif dialect == "sqlite":
+                    deadline = time.monotonic() + seconds
+                    dbapi_conn.set_progress_handler(
+                        lambda: int(time.monotonic() > deadline), 10000
+                    )
+                    cleanup = lambda: dbapi_conn.set_progress_handler(None, 0)
+                else:
+                    logger.warning(f"No statement timeout support for dialect {dialect}")
+            except Exception as e:
+                logger.warning(f"Could not apply statement timeout ({dialect}): {e}")
+
+        try:
+            yield
+        finally:
+            if cleanup:
+                cleanup()
+
     def _execute_code(self, sql_query: str) -> pd.DataFrame:
-        """Execute SQL query and return results as DataFrame with caching."""
-        # Try to get from cache first
-        cached_df = self.cache_manager.get_query_result(
-            self.connection_string, sql_query
+        """
+        Execute SQL query and return results as DataFrame with caching.
+        Identical queries already running for another request are awaited
+        rather than sent to the database again.
+        """
+        return self.cache_manager.load_query_result(
+            self.connection_string, sql_query, lambda: self._run_query(sql_query)
         )
-        if cached_df is not None:
-            return cached_df
-
-        # Execute query if not cached
-        with self.engine.connect() as conn:
-            result = conn.execute(text(sql_query))
-            if result.returns_rows:
-                df = pd.DataFrame(result.fetchall(), columns=result.keys())
-                # Cache the result
-                self.cache_manager.set_query_result(
-                    self.connection_string, sql_query, df
-                )
-                return df
-            return pd.DataFrame()
+
+    def _run_query(self, sql_query: str):
+        """Run the query under the statement timeout; None if it returns no rows."""
+        with span("sql_execution") as attrs, self.engine.connect() as conn:
+            with self._statement_deadline(conn):
+                try:
+                    result = conn.execute(text(sql_query))
+                    rows = result.fetchall() if result.returns_rows else None
+                except Exception as e:
+                    if _is_timeout_error(e):
+                        raise StatementTimeout(
+                            f"Query exceeded the {self.statement_timeout}s statement timeout"
+                        ) from e
+                    raise
+            attrs["rows"] = len(rows) if rows is not None else 0
+            if rows is not None:
+                return pd.DataFrame(rows, columns=result.keys())
+            return None
 
     def _generate_chart_code(
         self, step: Dict[str, Any], df: pd.DataFrame, user_query: str
@@ -168,8 +288,10 @@ class SQLAgent(BaseAgent):
         ]
 
         try:
-            code = call_llm(messages, temperature=0.0, timeout=30)
+            code = call_llm(messages, temperature=0.0, timeout=30, stage="chart_code")
             return code
+        except LLMOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Chart code generation failed: {e}")
             return None
@@ -223,15 +345,13 @@ class SQLAgent(BaseAgent):
                     f"Chart Title: {title}; X-Axis: {x_label}; Y-Axis: {y_label}"
                 )
 
-                # Save the chart
-                file_name = f"plot_{uuid.uuid4()}.png"
-                file_path = os.path.join("static", "plots", file_name)
-                plt.savefig(file_path, bbox_inches="tight", dpi=100)
+                # Save the chart (deduplicated by content hash)
+                plot_url = PlotStore().save_figure(plt.gcf())
                 plt.close("all")
 
                 return {
                     "type": "image",
-                    "data": f"/static/plots/{file_name}",
+                    "data": plot_url,
                     "mime": "image/png",
                     "description": description,
                 }
@@ -251,8 +371,8 @@ class SQLAgent(BaseAgent):
 
     def _format_final_response(
         self, user_query: str, all_results: List[Dict[str, Any]]
-    ) -> str:
-        """Format final response using LLM when no summary step exists."""
+    ):
+        """Stream the final response using LLM when no summary step exists."""
         summary_parts = []
         for i, result in enumerate(all_results, 1):
             if result["type"] == "table":
@@ -260,7 +380,7 @@ class SQLAgent(BaseAgent):
                     f"Step {i}: Retrieved {result.get('total_rows', 0)} rows. "
                     f"Columns: {', '.join(result.get('columns', []))}"
                 )
-            elif result["type"] == "image":
+            elif result["type"] in ("image", "chart"):
                 summary_parts.append(
                     f"Step {i}: Created visualization - {result.get('description', '')}"
                 )
@@ -281,12 +401,15 @@ class SQLAgent(BaseAgent):
             }
         ]
 
-        try:
-            response = call_llm(messages, temperature=0.7, timeout=30)
-            return response
-        except Exception as e:
-            logger.error(f"Format error: {e}")
-            return f"Analysis complete. {combined_summary}"
+        return (
+            yield from self._stream_text(
+                messages,
+                temperature=0.7,
+                timeout=30,
+                fallback=f"Analysis complete. {combined_summary}",
+                stage="format",
+            )
+        )
 
     def _consult_brain(self, user_query: str, history_str: str = "") -> Dict[str, Any]:
         """Consult the planning brain to generate analysis plan."""
@@ -294,7 +417,7 @@ class SQLAgent(BaseAgent):
             {
                 "role": "system",
                 "content": SQL_BRAIN_PROMPT.format(
-                    schema=self.schema,
+                    schema=self._prompt_schema(),
                     history=history_str if history_str else "No previous conversation.",
                     query=user_query,
                 ),
@@ -302,7 +425,7 @@ class SQLAgent(BaseAgent):
         ]
 
         try:
-            response = call_llm(messages, temperature=0.1, timeout=60)
+            response = call_llm(messages, temperature=0.1, timeout=60, stage="brain")
 
             if "```" in response:
                 response = response.replace("```json", "").replace("```", "").strip()
@@ -331,11 +454,14 @@ class SQLAgent(BaseAgent):
 
             return brain_output
 
+        except LLMOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Brain malfunction: {e}")
             return {
                 "intent": "DATA_ACTION",
                 "reasoning": "Fallback due to JSON parsing error.",
+                "fallback": True,
                 "plan": [
                     {
                         "step_number": 1,
@@ -347,44 +473,235 @@ class SQLAgent(BaseAgent):
                 ],
             }
 
-    def _execute_sql_step(
-        self, step: Dict[str, Any], all_sqls: List[str]
+    def _plan_and_generate_sql(self, user_query: str, history_str: str = ""):
+        """Intent, plan and SQL for every step in one LLM call."""
+        messages = [
+            {
+                "role": "system",
+                "content": SQL_PLAN_AND_GENERATE_PROMPT.format(
+                    schema=self._prompt_schema(),
+                    history=history_str if history_str else "No previous conversation.",
+                    query=user_query,
+                    target_db=self.target_db,
+                ),
+            }
+        ]
+        return self._plan_and_generate(messages, "sql", self._validate_generated_sql)
+
+    def _validate_generated_sql(self, sql: str) -> str:
+        cleaned = self._clean_sql(sql)
+        if not cleaned.lower().startswith(("select", "with")):
+            raise ValueError("generated SQL is not a SELECT")
+        if not self._sanitize_sql(cleaned):
+            raise ValueError("generated SQL failed the read-only check")
+        return cleaned
+
+    def _explain(self, sql_query: str):
+        """
+        Ask the planner about a query without running it.
+        Returns (supported, error); error is None when the plan is valid.
+        """
+        prefix = EXPLAIN_PREFIXES.get(self.engine.dialect.name)
+        if prefix is None:
+            return False, None
+
+        try:
+            with span("sql_explain"), self.engine.connect() as conn:
+                with self._statement_deadline(conn):
+                    conn.execute(text(prefix + sql_query.strip().rstrip(";"))).fetchall()
+            return True, None
+        except Exception as e:
+            if _is_timeout_error(e):
+                return True, None  # slow planning is left to the real execution
+            orig = getattr(e, "orig", None) or e
+            lines = [line.strip() for line in str(orig).strip().splitlines() if line.strip()]
+            return True, " ".join(lines[:4])
+
+    def _prevalidate(self, step: Dict[str, Any], sql_query: str):
+        """
+        Local schema checks and fixes, then EXPLAIN. Returns (sql, error) where
+        error is a precise message for the fix prompt, or None to execute.
+        """
+        report = self.validator.check(sql_query)
+        if report["fixes"]:
+            logger.info(
+                f"Step {step['step_number']}: Fixed identifiers locally: "
+                f"{', '.join(report['fixes'])}"
+            )
+            sql_query = report["sql"]
+
+        problems = report["problems"]
+        supported, planner_error = self._explain(sql_query)
+
+        if supported and planner_error is None:
+            if problems:
+                # The database is the authority; the local model may be stale
+                logger.info(
+                    f"Step {step['step_number']}: EXPLAIN passed despite local warnings: "
+                    f"{'; '.join(problems)}"
+                )
+            return sql_query, None
+
+        messages = list(problems)
+        if planner_error:
+            messages.append(f"Database planner error: {planner_error}")
+        return sql_query, "\n".join(messages) if messages else None
+
+    def _repair_sql(
+        self, step: Dict[str, Any], bad_query: str, error_msg: str, budget: int
+    ):
+        """
+        Request repair candidates concurrently, validate each with the schema
+        checks and EXPLAIN as it arrives and keep the first that plans.
+        Returns (sql, validated, llm_calls_used).
+        """
+        count = max(1, min(SQL_REPAIR_CANDIDATES, budget))
+        if count == 1:
+            return self._fix_sql(bad_query, error_msg), False, 1
+
+        def attempt(temperature: float):
+            candidate = self._fix_sql(bad_query, error_msg, temperature=temperature)
+            if not self._sanitize_sql(candidate):
+                return candidate, "Prohibited SQL commands detected."
+            if not SQL_PREVALIDATE:
+                return candidate, None
+            return self._prevalidate(step, candidate)
+
+        started = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=count)
+        # Each worker runs in a copy of this context so its spans reach the trace
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run,
+                attempt,
+                REPAIR_TEMPERATURES[i % len(REPAIR_TEMPERATURES)],
+            )
+            for i in range(count)
+        ]
+        fallback = None
+        try:
+            for future in as_completed(futures):
+                try:
+                    candidate, error = future.result()
+                except Exception as e:
+                    logger.warning(f"Step {step['step_number']}: Repair candidate failed: {e}")
+                    continue
+                if error is None:
+                    logger.info(
+                        f"Step {step['step_number']}: Repair candidate accepted after "
+                        f"{time.monotonic() - started:.2f}s ({count} requested)"
+                    )
+                    return candidate, SQL_PREVALIDATE, count
+                if fallback is None:
+                    fallback = candidate
+        finally:
+            # Don't wait for slower candidates once one is accepted
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        logger.warning(f"Step {step['step_number']}: No repair candidate passed validation")
+        return fallback or bad_query, False, count
+
+    def _run_sql_with_repair(
+        self, step: Dict[str, Any], sql_query: str
     ) -> Dict[str, Any]:
-        """Execute a SQL-based step (metric/table)."""
-        current_query = step["description"]
-        sql_query = self._generate_sql(current_query)
-        df = None
+        """
+        Execute generated SQL, asking the LLM to repair it on failure.
+        Returns {"df", "sql", "error", "error_kind"}; error_kind is one of
+        None, "security", "validation", "timeout" or "execution".
+        Queries are validated locally and with EXPLAIN first, so most bad SQL
+        never reaches the database. Repairs race several candidates at once.
+        """
         last_error = None
-        current_sql_used = ""
+        error_kind = None
+        repair_calls_left = SQL_REPAIR_MAX_CALLS
+        validated = False
 
         for attempt in range(self.max_retries):
             if not self._sanitize_sql(sql_query):
                 return {
-                    "step_number": step["step_number"],
-                    "step_description": step["title"],
-                    "step_type": "error",
-                    "type": "error",
-                    "data": "Security Alert: Prohibited SQL commands detected.",
+                    "df": None,
+                    "sql": "",
+                    "error": "Security Alert: Prohibited SQL commands detected.",
+                    "error_kind": "security",
                 }
 
+            cached_df = self.cache_manager.get_query_result(
+                self.connection_string, sql_query
+            )
+            if cached_df is not None:
+                return {"df": cached_df, "sql": sql_query, "error": None, "error_kind": None}
+
+            validation_error = None
+            if SQL_PREVALIDATE and not validated:
+                sql_query, validation_error = self._prevalidate(step, sql_query)
+
             try:
+                if validation_error:
+                    raise SQLValidationError(validation_error)
                 df = self._execute_code(sql_query)
-                current_sql_used = sql_query
-                logger.info(
-                    f"Step {step['step_number']}: Query executed successfully, {len(df)} rows"
-                )
-                break
+                return {"df": df, "sql": sql_query, "error": None, "error_kind": None}
+            except SQLValidationError as e:
+                last_error = str(e)
+                error_kind = "validation"
+                fix_context = last_error
+            except StatementTimeout as e:
+                last_error = str(e)
+                error_kind = "timeout"
+                fix_context = f"{last_error}\n{SQL_TIMEOUT_FIX_HINT}"
             except Exception as e:
                 last_error = str(e)
-                logger.warning(
-                    f"SQL Execution failed (Attempt {attempt+1}/{self.max_retries}): {last_error}"
-                )
+                error_kind = "execution"
+                fix_context = last_error
+
+            logger.warning(
+                f"Step {step['step_number']}: SQL {error_kind} failure "
+                f"(Attempt {attempt+1}/{self.max_retries}): {last_error}"
+            )
+            if attempt == self.max_retries - 1 or repair_calls_left <= 0:
+                break
+            sql_query, validated, calls = self._repair_sql(
+                step, sql_query, fix_context, repair_calls_left
+            )
+            repair_calls_left -= calls
 
-                if attempt < self.max_retries - 1:
-                    sql_query = self._fix_sql(sql_query, last_error)
+        return {"df": None, "sql": "", "error": last_error, "error_kind": error_kind}
+
+    def _step_error(
+        self, step: Dict[str, Any], message: str, error_kind: str | None = None
+    ) -> Dict[str, Any]:
+        error_result = {
+            "step_number": step["step_number"],
+            "step_description": step["title"],
+            "step_type": "error",
+            "type": "error",
+            "data": message,
+        }
+        if error_kind:
+            error_result["error_kind"] = error_kind
+        if error_kind == "timeout":
+            error_result["timeout_seconds"] = self.statement_timeout
+        return error_result
+
+    def _execute_sql_step(
+        self, step: Dict[str, Any], all_sqls: List[str], prepared_sql: str = None
+    ) -> Dict[str, Any]:
+        """Execute a SQL-based step (metric/table)."""
+        current_query = step["description"]
+        sql_query = prepared_sql or self._generate_sql(current_query)
+
+        outcome = self._run_sql_with_repair(step, sql_query)
+        if outcome["error_kind"] == "security":
+            return self._step_error(step, outcome["error"], "security")
+
+        df = outcome["df"]
+        last_error = outcome["error"]
+        current_sql_used = outcome["sql"]
 
         # Prepare result
         if df is not None:
+            logger.info(
+                f"Step {step['step_number']}: Query executed successfully, {len(df)} rows"
+            )
             df_clean = df.where(pd.notnull(df), None)
             data_dict = (
                 df_clean.head(self.result_limit)
@@ -406,13 +723,11 @@ class SQLAgent(BaseAgent):
             }
         else:
             # Failed after retries
-            exec_result = {
-                "step_number": step["step_number"],
-                "step_description": step["title"],
-                "step_type": "error",
-                "type": "error",
-                "data": f"Failed to execute query after {self.max_retries} attempts. Error: {last_error}",
-            }
+            exec_result = self._step_error(
+                step,
+                f"Failed to execute query after {self.max_retries} attempts. Error: {last_error}",
+                outcome["error_kind"],
+            )
 
         if current_sql_used:
             all_sqls.append(
@@ -422,50 +737,58 @@ class SQLAgent(BaseAgent):
         return exec_result
 
     def _execute_chart_step(
-        self, step: Dict[str, Any], all_sqls: List[str], user_query: str
+        self,
+        step: Dict[str, Any],
+        all_sqls: List[str],
+        user_query: str,
+        prepared_sql: str = None,
     ) -> Dict[str, Any]:
         """Execute a chart step - first get data, then visualize it."""
         current_query = step["description"]
-        sql_query = self._generate_sql(current_query)
-        df = None
-        last_error = None
-        current_sql_used = ""
+        sql_query = prepared_sql or self._generate_sql(current_query)
 
         # First, execute SQL to get data
-        for attempt in range(self.max_retries):
-            if not self._sanitize_sql(sql_query):
+        outcome = self._run_sql_with_repair(step, sql_query)
+        if outcome["error_kind"] == "security":
+            return self._step_error(step, outcome["error"], "security")
+
+        df = outcome["df"]
+        last_error = outcome["error"]
+        current_sql_used = outcome["sql"]
+
+        if df is None or df.empty:
+            return self._step_error(
+                step,
+                f"Failed to retrieve data for chart. Error: {last_error}",
+                outcome["error_kind"],
+            )
+        logger.info(
+            f"Step {step['step_number']}: Data retrieved for chart, {len(df)} rows"
+        )
+
+        # Declarative spec: the client renders the chart, no codegen or rasterizing
+        if spec_mode_enabled():
+            with span("chart_render", mode="spec"):
+                spec = build_chart_spec(
+                    df, step.get("chart_type"), title=step.get("title", "")
+                )
+            if spec is not None:
+                if current_sql_used:
+                    all_sqls.append(
+                        f"-- Step {step['step_number']}: {step['description']}\n{current_sql_used}"
+                    )
                 return {
                     "step_number": step["step_number"],
                     "step_description": step["title"],
-                    "step_type": "error",
-                    "type": "error",
-                    "data": "Security Alert: Prohibited SQL commands detected.",
+                    "step_type": "chart",
+                    "type": "chart",
+                    "data": spec,
+                    "description": describe_chart_spec(spec),
+                    "query": current_sql_used,
                 }
-
-            try:
-                df = self._execute_code(sql_query)
-                current_sql_used = sql_query
-                logger.info(
-                    f"Step {step['step_number']}: Data retrieved for chart, {len(df)} rows"
-                )
-                break
-            except Exception as e:
-                last_error = str(e)
-                logger.warning(
-                    f"SQL Execution failed (Attempt {attempt+1}/{self.max_retries}): {last_error}"
-                )
-
-                if attempt < self.max_retries - 1:
-                    sql_query = self._fix_sql(sql_query, last_error)
-
-        if df is None or df.empty:
-            return {
-                "step_number": step["step_number"],
-                "step_description": step["title"],
-                "step_type": "error",
-                "type": "error",
-                "data": f"Failed to retrieve data for chart. Error: {last_error}",
-            }
+            logger.info(
+                f"Step {step['step_number']}: No chart encoding inferred, falling back to PNG"
+            )
 
         # Generate chart code
         chart_code = self._generate_chart_code(step, df, user_query)
@@ -481,7 +804,8 @@ class SQLAgent(BaseAgent):
         # Sanitize and execute chart code
         try:
             clean_code = self._sanitize_chart_code(chart_code)
-            chart_result = self._execute_chart_code(clean_code, df)
+            with span("chart_render", mode="png"):
+                chart_result = self._execute_chart_code(clean_code, df)
 
             chart_result["step_number"] = step["step_number"]
             chart_result["step_description"] = step["title"]
@@ -495,6 +819,8 @@ class SQLAgent(BaseAgent):
 
             return chart_result
 
+        except LLMOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Chart generation error: {e}")
             return {
@@ -507,8 +833,8 @@ class SQLAgent(BaseAgent):
 
     def _execute_summary_step(
         self, step: Dict[str, Any], user_query: str, all_results: List[Dict[str, Any]]
-    ) -> str:
-        """Execute a summary step by synthesizing previous results."""
+    ):
+        """Execute a summary step by synthesizing previous results, streamed as summary_delta events."""
         context_str = ""
         for res in all_results:
             if res["type"] == "table":
@@ -520,7 +846,7 @@ class SQLAgent(BaseAgent):
                 context_str += (
                     f"Data Sample (Top 5 rows): {str(res.get('data', [])[:5])}\n\n"
                 )
-            elif res["type"] == "image":
+            elif res["type"] in ("image", "chart"):
                 context_str += (
                     f"Step {res['step_number']} ({res['step_description']}):\n"
                 )
@@ -538,17 +864,35 @@ class SQLAgent(BaseAgent):
                 ),
             }
         ]
-        try:
-            summary_text = call_llm(messages, temperature=0.5, timeout=30)
-            logger.info(f"Step {step['step_number']}: Summary generated successfully")
-            return summary_text
-        except Exception as e:
-            logger.error(f"Summary generation failed: {e}")
-            return "Summary generation failed. See individual step results for details."
+        summary_text = yield from self._stream_text(
+            messages,
+            temperature=0.5,
+            timeout=30,
+            fallback="Summary generation failed. See individual step results for details.",
+            stage="summary",
+        )
+        logger.info(f"Step {step['step_number']}: Summary streamed")
+        return summary_text
 
     def answer(self, user_query: str, history_str: str = ""):
         """Main method to answer user queries."""
-        brain_output = self._consult_brain(user_query, history_str)
+        # Trivial greetings/abuse are answered locally without the brain LLM call
+        brain_output = IntentClassifier().classify(user_query, self.vocabulary)
+        prepared_sqls = {}
+        replayed = False
+        if brain_output is None:
+            # Repeated question on the same schema: replay plan and working SQL
+            memo = PlanMemo().get(self.dataset_key, self.dataset_version, user_query)
+            combined = None
+            if memo:
+                brain_output, prepared_sqls = memo["brain_output"], memo["codes"]
+                replayed = True
+            elif PLAN_AND_GENERATE_ENABLED:
+                combined = self._plan_and_generate_sql(user_query, history_str)
+            if combined:
+                brain_output, prepared_sqls = combined
+            elif not memo:
+                brain_output = self._consult_brain(user_query, history_str)
         intent = brain_output.get("intent", "DATA_ACTION")
 
         # Handle non-data intents
@@ -628,21 +972,27 @@ class SQLAgent(BaseAgent):
 
             # 1. HANDLE METRIC / TABLE -> Execute SQL
             if step_type in ["metric", "table"]:
-                exec_result = self._execute_sql_step(step, all_sqls)
+                exec_result = self._execute_sql_step(
+                    step, all_sqls, prepared_sqls.get(str(step_number))
+                )
                 all_results.append(exec_result)
                 yield json.dumps({"type": "step_result", "data": exec_result})
 
             # 2. HANDLE CHART -> Execute SQL + Generate Visualization
             elif step_type == "chart":
-                exec_result = self._execute_chart_step(step, all_sqls, user_query)
+                exec_result = self._execute_chart_step(
+                    step, all_sqls, user_query, prepared_sqls.get(str(step_number))
+                )
                 all_results.append(exec_result)
                 yield json.dumps({"type": "step_result", "data": exec_result})
 
             # 3. HANDLE SUMMARY -> Execute LLM Synthesis
             elif step_type == "summary":
-                final_summary_text = self._execute_summary_step(
-                    step, user_query, all_results
-                )
+                # Near the token budget the digest below stands in for it
+                if not economy_mode():
+                    final_summary_text = yield from self._execute_summary_step(
+                        step, user_query, all_results
+                    )
 
             # 4. UNKNOWN TYPES
             else:
@@ -659,9 +1009,35 @@ class SQLAgent(BaseAgent):
                 all_results.append(exec_result)
                 yield json.dumps({"type": "step_result", "data": exec_result})
 
+        # Only fully successful plans are worth replaying
+        succeeded = all(res["type"] != "error" for res in all_results)
+        if replayed and not succeeded:
+            PlanMemo().discard(self.dataset_key, self.dataset_version, user_query)
+        elif not replayed and succeeded and not brain_output.get("fallback"):
+            PlanMemo().put(
+                self.dataset_key,
+                self.dataset_version,
+                user_query,
+                brain_output,
+                {
+                    str(res["step_number"]): res["query"]
+                    for res in all_results
+                    if res.get("query")
+                },
+            )
+
+        # Single-pass plans answer single values locally, without a format call
+        if not final_summary_text and brain_output.get("combined"):
+            final_summary_text = self._local_summary(all_results) or ""
+
+        if not final_summary_text and economy_mode():
+            final_summary_text = self._budget_summary(all_results)
+
         # Generate final summary if not already created by summary step
         if not final_summary_text:
-            final_summary_text = self._format_final_response(user_query, all_results)
+            final_summary_text = yield from self._format_final_response(
+                user_query, all_results
+            )
 
         formatted_code = "\n\n".join(all_sqls) if all_sqls else "-- No SQL executed"
 
@@ -702,14 +1078,14 @@ class SQLAgent(BaseAgent):
                 {
                     "role": "system",
                     "content": DOSSIER_PROMPT.format(
-                        schema=self.schema,
+                        schema=self._prompt_schema(),
                         stats=self._generate_stats(),
                         preview=self._generate_preview(),
                         source_type="SQL database",
                     ),
                 }
             ]
-            response = call_llm(messages, temperature=0.0)
+            response = call_llm(messages, temperature=0.0, stage="dossier")
             clean_response = response.replace("```json", "").replace("```", "").strip()
             return json_repair.loads(clean_response)
         except Exception as e:
@@ -719,6 +1095,7 @@ class SQLAgent(BaseAgent):
     def invalidate_cache(self):
         """Invalidate all cached data for this connection."""
         self.cache_manager.invalidate_connection(self.connection_string)
+        PlanMemo().invalidate_dataset(self.dataset_key)
         logger.info("Cache invalidated for current connection")
 
     def invalidate_query_cache(self):
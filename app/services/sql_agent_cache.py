@@ -1,16 +1,23 @@
 import pandas as pd
+import threading
 import time
 import hashlib
-from typing import Dict, Any, Tuple, Optional
-from sqlalchemy import create_engine
+from typing import Callable, Dict, Any, Tuple, Optional
+from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 
+from app.services.single_flight import SingleFlight
+from app.services.telemetry import span
+
 
 class SQLAgentCache:
     _instance = None
     _connection_store: Dict[str, Dict[str, Any]] = {}
     _schema_store: Dict[str, Dict[str, Any]] = {}
     _query_store: Dict[str, Dict[str, Any]] = {}
+    _lock = threading.RLock()
+    _schema_loads = SingleFlight("schema_inference")
+    _query_loads = SingleFlight("query_execution")
 
     CONNECTION_TTL = 3600  # 1 hour for connections
     SCHEMA_TTL = 1800  # 30 minutes for schema
@@ -37,36 +44,44 @@ class SQLAgentCache:
         cache_key = self._hash_connection_string(connection_string)
         current_time = time.time()
 
-        if cache_key in self._connection_store:
-            entry = self._connection_store[cache_key]
-
-            # Check if connection is still valid
-            if current_time - entry["timestamp"] < self.CONNECTION_TTL:
-                try:
-                    # Test connection
-                    with entry["engine"].connect() as conn:
-                        conn.execute("SELECT 1")
-
-                    entry["timestamp"] = current_time
-                    print(f"CACHE HIT: Using cached engine for connection")
-                    return entry["engine"]
-                except Exception as e:
-                    print(f"CACHE: Connection test failed, recreating: {e}")
-                    del self._connection_store[cache_key]
-            else:
+        with self._lock:
+            entry = self._connection_store.get(cache_key)
+            if entry is not None and current_time - entry["timestamp"] >= self.CONNECTION_TTL:
                 print(f"CACHE: Expired engine for connection")
                 # Dispose old engine
                 entry["engine"].dispose()
                 del self._connection_store[cache_key]
+                entry = None
 
-        print(f"CACHE MISS: Creating new engine")
-        engine = create_engine(connection_string)
+        if entry is not None:
+            # Test connection outside the lock; it may block on the network
+            try:
+                with entry["engine"].connect() as conn:
+                    conn.execute(text("SELECT 1"))
 
-        self._connection_store[cache_key] = {
-            "engine": engine,
-            "timestamp": current_time,
-            "connection_string": connection_string,  # Store for disposal
-        }
+                entry["timestamp"] = current_time
+                print(f"CACHE HIT: Using cached engine for connection")
+                return entry["engine"]
+            except Exception as e:
+                print(f"CACHE: Connection test failed, recreating: {e}")
+                with self._lock:
+                    if self._connection_store.get(cache_key) is entry:
+                        del self._connection_store[cache_key]
+
+        with self._lock:
+            # Another thread may have replaced the engine meanwhile
+            entry = self._connection_store.get(cache_key)
+            if entry is not None:
+                return entry["engine"]
+
+            print(f"CACHE MISS: Creating new engine")
+            engine = create_engine(connection_string)
+
+            self._connection_store[cache_key] = {
+                "engine": engine,
+                "timestamp": current_time,
+                "connection_string": connection_string,  # Store for disposal
+            }
 
         return engine
 
@@ -78,16 +93,18 @@ class SQLAgentCache:
         cache_key = self._hash_connection_string(connection_string)
         current_time = time.time()
 
-        if cache_key in self._schema_store:
-            entry = self._schema_store[cache_key]
+        with span("cache_lookup", cache="schema") as attrs, self._lock:
+            if cache_key in self._schema_store:
+                entry = self._schema_store[cache_key]
 
-            if current_time - entry["timestamp"] < self.SCHEMA_TTL:
-                entry["timestamp"] = current_time
-                print(f"CACHE HIT: Using cached schema ({len(entry['schema'])} chars)")
-                return entry["schema"]
-            else:
-                print(f"CACHE: Expired schema")
-                del self._schema_store[cache_key]
+                if current_time - entry["timestamp"] < self.SCHEMA_TTL:
+                    entry["timestamp"] = current_time
+                    attrs["hit"] = True
+                    print(f"CACHE HIT: Using cached schema ({len(entry['schema'])} chars)")
+                    return entry["schema"]
+                else:
+                    print(f"CACHE: Expired schema")
+                    del self._schema_store[cache_key]
 
         return None
 
@@ -96,9 +113,28 @@ class SQLAgentCache:
         cache_key = self._hash_connection_string(connection_string)
         current_time = time.time()
 
-        self._schema_store[cache_key] = {"schema": schema, "timestamp": current_time}
+        with self._lock:
+            self._schema_store[cache_key] = {"schema": schema, "timestamp": current_time}
         print(f"CACHE: Stored schema ({len(schema)} chars)")
 
+    def load_schema(self, connection_string: str, infer: Callable[[], str]) -> str:
+        """
+        Cached schema, or run `infer` and cache its result. Agents created
+        concurrently for the same database share one inference.
+        """
+        schema = self.get_schema(connection_string)
+        if schema is not None:
+            return schema
+
+        def load():
+            schema = self.get_schema(connection_string)
+            if schema is None:
+                schema = infer()
+                self.set_schema(connection_string, schema)
+            return schema
+
+        return self._schema_loads.do(self._hash_connection_string(connection_string), load)
+
     def get_query_result(
         self, connection_string: str, query: str
     ) -> Optional[pd.DataFrame]:
@@ -111,16 +147,18 @@ class SQLAgentCache:
         cache_key = f"{conn_key}:{query_key}"
         current_time = time.time()
 
-        if cache_key in self._query_store:
-            entry = self._query_store[cache_key]
+        with span("cache_lookup", cache="query_result") as attrs, self._lock:
+            if cache_key in self._query_store:
+                entry = self._query_store[cache_key]
 
-            if current_time - entry["timestamp"] < self.QUERY_TTL:
-                entry["timestamp"] = current_time
-                print(f"CACHE HIT: Using cached query result ({len(entry['df'])} rows)")
-                return entry["df"].copy()  # Return copy to prevent mutation
-            else:
-                print(f"CACHE: Expired query result")
-                del self._query_store[cache_key]
+                if current_time - entry["timestamp"] < self.QUERY_TTL:
+                    entry["timestamp"] = current_time
+                    attrs["hit"] = True
+                    print(f"CACHE HIT: Using cached query result ({len(entry['df'])} rows)")
+                    return entry["df"].copy()  # Return copy to prevent mutation
+                else:
+                    print(f"CACHE: Expired query result")
+                    del self._query_store[cache_key]
 
         return None
 
@@ -131,34 +169,63 @@ class SQLAgentCache:
         cache_key = f"{conn_key}:{query_key}"
         current_time = time.time()
 
-        self._query_store[cache_key] = {
-            "df": df.copy(),  # Store copy to prevent external mutation
-            "query": query,
-            "timestamp": current_time,
-        }
+        with self._lock:
+            self._query_store[cache_key] = {
+                "df": df.copy(),  # Store copy to prevent external mutation
+                "query": query,
+                "timestamp": current_time,
+            }
         print(f"CACHE: Stored query result ({len(df)} rows)")
 
+    def load_query_result(
+        self,
+        connection_string: str,
+        query: str,
+        execute: Callable[[], Optional[pd.DataFrame]],
+    ) -> pd.DataFrame:
+        """
+        Cached result, or run `execute` once for all concurrent callers of
+        the same query and cache what it returns (None is not cached).
+        Every caller gets its own copy.
+        """
+        cached_df = self.get_query_result(connection_string, query)
+        if cached_df is not None:
+            return cached_df
+
+        def load():
+            df = self.get_query_result(connection_string, query)
+            if df is None:
+                df = execute()
+                if df is not None:
+                    self.set_query_result(connection_string, query, df)
+            return df
+
+        key = f"{self._hash_connection_string(connection_string)}:{self._hash_query(query)}"
+        df = self._query_loads.do(key, load)
+        return pd.DataFrame() if df is None else df.copy()
+
     def invalidate_connection(self, connection_string: str):
         """Manually remove a connection from cache (e.g., on disconnect)"""
         cache_key = self._hash_connection_string(connection_string)
 
-        if cache_key in self._connection_store:
-            # Dispose engine properly
-            self._connection_store[cache_key]["engine"].dispose()
-            del self._connection_store[cache_key]
-            print(f"CACHE: Manually cleared connection")
-
-        # Also clear related schema and queries
-        if cache_key in self._schema_store:
-            del self._schema_store[cache_key]
-            print(f"CACHE: Cleared schema for connection")
-
-        # Clear all queries for this connection
-        query_keys_to_remove = [
-            k for k in self._query_store.keys() if k.startswith(cache_key)
-        ]
-        for key in query_keys_to_remove:
-            del self._query_store[key]
+        with self._lock:
+            if cache_key in self._connection_store:
+                # Dispose engine properly
+                self._connection_store[cache_key]["engine"].dispose()
+                del self._connection_store[cache_key]
+                print(f"CACHE: Manually cleared connection")
+
+            # Also clear related schema and queries
+            if cache_key in self._schema_store:
+                del self._schema_store[cache_key]
+                print(f"CACHE: Cleared schema for connection")
+
+            # Clear all queries for this connection
+            query_keys_to_remove = [
+                k for k in self._query_store.keys() if k.startswith(cache_key)
+            ]
+            for key in query_keys_to_remove:
+                del self._query_store[key]
         if query_keys_to_remove:
             print(f"CACHE: Cleared {len(query_keys_to_remove)} query results")
 
@@ -166,33 +233,36 @@ class SQLAgentCache:
         """Clear all cached queries for a connection (e.g., after data modification)"""
         conn_key = self._hash_connection_string(connection_string)
 
-        query_keys_to_remove = [
-            k for k in self._query_store.keys() if k.startswith(conn_key)
-        ]
-        for key in query_keys_to_remove:
-            del self._query_store[key]
+        with self._lock:
+            query_keys_to_remove = [
+                k for k in self._query_store.keys() if k.startswith(conn_key)
+            ]
+            for key in query_keys_to_remove:
+                del self._query_store[key]
 
         if query_keys_to_remove:
             print(f"CACHE: Invalidated {len(query_keys_to_remove)} query results")
 
     def clear_all(self):
         """Clear entire cache (e.g., on application restart)"""
-        # Dispose all engines
-        for entry in self._connection_store.values():
-            entry["engine"].dispose()
+        with self._lock:
+            # Dispose all engines
+            for entry in self._connection_store.values():
+                entry["engine"].dispose()
 
-        self._connection_store.clear()
-        self._schema_store.clear()
-        self._query_store.clear()
+            self._connection_store.clear()
+            self._schema_store.clear()
+            self._query_store.clear()
         print("CACHE: Cleared all cached data")
 
     def get_cache_stats(self) -> Dict[str, int]:
         """Get statistics about current cache state"""
-        return {
-            "connections": len(self._connection_store),
-            "schemas": len(self._schema_store),
-            "queries": len(self._query_store),
-            "total_items": len(self._connection_store)
-            + len(self._schema_store)
-            + len(self._query_store),
-        }
+        with self._lock:
+            return {
+                "connections": len(self._connection_store),
+                "schemas": len(self._schema_store),
+                "queries": len(self._query_store),
+                "total_items": len(self._connection_store)
+                + len(self._schema_store)
+                + len(self._query_store),
+            }
@@ -0,0 +1,487 @@
+import difflib
+import json
+import re
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+    |(?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>[EeNn]?'(?:[^']|'')*')
+    |(?P<dquote>"(?:[^"]|"")*")
+    |(?P<backtick>`(?:[^`]|``)*`)
+    |(?P<bracket>\[[^\[\]]*\])
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$\#]*)
+    |(?P<punct>::|<=|>=|<>|!=|\|\||.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Words never checked as column names (keywords, date parts, literals)
+KEYWORDS = {
+    "all", "and", "any", "array", "as", "asc", "at", "between", "by", "case",
+    "cast", "collate", "cross", "current", "current_date", "current_time",
+    "current_timestamp", "date", "day", "desc", "distinct", "dow", "doy",
+    "else", "end", "epoch", "escape", "except", "exists", "extract", "false",
+    "fetch", "filter", "first", "following", "from", "full", "group",
+    "having", "hour", "ilike", "in", "inner", "intersect", "interval", "into",
+    "is", "join", "last", "lateral", "left", "like", "limit", "localtime",
+    "localtimestamp", "minus", "minute", "month", "natural", "next", "not",
+    "null", "nulls", "offset", "on", "only", "or", "order", "outer", "over",
+    "partition", "percent", "preceding", "quarter", "range", "recursive",
+    "right", "row", "rows", "second", "select", "similar", "some", "then",
+    "ties", "time", "timestamp", "to", "top", "true", "unbounded", "union",
+    "unknown", "using", "values", "week", "when", "where", "window", "with",
+    "within", "year", "zone",
+}
+
+# Identifiers that must be quoted when used as table/column names
+RESERVED = {
+    "all", "and", "as", "asc", "between", "by", "case", "check", "column",
+    "default", "desc", "distinct", "end", "false", "from", "group", "having",
+    "in", "index", "is", "key", "like", "limit", "not", "null", "offset", "on",
+    "or", "order", "primary", "references", "select", "table", "to", "true",
+    "union", "user", "when", "where",
+}
+
+# A FROM clause at this depth ends at any of these
+_CLAUSE_END = {
+    "where", "group", "order", "having", "limit", "offset", "union",
+    "intersect", "except", "minus", "on", "using", "window", "fetch", "select",
+}
+
+_QUOTE_KINDS = ("dquote", "backtick", "bracket")
+
+_COMPARISON = {"=", "<>", "!=", "<", ">", "<=", ">=", "like", "then", "else"}
+
+
+class _Token(NamedTuple):
+    kind: str
+    text: str
+    value: str
+    start: int
+    end: int
+
+
+def _tokenize(sql: str) -> List[_Token]:
+    tokens = []
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("ws", "comment"):
+            continue
+        raw = match.group()
+        if kind == "dquote":
+            value = raw[1:-1].replace('""', '"')
+        elif kind == "backtick":
+            value = raw[1:-1].replace("``", "`")
+        elif kind == "bracket":
+            value = raw[1:-1]
+        else:
+            value = raw
+        tokens.append(_Token(kind, raw, value, match.start(), match.end()))
+    return tokens
+
+
+class SQLValidator:
+    """
+    Checks generated SQL against the cached schema model before it reaches
+    the database: unknown tables and columns, bad qualifiers and ambiguous
+    references. Identifier case and quoting mistakes are fixed locally.
+    The analysis is deliberately conservative; when a query pulls columns
+    from CTEs, derived tables or table functions, unqualified names are not
+    reported.
+    """
+
+    def __init__(self, schema: str, dialect: str):
+        self.dialect = dialect
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self.schemas = set()
+
+        try:
+            model = json.loads(schema)
+        except (TypeError, ValueError):
+            model = {}
+
+        for table in model.get("tables", []):
+            name = table.get("name")
+            if not name:
+                continue
+            self.tables[name.lower()] = {
+                "name": name,
+                "columns": {
+                    col["name"].lower(): col["name"]
+                    for col in table.get("columns", [])
+                    if col.get("name")
+                },
+            }
+            if table.get("schema"):
+                self.schemas.add(table["schema"].lower())
+
+        self.known_names = set(self.tables)
+        for table in self.tables.values():
+            self.known_names.update(table["columns"])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.tables)
+
+    # ------------------------------------------------------------------
+    # Identifier helpers
+    # ------------------------------------------------------------------
+
+    def _is_ident(self, tok: _Token) -> bool:
+        if tok.kind == "word":
+            return tok.value.lower() not in KEYWORDS
+        if tok.kind == "bracket":
+            # Outside SQL Server brackets are array subscripts
+            return self.dialect == "mssql" or tok.value.lower() in self.known_names
+        if tok.kind == "dquote" and self.dialect == "mysql":
+            # Double quotes are string literals in MySQL unless ANSI_QUOTES
+            return tok.value.lower() in self.known_names
+        return tok.kind in _QUOTE_KINDS
+
+    def _needs_quotes(self, name: str) -> bool:
+        if name.lower() in RESERVED:
+            return True
+        if self.dialect == "postgresql":
+            return not re.fullmatch(r"[a-z_][a-z0-9_$]*", name)
+        if self.dialect == "oracle":
+            return not re.fullmatch(r"[A-Z_][A-Z0-9_$#]*", name)
+        return not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_$]*", name)
+
+    def _quote(self, name: str) -> str:
+        if self.dialect == "mysql":
+            return "`" + name.replace("`", "``") + "`"
+        if self.dialect == "mssql":
+            return f"[{name}]"
+        return '"' + name.replace('"', '""') + '"'
+
+    def _render(self, name: str) -> str:
+        return self._quote(name) if self._needs_quotes(name) else name
+
+    def _fix_identifier(self, tok: _Token, actual: str, edits: Dict, fixes: List[str]):
+        """Rewrite an identifier token that differs from the schema spelling."""
+        rendered = self._render(actual)
+        if tok.text == rendered:
+            return
+        if tok.kind in _QUOTE_KINDS and tok.value == actual:
+            # Right name, quoted in a style the dialect accepts
+            accepted = {
+                "postgresql": ("dquote",),
+                "oracle": ("dquote",),
+                "mysql": ("backtick",),
+                "mssql": ("bracket", "dquote"),
+                "sqlite": _QUOTE_KINDS,
+            }.get(self.dialect, _QUOTE_KINDS)
+            if tok.kind in accepted:
+                return
+        if tok.start not in edits:
+            edits[tok.start] = (tok.end, rendered)
+            fixes.append(f"{tok.text} -> {rendered}")
+
+    @staticmethod
+    def _suggest(name: str, candidates) -> str:
+        close = difflib.get_close_matches(name, list(candidates), n=3, cutoff=0.6)
+        return f" Did you mean: {', '.join(close)}?" if close else ""
+
+    # ------------------------------------------------------------------
+    # Analysis
+    # ------------------------------------------------------------------
+
+    def _paren_kind(self, toks: List[_Token], i: int) -> str:
+        nxt = toks[i + 1] if i + 1 < len(toks) else None
+        if nxt is not None and nxt.kind == "word" and nxt.value.lower() in ("select", "with"):
+            return "subquery"
+        prev = toks[i - 1] if i > 0 else None
+        if prev is not None and (
+            self._is_ident(prev)
+            or (prev.kind == "word" and prev.value.lower() in ("extract", "cast"))
+        ):
+            return "func"
+        return "group"
+
+    def check(self, sql: str) -> Dict[str, Any]:
+        """
+        Return {"sql": locally fixed SQL, "fixes": [...], "problems": [...]}.
+        Problems are precise, human-readable messages for the fix prompt.
+        """
+        report = {"sql": sql, "fixes": [], "problems": []}
+        if not self.enabled:
+            return report
+
+        toks = _tokenize(sql)
+        if self.dialect == "mysql":
+            # "..." compared against something is a string literal, not a name
+            toks = [
+                tok._replace(kind="string")
+                if tok.kind == "dquote"
+                and idx > 0
+                and toks[idx - 1].text.lower() in _COMPARISON
+                else tok
+                for idx, tok in enumerate(toks)
+            ]
+        n = len(toks)
+        problems: List[str] = []
+        fixes: List[str] = []
+        edits: Dict[int, Tuple[int, str]] = {}
+
+        consumed = set()
+        local_names = set()  # aliases, CTE names, derived tables
+        aliases: Dict[str, Optional[str]] = {}  # alias -> schema table key
+        referenced = []  # schema table keys in FROM/JOIN
+        unknown_scope = False
+        has_subquery = False
+
+        def word(idx: int) -> str:
+            if 0 <= idx < n and toks[idx].kind == "word":
+                return toks[idx].value.lower()
+            return ""
+
+        def text_at(idx: int) -> str:
+            return toks[idx].text if 0 <= idx < n else ""
+
+        # Pass 1: FROM/JOIN sources, aliases and CTE names
+        paren_stack: List[str] = []
+        from_depth = None
+        expect_table = False
+        cte_depth = None
+        i = 0
+        while i < n:
+            tok = toks[i]
+            low = word(i)
+
+            if tok.text == "(":
+                kind = self._paren_kind(toks, i)
+                if expect_table:
+                    kind = "derived"
+                    expect_table = False
+                    unknown_scope = True
+                if kind == "subquery":
+                    has_subquery = True
+                paren_stack.append(kind)
+
+            elif tok.text == ")":
+                kind = paren_stack.pop() if paren_stack else None
+                depth = len(paren_stack)
+                if from_depth is not None and depth < from_depth:
+                    from_depth = None
+                if kind == "derived":
+                    j = i + 1 + (word(i + 1) == "as")
+                    if j < n and self._is_ident(toks[j]):
+                        local_names.add(toks[j].value.lower())
+                        aliases[toks[j].value.lower()] = None
+                        consumed.add(j)
+                if (
+                    cte_depth == depth
+                    and text_at(i + 1) == ","
+                    and i + 2 < n
+                    and self._is_ident(toks[i + 2])
+                ):
+                    local_names.add(toks[i + 2].value.lower())
+                    consumed.add(i + 2)
+
+            elif low == "with":
+                cte_depth = len(paren_stack)
+                j = i + 1 + (word(i + 1) == "recursive")
+                if j < n and self._is_ident(toks[j]):
+                    local_names.add(toks[j].value.lower())
+                    consumed.add(j)
+
+            elif (
+                low in ("from", "join")
+                and not (paren_stack and paren_stack[-1] == "func")
+                and not (word(i - 1) == "distinct" and word(i - 2) in ("is", "not"))
+            ):
+                expect_table = True
+                from_depth = len(paren_stack)
+
+            elif expect_table and self._is_ident(tok):
+                parts = [i]
+                j = i + 1
+                while text_at(j) == "." and j + 1 < n and self._is_ident(toks[j + 1]):
+                    parts.append(j + 1)
+                    j += 2
+                consumed.update(parts)
+                expect_table = False
+
+                if text_at(j) == "(":
+                    # Table function: its columns are unknown
+                    unknown_scope = True
+                    i = j
+                    continue
+
+                name_tok = toks[parts[-1]]
+                name = name_tok.value.lower()
+                schema_part = toks[parts[-2]].value.lower() if len(parts) > 1 else None
+                table_key = None
+
+                if name in local_names:
+                    unknown_scope = True  # CTE columns are not modeled
+                elif name in self.tables and (
+                    schema_part is None or not self.schemas or schema_part in self.schemas
+                ):
+                    table_key = name
+                    referenced.append(name)
+                    self._fix_identifier(name_tok, self.tables[name]["name"], edits, fixes)
+                elif schema_part is None or not self.schemas or schema_part in self.schemas:
+                    unknown_scope = True
+                    problems.append(
+                        f"Unknown table '{name_tok.value}'."
+                        f"{self._suggest(name, self.tables)}"
+                        f" Known tables: {', '.join(t['name'] for t in list(self.tables.values())[:20])}"
+                    )
+                else:
+                    # System catalogs and other schemas are not modeled
+                    unknown_scope = True
+
+                alias_idx = None
+                if word(j) == "as" and j + 1 < n and self._is_ident(toks[j + 1]):
+                    alias_idx = j + 1
+                elif j < n and self._is_ident(toks[j]):
+                    alias_idx = j
+                if alias_idx is not None:
+                    alias = toks[alias_idx].value.lower()
+                    aliases[alias] = table_key
+                    local_names.add(alias)
+                    consumed.add(alias_idx)
+                    j = alias_idx + 1
+                if table_key is not None:
+                    aliases.setdefault(name, table_key)
+                i = j
+                continue
+
+            elif tok.text == "," and from_depth == len(paren_stack):
+                expect_table = True
+
+            elif low in _CLAUSE_END and from_depth == len(paren_stack):
+                from_depth = None
+
+            elif self._is_ident(tok) and i not in consumed and i > 0:
+                # Column aliases: `expr AS name` or `expr name`
+                prev = toks[i - 1]
+                prev_low = word(i - 1)
+                next_text = text_at(i + 1)
+                if next_text not in ("(", "."):
+                    if prev_low == "as" or (
+                        prev_low == "end"
+                        or prev.text == ")"
+                        or prev.kind in ("number", "string")
+                        or (self._is_ident(prev) and text_at(i - 2) != "::")
+                    ):
+                        local_names.add(tok.value.lower())
+                        consumed.add(i)
+
+            i += 1
+
+        scope = list(dict.fromkeys(referenced))
+        flat_query = not (unknown_scope or has_subquery) and not any(
+            word(k) in ("using", "natural") for k in range(n)
+        )
+
+        # Pass 2: column references
+        i = 0
+        while i < n:
+            tok = toks[i]
+            if i in consumed or not self._is_ident(tok):
+                i += 1
+                continue
+            if text_at(i + 1) == "(" or text_at(i - 1) in ("::", "."):
+                i += 1
+                continue
+
+            # Qualified reference: [schema.]qualifier.column
+            if text_at(i + 1) == ".":
+                parts = [i]
+                j = i + 1
+                while text_at(j) == "." and j + 1 < n and (
+                    self._is_ident(toks[j + 1]) or toks[j + 1].text == "*"
+                ):
+                    parts.append(j + 1)
+                    j += 2
+                consumed.update(parts)
+                if len(parts) >= 2:
+                    self._check_qualified(
+                        toks[parts[-2]], toks[parts[-1]], aliases, local_names,
+                        problems, edits, fixes,
+                    )
+                i = j
+                continue
+
+            name = tok.value.lower()
+            if name in local_names or not scope:
+                i += 1
+                continue
+
+            matches = [
+                (key, self.tables[key]["columns"][name])
+                for key in scope
+                if name in self.tables[key]["columns"]
+            ]
+            if matches:
+                self._fix_identifier(tok, matches[0][1], edits, fixes)
+                if len(matches) > 1 and flat_query:
+                    owners = ", ".join(self.tables[key]["name"] for key, _ in matches)
+                    problems.append(
+                        f"Column '{tok.value}' is ambiguous: it exists in {owners}. "
+                        "Qualify it with a table alias."
+                    )
+            elif not unknown_scope:
+                columns = {
+                    col for key in scope for col in self.tables[key]["columns"].values()
+                }
+                tables = ", ".join(self.tables[key]["name"] for key in scope)
+                problems.append(
+                    f"Unknown column '{tok.value}' (tables in query: {tables})."
+                    f"{self._suggest(tok.value, columns)}"
+                )
+            i += 1
+
+        if edits:
+            fixed = sql
+            for start in sorted(edits, reverse=True):
+                end, replacement = edits[start]
+                fixed = fixed[:start] + replacement + fixed[end:]
+            report["sql"] = fixed
+
+        report["fixes"] = list(dict.fromkeys(fixes))
+        report["problems"] = list(dict.fromkeys(problems))
+        return report
+
+    def _check_qualified(
+        self, qualifier: _Token, column: _Token, aliases, local_names, problems, edits, fixes
+    ):
+        q = qualifier.value.lower()
+        if q in aliases:
+            table_key = aliases[q]
+            if table_key is None:
+                return  # derived table or CTE
+        elif q in local_names:
+            return
+        elif q in self.tables:
+            table_key = q
+        else:
+            problems.append(
+                f"Unknown table or alias '{qualifier.value}' in "
+                f"'{qualifier.value}.{column.value}'."
+            )
+            return
+
+        table = self.tables[table_key]
+        if q == table_key:
+            self._fix_identifier(qualifier, table["name"], edits, fixes)
+        if column.text == "*":
+            return
+
+        col = column.value.lower()
+        if col in table["columns"]:
+            self._fix_identifier(column, table["columns"][col], edits, fixes)
+            return
+
+        available = list(table["columns"].values())
+        problems.append(
+            f"Column '{column.value}' does not exist in table '{table['name']}'."
+            f"{self._suggest(column.value, available)}"
+            f" Available columns: {', '.join(available[:25])}"
+        )
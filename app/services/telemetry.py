@@ -0,0 +1,226 @@
+import contextvars
+import json
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Seconds; covers cache lookups (sub-ms) up to slow LLM calls
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide Prometheus histograms and counters, rendered in the text
+    exposition format by `render()`.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsRegistry, cls).__new__(cls)
+            cls._instance._histograms = defaultdict(dict)
+            cls._instance._counters = defaultdict(lambda: defaultdict(float))
+            cls._instance._gauges = defaultdict(dict)
+            cls._instance._help = {}
+        return cls._instance
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name].get(key)
+            if series is None:
+                series = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+                self._histograms[name][key] = series
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._counters[name][key] += amount
+
+    def set(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges[name][key] = value
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series_by_labels in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, series in sorted(series_by_labels.items()):
+                    for bound, count in zip(BUCKETS, series["buckets"]):
+                        bucket_labels = labels + (("le", str(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                    inf_labels = labels + (("le", "+Inf"),)
+                    lines.append(f"{name}_bucket{_format_labels(inf_labels)} {series['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {series['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {series['count']}")
+            for name, series_by_labels in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series_by_labels.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name, series_by_labels in sorted(self._gauges.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in sorted(series_by_labels.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("consigliere_span_seconds", "Duration of instrumented stages.")
+metrics.describe("consigliere_request_seconds", "End-to-end duration of an answer stream.")
+metrics.describe("consigliere_llm_tokens_total", "LLM tokens by model and kind.")
+metrics.describe("consigliere_cache_lookups_total", "Cache lookups by cache and result.")
+
+
+class Trace:
+    """Spans recorded while answering one message (shared across worker threads)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = []
+        self._cursor = 0
+        self.started = time.perf_counter()
+
+    def record(self, name: str, seconds: float, attrs: Dict[str, Any]):
+        with self._lock:
+            self._spans.append((name, seconds, attrs))
+
+    @staticmethod
+    def _aggregate(spans) -> Dict[str, Dict[str, Any]]:
+        totals: Dict[str, Dict[str, Any]] = {}
+        for name, seconds, attrs in spans:
+            entry = totals.setdefault(name, {"count": 0, "ms": 0.0})
+            entry["count"] += 1
+            entry["ms"] = round(entry["ms"] + seconds * 1000, 2)
+            for key in ("prompt_tokens", "completion_tokens", "rows"):
+                if attrs.get(key):
+                    entry[key] = entry.get(key, 0) + attrs[key]
+            if name == "llm" and attrs.get("model"):
+                entry["model"] = attrs["model"]
+            if name == "cache_lookup":
+                entry["hits"] = entry.get("hits", 0) + (1 if attrs.get("hit") else 0)
+        return totals
+
+    def drain(self) -> Dict[str, Dict[str, Any]]:
+        """Aggregate of the spans recorded since the previous drain (one step)."""
+        with self._lock:
+            spans, self._cursor = self._spans[self._cursor :], len(self._spans)
+        return self._aggregate(spans)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self._spans)
+        totals = self._aggregate(spans)
+        totals["total_ms"] = round((time.perf_counter() - self.started) * 1000, 2)
+        return totals
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_span(name: str, seconds: float, **attrs):
+    """Record a duration measured elsewhere (e.g. inside a sandbox worker)."""
+    metrics.observe("consigliere_span_seconds", seconds, span=name)
+    if name == "llm" and attrs.get("model"):
+        for kind in ("prompt", "completion"):
+            tokens = attrs.get(f"{kind}_tokens")
+            if tokens:
+                metrics.inc("consigliere_llm_tokens_total", tokens, model=attrs["model"], kind=kind)
+    if name == "cache_lookup":
+        metrics.inc(
+            "consigliere_cache_lookups_total",
+            cache=attrs.get("cache", "unknown"),
+            result="hit" if attrs.get("hit") else "miss",
+        )
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(name, seconds, attrs)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block as a named span. The yielded dict can be updated with
+    attributes discovered inside the block (tokens, cache hit, rows).
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except Exception:
+        attrs["error"] = True
+        raise
+    finally:
+        record_span(name, time.perf_counter() - started, **attrs)
+
+
+def traced_events(events, agent: str):
+    """
+    Drive an agent's `answer()` generator with a Trace bound to the current
+    context, attaching `timings` to step_result and final_result events.
+    Each `next()` may run on a different threadpool thread, so the context
+    variable is set around every resume rather than once.
+    """
+    trace = Trace()
+    try:
+        while True:
+            token = _current_trace.set(trace)
+            try:
+                chunk = next(events)
+            except StopIteration:
+                return
+            finally:
+                _current_trace.reset(token)
+
+            try:
+                event = json.loads(chunk)
+            except (TypeError, ValueError):
+                yield chunk
+                continue
+
+            if event.get("type") == "step_result" and isinstance(event.get("data"), dict):
+                event["data"]["timings"] = trace.drain()
+                chunk = json.dumps(event)
+            elif event.get("type") == "final_result" and isinstance(event.get("data"), dict):
+                event["data"]["timings"] = trace.summary()
+                chunk = json.dumps(event)
+            yield chunk
+    finally:
+        metrics.observe(
+            "consigliere_request_seconds", time.perf_counter() - trace.started, agent=agent
+        )
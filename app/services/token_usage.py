@@ -0,0 +1,255 @@
+import contextvars
+import datetime
+import os
+import threading
+import dotenv
+
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import text
+
+from app.core import prompts
+
+dotenv.load_dotenv()
+
+# Tokens per user per UTC day; 0 disables budgets. A row in token_budgets
+# overrides the default for one user.
+TOKEN_BUDGET_DAILY = int(os.getenv("TOKEN_BUDGET_DAILY", "0"))
+# Share of the budget after which answers switch to economy mode
+TOKEN_BUDGET_ECONOMY_RATIO = float(os.getenv("TOKEN_BUDGET_ECONOMY_RATIO", "0.8"))
+USAGE_FLUSH_INTERVAL = int(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+
+_UPSERT_SQL = """
+    INSERT INTO token_usage (
+        user_id, chat_id, usage_date, prompt_type, model,
+        calls, prompt_tokens, completion_tokens, cost_usd
+    )
+    VALUES (
+        :user_id, :chat_id, :usage_date, :prompt_type, :model,
+        :calls, :prompt_tokens, :completion_tokens, :cost_usd
+    )
+    ON CONFLICT ON CONSTRAINT token_usage_bucket DO UPDATE SET
+        calls = token_usage.calls + EXCLUDED.calls,
+        prompt_tokens = token_usage.prompt_tokens + EXCLUDED.prompt_tokens,
+        completion_tokens = token_usage.completion_tokens + EXCLUDED.completion_tokens,
+        cost_usd = token_usage.cost_usd + EXCLUDED.cost_usd,
+        updated_at = now()
+"""
+
+_USED_TODAY_SQL = """
+    SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0)
+    FROM token_usage
+    WHERE user_id = :user_id AND usage_date = :usage_date
+"""
+
+_BUDGET_SQL = "SELECT daily_tokens FROM token_budgets WHERE user_id = :user_id"
+
+_usage_context: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "usage_context", default=None
+)
+
+_prompt_prefixes = None
+
+
+def prompt_type(messages: list) -> str:
+    """
+    Name of the prompt template that produced the system message
+    (e.g. "SQL_BRAIN_PROMPT"), matched on the template's static prefix.
+    """
+    global _prompt_prefixes
+    if _prompt_prefixes is None:
+        prefixes = []
+        for name, template in vars(prompts).items():
+            if name.isupper() and isinstance(template, str):
+                prefix = template.split("{")[0].strip()
+                if prefix:
+                    prefixes.append((prefix, name))
+        # Longest first so a template never shadows a more specific one
+        _prompt_prefixes = sorted(prefixes, key=lambda item: -len(item[0]))
+
+    content = (messages[0].get("content") or "").strip() if messages else ""
+    for prefix, name in _prompt_prefixes:
+        if content.startswith(prefix):
+            return name
+    return "other"
+
+
+def _today() -> datetime.date:
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+@contextmanager
+def usage_scope(user_id, chat_id=None, economy: bool = False):
+    """Attribute LLM calls made inside the block to a user (and chat)."""
+    token = _usage_context.set(
+        {
+            "user_id": str(user_id),
+            "chat_id": str(chat_id) if chat_id else None,
+            "economy": economy,
+        }
+    )
+    try:
+        yield
+    finally:
+        _usage_context.reset(token)
+
+
+def attributed(events, user_id, chat_id=None, economy: bool = False):
+    """
+    Drive an agent's `answer()` generator inside a usage scope. Like
+    `traced_events`, the scope is entered around every resume because each
+    `next()` may run on a different threadpool thread.
+    """
+    while True:
+        with usage_scope(user_id, chat_id, economy):
+            try:
+                chunk = next(events)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def current_user_id() -> Optional[str]:
+    context = _usage_context.get()
+    return context["user_id"] if context else None
+
+
+def economy_mode() -> bool:
+    """True while answering for a user who is close to their token budget."""
+    context = _usage_context.get()
+    return bool(context and context["economy"])
+
+
+class TokenLedger:
+    """
+    Buffers per-call token usage in memory, aggregated by user, chat, day,
+    prompt type and model, and upserts it into token_usage on `flush`.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TokenLedger, cls).__new__(cls)
+            cls._instance._pending = {}
+            cls._instance._stats = {"calls": 0, "unattributed_calls": 0, "flushes": 0}
+        return cls._instance
+
+    def record(
+        self,
+        messages: list,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cost_usd: float = 0.0,
+    ):
+        context = _usage_context.get()
+        with self._lock:
+            self._stats["calls"] += 1
+            if context is None:
+                # Startup work and background jobs have nobody to bill
+                self._stats["unattributed_calls"] += 1
+                return
+            key = (
+                context["user_id"],
+                context["chat_id"],
+                _today(),
+                prompt_type(messages),
+                model,
+            )
+            entry = self._pending.setdefault(key, [0, 0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += prompt_tokens
+            entry[2] += completion_tokens
+            entry[3] += cost_usd
+
+    def pending_tokens(self, user_id, usage_date: datetime.date) -> int:
+        user_id = str(user_id)
+        with self._lock:
+            return sum(
+                entry[1] + entry[2]
+                for key, entry in self._pending.items()
+                if key[0] == user_id and key[2] == usage_date
+            )
+
+    def flush(self, db) -> int:
+        """Write buffered usage to the database; returns the rows upserted."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        rows = [
+            {
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "usage_date": usage_date,
+                "prompt_type": kind,
+                "model": model,
+                "calls": calls,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": round(cost_usd, 6),
+            }
+            for (user_id, chat_id, usage_date, kind, model), (
+                calls,
+                prompt_tokens,
+                completion_tokens,
+                cost_usd,
+            ) in pending.items()
+        ]
+        try:
+            db.execute(text(_UPSERT_SQL), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._restore(pending)
+            raise
+
+        with self._lock:
+            self._stats["flushes"] += 1
+        return len(rows)
+
+    def _restore(self, pending: Dict[Tuple, list]):
+        with self._lock:
+            for key, values in pending.items():
+                entry = self._pending.setdefault(key, [0, 0, 0, 0.0])
+                for i, value in enumerate(values):
+                    entry[i] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "pending_buckets": len(self._pending)}
+
+
+def budget_status(db, user_id) -> Dict[str, Any]:
+    """
+    Today's usage against the user's daily budget. `state` is "ok",
+    "economy" (answers skip optional LLM calls) or "exhausted".
+    """
+    usage_date = _today()
+    limit = db.execute(text(_BUDGET_SQL), {"user_id": str(user_id)}).scalar()
+    if limit is None:
+        limit = TOKEN_BUDGET_DAILY
+
+    used = db.execute(
+        text(_USED_TODAY_SQL), {"user_id": str(user_id), "usage_date": usage_date}
+    ).scalar()
+    used = int(used or 0) + TokenLedger().pending_tokens(user_id, usage_date)
+
+    if not limit:
+        state = "ok"
+    elif used >= limit:
+        state = "exhausted"
+    elif used >= limit * TOKEN_BUDGET_ECONOMY_RATIO:
+        state = "economy"
+    else:
+        state = "ok"
+
+    return {
+        "daily_limit": limit or None,
+        "used_today": used,
+        "remaining_today": max(0, limit - used) if limit else None,
+        "state": state,
+    }
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import threading
+import time
+import dotenv
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.services.telemetry import span
+
+dotenv.load_dotenv()
+
+# Seconds a verified token is trusted without looking its user up again; also
+# how long another process may keep honouring a user disabled elsewhere
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+class UserCache:
+    """
+    Verified bearer tokens mapped to user snapshots, so authenticated
+    requests skip JWT decoding and the users lookup. Entries expire after
+    USER_CACHE_TTL or with their token, whichever comes first, and are
+    dropped at once when the user is disabled or deleted in this process.
+    Tokens are held as SHA-256 digests.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(UserCache, cls).__new__(cls)
+            # digest -> {"user", "user_id", "expires"}
+            cls._instance._store = OrderedDict()
+            cls._instance._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+        return cls._instance
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Any]:
+        key = self._key(token)
+        with span("cache_lookup", cache="user") as attrs, self._lock:
+            entry = self._store.get(key)
+            if entry is not None and entry["expires"] > time.time():
+                self._store.move_to_end(key)
+                self._stats["hits"] += 1
+                attrs["hit"] = True
+                return entry["user"]
+            if entry is not None:
+                del self._store[key]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, token: str, user_id, user: Any, token_expires: Optional[float] = None):
+        expires = time.time() + USER_CACHE_TTL
+        if token_expires is not None:
+            expires = min(expires, token_expires)
+        with self._lock:
+            key = self._key(token)
+            self._store[key] = {"user": user, "user_id": str(user_id), "expires": expires}
+            self._store.move_to_end(key)
+            while len(self._store) > USER_CACHE_MAX_ENTRIES:
+                self._store.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        """Forget every token of a user (e.g. when the account is disabled)."""
+        user_id = str(user_id)
+        with self._lock:
+            stale = [key for key, entry in self._store.items() if entry["user_id"] == user_id]
+            for key in stale:
+                del self._store[key]
+            self._stats["invalidations"] += 1
+        if stale:
+            print(f"AUTH: Cleared {len(stale)} cached tokens for user {user_id}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {**self._stats, "entries": len(self._store)}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
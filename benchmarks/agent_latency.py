@@ -0,0 +1,310 @@
+"""
+Stage-level latency benchmark for ExcelDataAgent.answer and SQLAgent.answer.
+
+Runs both agents end to end against synthetic data with a deterministic stub
+LLM and reports p50/p95 per stage plus memory high-water marks. Each dataset
+size runs in a fresh process so peak RSS is attributable to that size.
+
+    python -m benchmarks.agent_latency --sizes 10000,100000,1000000 --runs 20
+    python -m benchmarks.agent_latency --pipeline combined --llm-latency-ms 800
+    python -m benchmarks.agent_latency --sql-url postgresql://bench@localhost/bench
+"""
+
+import argparse
+import functools
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from collections import defaultdict
+from typing import Any, Dict, List
+
+STAGES = ["brain", "codegen", "validation", "execution", "charting", "formatting", "total"]
+
+QUESTIONS = [
+    "What is our total revenue and how does it split by region?",
+    "Which regions and products drive revenue?",
+    "Give me a revenue overview with the top products",
+]
+
+# Agent method -> stage; chart execution is reclassified as charting
+EXCEL_STAGES = {
+    "_consult_brain": "brain",
+    "_plan_and_generate_code": "brain",
+    "_generate_step_code": "codegen",
+    "_execute_code": "execution",
+    "_format_final_response": "formatting",
+}
+SQL_STAGES = {
+    "_consult_brain": "brain",
+    "_plan_and_generate_sql": "brain",
+    "_generate_sql": "codegen",
+    "_fix_sql": "codegen",
+    "_generate_chart_code": "codegen",
+    "_prevalidate": "validation",
+    "_execute_code": "execution",
+    "_execute_chart_code": "charting",
+    "_format_final_response": "formatting",
+    "_execute_summary_step": "formatting",
+}
+
+
+class StageTimer:
+    """Accumulates wall time per stage for the request in flight (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current: Dict[str, float] = defaultdict(float)
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.current[stage] += seconds
+
+    def reset(self) -> Dict[str, float]:
+        with self._lock:
+            finished, self.current = dict(self.current), defaultdict(float)
+        return finished
+
+    def wrap(self, func, stage_for):
+        """Time `func`; generators are timed until exhausted, keeping their return value."""
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            stage = stage_for(*args, **kwargs)
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            if not inspect.isgenerator(result):
+                self.add(stage, time.perf_counter() - started)
+                return result
+            return self._timed_generator(result, stage, started)
+
+        return timed
+
+    def _timed_generator(self, gen, stage, started):
+        try:
+            return (yield from gen)
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+
+def _instrument(agent, stages: Dict[str, str], timer: StageTimer):
+    for name, stage in stages.items():
+        method = getattr(agent, name, None)
+        if method is None:
+            continue
+        if name == "_execute_code" and stages is EXCEL_STAGES:
+
+            def stage_for(clean_code, step=None, _stage=stage):
+                is_chart = step is not None and step.get("chart_type", "none") != "none"
+                return "charting" if is_chart else _stage
+
+        else:
+
+            def stage_for(*args, _stage=stage, **kwargs):
+                return _stage
+
+        setattr(agent, name, timer.wrap(method, stage_for))
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    import numpy as np
+
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def _summarize(samples: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    report = {}
+    for stage in STAGES:
+        values = [sample.get(stage, 0.0) * 1000 for sample in samples]
+        if not any(values):
+            continue
+        report[stage] = {
+            "p50_ms": round(_percentile(values, 50), 1),
+            "p95_ms": round(_percentile(values, 95), 1),
+        }
+    return report
+
+
+def _peak_rss_bytes(who) -> int:
+    import resource
+
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_agent(agent, invalidate, timer, args) -> List[Dict[str, float]]:
+    samples = []
+    for i in range(args.warmup + args.runs):
+        if not args.warm:
+            invalidate()
+        question = QUESTIONS[i % len(QUESTIONS)]
+        timer.reset()
+        started = time.perf_counter()
+        for _ in agent.answer(question):
+            pass
+        timer.add("total", time.perf_counter() - started)
+        sample = timer.reset()
+        if i >= args.warmup:
+            samples.append(sample)
+    return samples
+
+
+def _bench_size(rows: int, args, data_dir: str) -> Dict[str, Any]:
+    """Runs in a fresh spawned process; app modules read config at import."""
+    os.environ["CHART_MODE"] = args.chart_mode
+    os.environ["SANDBOX_ENABLED"] = "true" if args.sandbox else "false"
+    os.environ["PLAN_AND_GENERATE_ENABLED"] = "true" if args.pipeline == "combined" else "false"
+
+    from benchmarks.datasets import load_sql, synthetic_sales, write_parquet
+    from benchmarks.stub_llm import StubLLM
+
+    stub = StubLLM(args.llm_latency_ms, args.llm_jitter_ms, args.llm_chunk_ms)
+
+    import app.services.llm as llm_module
+
+    original = llm_module.call_llm
+    for module in list(sys.modules.values()):
+        if getattr(module, "__name__", "").startswith("app.") and getattr(
+            module, "call_llm", None
+        ) is original:
+            module.call_llm = stub
+    llm_module.call_llm = stub
+
+    from app.services.plan_memo import PlanMemo
+
+    df = synthetic_sales(rows)
+    result: Dict[str, Any] = {"rows": rows, "agents": {}}
+
+    if "excel" in args.agents:
+        from app.services.code_sandbox import SandboxPool
+        from app.services.excel_agent import ExcelDataAgent
+
+        file_path = write_parquet(df, data_dir)
+        started = time.perf_counter()
+        agent = ExcelDataAgent(file_path)
+        init_ms = (time.perf_counter() - started) * 1000
+        # Fork after the dataset is cached so workers share it copy-on-write
+        SandboxPool().start()
+
+        timer = StageTimer()
+        _instrument(agent, EXCEL_STAGES, timer)
+        samples = _run_agent(
+            agent, lambda: PlanMemo().invalidate_dataset(file_path), timer, args
+        )
+        result["agents"]["excel"] = {
+            "init_ms": round(init_ms, 1),
+            "stages": _summarize(samples),
+        }
+        SandboxPool().shutdown()
+
+    if "sql" in args.agents:
+        import app.services.sql_agent as sql_agent_module
+        from app.services.sql_agent import SQLAgent
+
+        url = args.sql_url or f"sqlite:///{os.path.join(data_dir, f'sales_{rows}.db')}"
+        load_sql(df, url)
+        started = time.perf_counter()
+        agent = SQLAgent(url)
+        init_ms = (time.perf_counter() - started) * 1000
+
+        def invalidate():
+            PlanMemo().invalidate_dataset(agent.dataset_key)
+            agent.cache_manager.invalidate_all_queries(url)
+
+        timer = StageTimer()
+        _instrument(agent, SQL_STAGES, timer)
+        # Spec-mode charts are built by a module function, not an agent method
+        sql_agent_module.build_chart_spec = timer.wrap(
+            sql_agent_module.build_chart_spec, lambda *a, **k: "charting"
+        )
+        samples = _run_agent(agent, invalidate, timer, args)
+        result["agents"]["sql"] = {
+            "init_ms": round(init_ms, 1),
+            "stages": _summarize(samples),
+        }
+
+    import resource
+
+    result["memory"] = {
+        "peak_rss_mb": round(_peak_rss_bytes(resource.RUSAGE_SELF) / 2**20, 1),
+        # Largest sandbox worker (counted once workers are reaped)
+        "peak_child_rss_mb": round(_peak_rss_bytes(resource.RUSAGE_CHILDREN) / 2**20, 1),
+    }
+    result["llm_calls"] = dict(stub.calls)
+    return result
+
+
+def _size_worker(rows, args, data_dir, queue):
+    try:
+        queue.put(_bench_size(rows, args, data_dir))
+    except Exception as e:
+        queue.put({"rows": rows, "error": repr(e)})
+
+
+def _print_report(results: List[Dict[str, Any]], args):
+    print(
+        f"\nStub LLM: {args.llm_latency_ms}ms +/- {args.llm_jitter_ms}ms, "
+        f"pipeline={args.pipeline}, charts={args.chart_mode}, "
+        f"sandbox={'on' if args.sandbox else 'off'}, runs={args.runs}"
+    )
+    for result in results:
+        print(f"\n=== {result['rows']:,} rows ===")
+        if "error" in result:
+            print(f"  FAILED: {result['error']}")
+            continue
+        for name, agent in result["agents"].items():
+            print(f"  {name} (agent init {agent['init_ms']} ms)")
+            print(f"    {'stage':<12}{'p50 ms':>10}{'p95 ms':>10}")
+            for stage, stats in agent["stages"].items():
+                print(f"    {stage:<12}{stats['p50_ms']:>10}{stats['p95_ms']:>10}")
+        memory = result["memory"]
+        print(
+            f"  memory: peak RSS {memory['peak_rss_mb']} MB, "
+            f"peak sandbox worker {memory['peak_child_rss_mb']} MB"
+        )
+        print(f"  LLM calls: {result['llm_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--agents", default="excel,sql")
+    parser.add_argument("--pipeline", choices=["multi", "combined"], default="multi")
+    parser.add_argument("--chart-mode", choices=["spec", "png"], default="spec")
+    parser.add_argument("--sandbox", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--warm", action="store_true", help="keep plan memo and query cache between runs")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50)
+    parser.add_argument("--llm-chunk-ms", type=float, default=15)
+    parser.add_argument("--sql-url", default=None, help="Postgres stand-in instead of SQLite")
+    parser.add_argument("--data-dir", default=None)
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+    args.agents = [a.strip() for a in args.agents.split(",") if a.strip()]
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="consigliere-bench-")
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for rows in (int(size) for size in args.sizes.split(",")):
+        print(f"Benchmarking {rows:,} rows...", flush=True)
+        queue = context.Queue()
+        process = context.Process(target=_size_worker, args=(rows, args, data_dir, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    _print_report(results, args)
+    if args.json_path:
+        with open(args.json_path, "w") as out_file:
+            json.dump(results, out_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+REGIONS = ["North", "South", "East", "West", "Central", "EMEA", "APAC", "LATAM"]
+
+
+def synthetic_sales(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Deterministic sales table: orders across regions, products and dates."""
+    rng = np.random.default_rng(seed)
+    quantity = rng.integers(1, 20, rows)
+    unit_price = rng.gamma(2.0, 25.0, rows).round(2)
+    return pd.DataFrame(
+        {
+            "order_id": np.arange(1, rows + 1),
+            "order_date": pd.Timestamp("2023-01-01")
+            + pd.to_timedelta(rng.integers(0, 730, rows), unit="D"),
+            "region": rng.choice(REGIONS, rows),
+            "product": np.char.add("SKU-", rng.integers(1, 200, rows).astype(str)),
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "revenue": (quantity * unit_price).round(2),
+        }
+    )
+
+
+def write_parquet(df: pd.DataFrame, data_dir: str) -> str:
+    file_path = os.path.join(data_dir, f"sales_{len(df)}.parquet")
+    if not os.path.exists(file_path):
+        df.to_parquet(file_path, index=False)
+    return file_path
+
+
+def load_sql(df: pd.DataFrame, url: str):
+    """Load the table into a SQLite file or Postgres stand-in; returns the URL."""
+    from sqlalchemy import create_engine
+
+    engine = create_engine(url)
+    df.to_sql("sales", engine, if_exists="replace", index=False, chunksize=50_000)
+    engine.dispose()
+    return url
@@ -0,0 +1,175 @@
+import json
+import random
+import re
+import threading
+import time
+
+from typing import Dict, List
+
+# Canned plan shared by both agents: a metric, a bar chart and a top-N table
+PLAN_STEPS = [
+    {
+        "step_number": 1,
+        "type": "metric",
+        "title": "💰 Total Revenue",
+        "description": "SUM revenue over all orders",
+        "chart_type": "none",
+        "sql": "SELECT SUM(revenue) AS total_revenue FROM sales",
+        "code": "result = df['revenue'].sum()\ndescription = 'Total revenue'",
+    },
+    {
+        "step_number": 2,
+        "type": "chart",
+        "title": "🌍 Revenue by Region",
+        "description": "Revenue per region, bar chart for comparison",
+        "chart_type": "bar",
+        "sql": (
+            "SELECT region, SUM(revenue) AS revenue FROM sales "
+            "GROUP BY region ORDER BY revenue DESC"
+        ),
+        "code": (
+            "result = df.groupby('region', as_index=False)['revenue'].sum()"
+            ".sort_values('revenue', ascending=False)\n"
+            "plt.bar(result['region'], result['revenue'])\n"
+            "plt.title('Revenue by Region')\n"
+            "plt.xlabel('Region')\n"
+            "plt.ylabel('Revenue')\n"
+            "description = 'Revenue by region'"
+        ),
+    },
+    {
+        "step_number": 3,
+        "type": "table",
+        "title": "📦 Top Products",
+        "description": "Top 10 products by revenue with units sold",
+        "chart_type": "none",
+        "sql": (
+            "SELECT product, SUM(quantity) AS units, SUM(revenue) AS revenue "
+            "FROM sales GROUP BY product ORDER BY revenue DESC LIMIT 10"
+        ),
+        "code": (
+            "result = df.groupby('product', as_index=False)"
+            ".agg(units=('quantity', 'sum'), revenue=('revenue', 'sum'))"
+            ".nlargest(10, 'revenue')\n"
+            "description = 'Top 10 products by revenue'"
+        ),
+    },
+]
+
+SUMMARY_STEP = {
+    "step_number": 4,
+    "type": "summary",
+    "title": "💡 Insights",
+    "description": "Compare regions and name the top products",
+    "chart_type": "none",
+}
+
+CHART_CODE = (
+    "fig, ax = plt.subplots()\n"
+    "ax.bar(df[df.columns[0]].astype(str), df[df.columns[1]])\n"
+    "ax.set_title('Revenue by Region')\n"
+    "ax.set_xlabel('Region')\n"
+    "ax.set_ylabel('Revenue')"
+)
+
+SUMMARY_TEXT = (
+    "Revenue is concentrated in a handful of regions, with the top region "
+    "contributing the largest share. The leading products account for most "
+    "units sold, so inventory and marketing should prioritize them while the "
+    "long tail is reviewed for consolidation."
+)
+
+
+def _plan(with_code_field: str = None, summary: bool = False) -> str:
+    steps = []
+    for step in PLAN_STEPS:
+        step = {k: v for k, v in step.items() if k not in ("sql", "code")}
+        if with_code_field:
+            step[with_code_field] = next(
+                s[with_code_field] for s in PLAN_STEPS if s["step_number"] == step["step_number"]
+            )
+        steps.append(step)
+    if summary:
+        steps.append(dict(SUMMARY_STEP))
+    return json.dumps(
+        {"intent": "DATA_ACTION", "reasoning": "Benchmark plan", "plan": steps}
+    )
+
+
+def _step_code(content: str) -> str:
+    match = re.search(r"Execute step (\d+)", content)
+    number = int(match.group(1)) if match else 1
+    for step in PLAN_STEPS:
+        if step["step_number"] == number:
+            return f"```python\n{step['code']}\n```"
+    return "result = None"
+
+
+def _sql_for_request(content: str) -> str:
+    match = re.search(r'Request: "(.*?)"', content, re.DOTALL)
+    request = match.group(1) if match else ""
+    for step in PLAN_STEPS:
+        if step["description"] in request:
+            return step["sql"]
+    return PLAN_STEPS[0]["sql"]
+
+
+# First line of each system prompt -> canned response
+RESPONDERS = [
+    ("Design SQL analysis workflow", lambda c: _plan(summary=True)),
+    ("Design Excel/CSV analysis", lambda c: _plan()),
+    ("Plan and write SQL", lambda c: _plan("sql")),
+    ("Plan and write pandas code", lambda c: _plan("code")),
+    ("Convert to SQL", _sql_for_request),
+    ("Fix this failed SQL query", _sql_for_request),
+    ("Execute step", _step_code),
+    ("Generate matplotlib code", lambda c: f"```python\n{CHART_CODE}\n```"),
+    ("Synthesize", lambda c: SUMMARY_TEXT),
+]
+
+
+class StubLLM:
+    """
+    Drop-in replacement for `call_llm` with canned responses and configurable
+    latency. `latency_ms` (+/- `jitter_ms`) is the time to the full response,
+    or to the first token when streaming; `chunk_ms` spaces streamed chunks.
+    """
+
+    def __init__(
+        self, latency_ms: float = 300, jitter_ms: float = 50, chunk_ms: float = 15, seed: int = 7
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chunk_ms = chunk_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+
+    def _respond(self, messages: List[Dict[str, str]]) -> str:
+        content = messages[0]["content"]
+        head = content.strip()
+        for prefix, responder in RESPONDERS:
+            if head.startswith(prefix):
+                with self._lock:
+                    self.calls[prefix] = self.calls.get(prefix, 0) + 1
+                return responder(content)
+        raise ValueError(f"StubLLM has no canned response for: {head[:60]!r}")
+
+    def _sleep(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def _stream(self, text: str):
+        self._sleep()
+        words = text.split(" ")
+        for i in range(0, len(words), 4):
+            yield " ".join(words[i : i + 4]) + " "
+            time.sleep(self.chunk_ms / 1000)
+
+    def __call__(self, messages, temperature=0.0, timeout=60, stream=False, stage="default"):
+        text = self._respond(messages)
+        if stream:
+            return self._stream(text)
+        self._sleep()
+        return text
@@ -0,0 +1,142 @@
+"""
+OpenAI-compatible stub endpoint for exercising routing, fallbacks, circuit
+breakers and hedging locally. Answers with the StubLLM canned responses
+after a configurable latency and fails a share of requests with a given
+HTTP status. Run one per simulated provider:
+
+    python -m benchmarks.stub_llm_server --port 8901 --latency-ms 4000
+    python -m benchmarks.stub_llm_server --port 8902 --latency-ms 300
+    python -m benchmarks.stub_llm_server --port 8903 --fail-rate 1 --fail-status 503
+
+and point routes at them (any OPENAI_API_KEY works):
+
+    LLM_ROUTES='{"default": {"model": "openai/slow", "fallbacks": ["openai/fast"],
+      "hedge_after": 1, "api_bases": {"openai/slow": "http://127.0.0.1:8901/v1",
+      "openai/fast": "http://127.0.0.1:8902/v1"}}}'
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.stub_llm import StubLLM
+
+
+class _Handler(BaseHTTPRequestHandler):
+    stub: StubLLM = None
+    fail_rate = 0.0
+    fail_status = 503
+    random = random.Random(7)
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"no route {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.lock:
+            failing = self.random.random() < self.fail_rate
+        if failing:
+            self.stub._sleep()
+            self._send_json(
+                self.fail_status,
+                {"error": {"message": "stub failure", "type": "server_error"}},
+            )
+            return
+
+        try:
+            text = self.stub._respond(request.get("messages", []))
+        except ValueError as e:
+            self._send_json(400, {"error": {"message": str(e), "type": "invalid_request_error"}})
+            return
+
+        model = request.get("model", "stub")
+        usage = {
+            "prompt_tokens": len(json.dumps(request.get("messages", []))) // 4,
+            "completion_tokens": len(text) // 4,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if not request.get("stream"):
+            self.stub._sleep()
+            self._send_json(
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+        }
+        for delta in self.stub._stream(text):
+            choice = {"index": 0, "delta": {"content": delta}, "finish_reason": None}
+            self.wfile.write(f"data: {json.dumps({**chunk, 'choices': [choice]})}\n\n".encode())
+            self.wfile.flush()
+        done = {"index": 0, "delta": {}, "finish_reason": "stop"}
+        self.wfile.write(f"data: {json.dumps({**chunk, 'choices': [done]})}\n\n".encode())
+        self.wfile.write(
+            f"data: {json.dumps({**chunk, 'choices': [], 'usage': usage})}\n\n".encode()
+        )
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--chunk-ms", type=float, default=15)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests to fail")
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    _Handler.stub = StubLLM(args.latency_ms, args.jitter_ms, args.chunk_ms)
+    _Handler.fail_rate = args.fail_rate
+    _Handler.fail_status = args.fail_status
+
+    server = ThreadingHTTPServer((args.host, args.port), _Handler)
+    print(f"Stub LLM on http://{args.host}:{args.port}/v1 (fail rate {args.fail_rate:.0%})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import React, { memo, useMemo } from 'react';
+import { ChartSpec } from '../../types';
+
+const WIDTH = 640;
+const HEIGHT = 360;
+const MARGIN = { top: 32, right: 16, bottom: 72, left: 64 };
+const PALETTE = ['#f59e0b', '#38bdf8', '#a78bfa', '#34d399', '#f472b6', '#facc15', '#fb7185'];
+
+const formatValue = (value: any) => {
+    if (typeof value === 'number') {
+        return Math.abs(value) >= 1000
+            ? value.toLocaleString(undefined, { maximumFractionDigits: 0 })
+            : value.toLocaleString(undefined, { maximumFractionDigits: 2 });
+    }
+    if (typeof value === 'string' && /^\d{4}-\d{2}-\d{2}T/.test(value)) {
+        return value.slice(0, 10);
+    }
+    return String(value ?? '');
+};
+
+const niceTicks = (min: number, max: number, count = 5) => {
+    if (min === max) return [min];
+    const step = (max - min) / count;
+    return Array.from({ length: count + 1 }, (_, i) => min + step * i);
+};
+
+const PieChart: React.FC<{ spec: ChartSpec }> = ({ spec }) => {
+    const xField = spec.encoding.x.field;
+    const yField = spec.encoding.y[0].field;
+    const total = spec.values.reduce((acc, row) => acc + (Number(row[yField]) || 0), 0) || 1;
+    const cx = WIDTH / 2 - 80;
+    const cy = HEIGHT / 2;
+    const r = Math.min(cx, cy) - 24;
+
+    let angle = -Math.PI / 2;
+    return (
+        <svg viewBox={`0 0 ${WIDTH} ${HEIGHT}`} className="w-full h-auto">
+            {spec.values.map((row, i) => {
+                const slice = ((Number(row[yField]) || 0) / total) * Math.PI * 2;
+                const start = angle;
+                angle += slice;
+                const large = slice > Math.PI ? 1 : 0;
+                const x1 = cx + r * Math.cos(start);
+                const y1 = cy + r * Math.sin(start);
+                const x2 = cx + r * Math.cos(angle);
+                const y2 = cy + r * Math.sin(angle);
+                return (
+                    <g key={i}>
+                        <path
+                            d={`M ${cx} ${cy} L ${x1} ${y1} A ${r} ${r} 0 ${large} 1 ${x2} ${y2} Z`}
+                            fill={PALETTE[i % PALETTE.length]}
+                            stroke="#0a0a0b"
+                        >
+                            <title>{`${formatValue(row[xField])}: ${formatValue(row[yField])}`}</title>
+                        </path>
+                        <rect x={WIDTH - 200} y={40 + i * 20} width={10} height={10} fill={PALETTE[i % PALETTE.length]} />
+                        <text x={WIDTH - 184} y={49 + i * 20} className="fill-slate-300 text-[11px]">
+                            {`${formatValue(row[xField])} (${(((Number(row[yField]) || 0) / total) * 100).toFixed(1)}%)`}
+                        </text>
+                    </g>
+                );
+            })}
+        </svg>
+    );
+};
+
+const CartesianChart: React.FC<{ spec: ChartSpec }> = ({ spec }) => {
+    const { x, y } = spec.encoding;
+    const innerW = WIDTH - MARGIN.left - MARGIN.right;
+    const innerH = HEIGHT - MARGIN.top - MARGIN.bottom;
+    const isScatter = spec.chart_type === 'scatter';
+
+    const { yMin, yMax, xMin, xMax } = useMemo(() => {
+        const ys = spec.values.flatMap(row => y.map(s => Number(row[s.field]) || 0));
+        const xs = isScatter ? spec.values.map(row => Number(row[x.field]) || 0) : [0];
+        return {
+            yMin: Math.min(0, ...ys),
+            yMax: Math.max(0, ...ys),
+            xMin: Math.min(...xs),
+            xMax: Math.max(...xs),
+        };
+    }, [spec, isScatter]);
+
+    const scaleY = (v: number) => MARGIN.top + innerH - ((v - yMin) / ((yMax - yMin) || 1)) * innerH;
+    const band = innerW / Math.max(spec.values.length, 1);
+    const scaleX = (row: any, i: number) => isScatter
+        ? MARGIN.left + ((Number(row[x.field]) - xMin) / ((xMax - xMin) || 1)) * innerW
+        : MARGIN.left + band * i + band / 2;
+    const labelEvery = Math.ceil(spec.values.length / 12);
+
+    return (
+        <svg viewBox={`0 0 ${WIDTH} ${HEIGHT}`} className="w-full h-auto">
+            {niceTicks(yMin, yMax).map((t, i) => (
+                <g key={i}>
+                    <line x1={MARGIN.left} x2={WIDTH - MARGIN.right} y1={scaleY(t)} y2={scaleY(t)} stroke="#ffffff" strokeOpacity={0.08} />
+                    <text x={MARGIN.left - 6} y={scaleY(t) + 3} textAnchor="end" className="fill-slate-400 text-[10px]">
+                        {formatValue(t)}
+                    </text>
+                </g>
+            ))}
+
+            {spec.chart_type === 'bar' && y.map((series, s) => spec.values.map((row, i) => {
+                const barW = (band * 0.8) / y.length;
+                const value = Number(row[series.field]) || 0;
+                return (
+                    <rect
+                        key={`${s}-${i}`}
+                        x={MARGIN.left + band * i + band * 0.1 + barW * s}
+                        y={Math.min(scaleY(value), scaleY(0))}
+                        width={barW}
+                        height={Math.abs(scaleY(0) - scaleY(value))}
+                        fill={PALETTE[s % PALETTE.length]}
+                    >
+                        <title>{`${formatValue(row[x.field])}: ${formatValue(value)}`}</title>
+                    </rect>
+                );
+            }))}
+
+            {spec.chart_type === 'line' && y.map((series, s) => (
+                <polyline
+                    key={s}
+                    fill="none"
+                    stroke={PALETTE[s % PALETTE.length]}
+                    strokeWidth={2}
+                    points={spec.values.map((row, i) => `${scaleX(row, i)},${scaleY(Number(row[series.field]) || 0)}`).join(' ')}
+                />
+            ))}
+
+            {isScatter && spec.values.map((row, i) => (
+                <circle key={i} cx={scaleX(row, i)} cy={scaleY(Number(row[y[0].field]) || 0)} r={3} fill={PALETTE[0]} fillOpacity={0.7}>
+                    <title>{`${formatValue(row[x.field])}, ${formatValue(row[y[0].field])}`}</title>
+                </circle>
+            ))}
+
+            {!isScatter && spec.values.map((row, i) => i % labelEvery === 0 && (
+                <text
+                    key={i}
+                    transform={`translate(${scaleX(row, i)}, ${HEIGHT - MARGIN.bottom + 12}) rotate(-45)`}
+                    textAnchor="end"
+                    className="fill-slate-400 text-[10px]"
+                >
+                    {formatValue(row[x.field]).slice(0, 18)}
+                </text>
+            ))}
+
+            <text x={MARGIN.left + innerW / 2} y={HEIGHT - 6} textAnchor="middle" className="fill-slate-300 text-[11px]">
+                {x.title}
+            </text>
+            <text transform={`translate(14, ${MARGIN.top + innerH / 2}) rotate(-90)`} textAnchor="middle" className="fill-slate-300 text-[11px]">
+                {spec.encoding.y_title}
+            </text>
+        </svg>
+    );
+};
+
+export const ChartSpecView: React.FC<{ spec: ChartSpec }> = memo(({ spec }) => {
+    if (!spec || !spec.values?.length) {
+        return <div className="p-3 text-xs text-muted-foreground">No chart data.</div>;
+    }
+
+    return (
+        <div className="p-2 bg-[#0a0a0b]">
+            {spec.title && (
+                <div className="text-xs font-medium text-slate-200 text-center mb-1">{spec.title}</div>
+            )}
+            {spec.chart_type === 'pie' ? <PieChart spec={spec} /> : <CartesianChart spec={spec} />}
+            {spec.encoding.y.length > 1 && (
+                <div className="flex flex-wrap gap-3 justify-center mt-1">
+                    {spec.encoding.y.map((series, s) => (
+                        <span key={s} className="flex items-center gap-1 text-[10px] text-slate-400">
+                            <span className="w-2 h-2 rounded-sm" style={{ background: PALETTE[s % PALETTE.length] }} />
+                            {series.title}
+                        </span>
+                    ))}
+                </div>
+            )}
+            {spec.sampled && (
+                <div className="text-[9px] text-muted-foreground text-right mt-1">
+                    Showing {spec.values.length} of {spec.total_rows} rows
+                </div>
+            )}
+        </div>
+    );
+});
@@ -18,6 +18,9 @@ interface ChatViewProps {
     onInputChange: (value: string) => void;
     onSendMessage: () => void;
     onActionClick: (action: string) => void;
+    hasOlderMessages: boolean;
+    onLoadOlderMessages: () => void;
+    onLoadSteps: (messageId: string) => void;
 }
 
 export const MessageTable: React.FC<{ data: any[]; compact?: boolean }> = memo(({ data, compact }) => {
@@ -129,7 +132,10 @@ export const ChatView: React.FC<ChatViewProps> = memo(({
     scrollRef,
     onInputChange,
     onSendMessage,
-    onActionClick
+    onActionClick,
+    hasOlderMessages,
+    onLoadOlderMessages,
+    onLoadSteps
 }) => {
     const [selectedMessageId, setSelectedMessageId] = useState<string | null>(
         messages[messages.length - 1]?.id || null
@@ -143,7 +149,7 @@ export const ChatView: React.FC<ChatViewProps> = memo(({
             }
         } else {
             if (!selectedMessageId && messages.length > 0) {
-                const lastStepMsg = [...messages].reverse().find(m => m.role === 'assistant' && (m.steps?.length || 0) > 0);
+                const lastStepMsg = [...messages].reverse().find(m => m.role === 'assistant' && (m.steps?.length || m.step_count || 0) > 0);
                 if (lastStepMsg) {
                     setSelectedMessageId(lastStepMsg.id || null);
                 }
@@ -152,6 +158,13 @@ export const ChatView: React.FC<ChatViewProps> = memo(({
     }, [messages, isLoading, selectedMessageId]);
 
     const selectedMessage = messages.find(m => m.id === selectedMessageId);
+    const stepsPending = !!selectedMessage && !selectedMessage.steps && (selectedMessage.step_count || 0) > 0;
+
+    useEffect(() => {
+        if (stepsPending && selectedMessage?.id) {
+            onLoadSteps(selectedMessage.id);
+        }
+    }, [stepsPending, selectedMessage?.id, onLoadSteps]);
 
     return (
         <div className="absolute inset-0 flex bg-background overflow-hidden">
@@ -176,6 +189,14 @@ export const ChatView: React.FC<ChatViewProps> = memo(({
                                     onActionClick={onActionClick}
                                 />
                             )}
+                            {hasOlderMessages && (
+                                <button
+                                    onClick={onLoadOlderMessages}
+                                    className="w-full py-2 text-xs text-muted-foreground hover:text-foreground transition-colors"
+                                >
+                                    Load earlier messages
+                                </button>
+                            )}
                             {messages.map((msg, idx) => (
                                 <MessageBubble
                                     key={msg.id || idx}
@@ -248,7 +269,13 @@ export const ChatView: React.FC<ChatViewProps> = memo(({
 
                 <div className="flex-1 overflow-y-auto p-6 scrollbar-thin">
                     {selectedMessage ? (
-                        selectedMessage.steps && selectedMessage.steps.length > 0 ? (
+                        stepsPending ? (
+                            <div className="flex items-center justify-center h-full">
+                                <div className="animate-spin text-primary">
+                                    <Rose size={24} />
+                                </div>
+                            </div>
+                        ) : selectedMessage.steps && selectedMessage.steps.length > 0 ? (
                             <div className="max-w-3xl mx-auto">
                                 <MessageSteps
                                     steps={selectedMessage.steps}
@@ -15,7 +15,7 @@ interface MessageBubbleProps {
 
 export const MessageBubble: React.FC<MessageBubbleProps> = memo(({ msg, idx, showSteps = true, isSelected, onClick }) => {
     const isAssistant = msg.role === 'assistant';
-    const hasSteps = msg.steps && msg.steps.length > 0;
+    const hasSteps = (msg.steps?.length || msg.step_count || 0) > 0;
     const isStreaming = msg.streamingStatus && msg.streamingStatus !== 'complete';
 
     return (
@@ -96,7 +96,7 @@ export const MessageBubble: React.FC<MessageBubbleProps> = memo(({ msg, idx, sho
                     )}
                 </div>
 
-                {isAssistant && hasSteps && showSteps && (
+                {isAssistant && msg.steps && msg.steps.length > 0 && showSteps && (
                     <div className="w-full mt-4 pl-4 animate-in fade-in slide-in-from-top-2">
                         <div className="flex items-center gap-2 mb-2 ml-2">
                             <Layers size={12} className="text-muted-foreground" />
@@ -6,6 +6,7 @@ import {
 import { StepResult } from '../../types';
 import { MessageTable } from './ChatView';
 import { ImageModal } from './ImageModal';
+import { ChartSpecView } from './ChartSpecView';
 import { cn } from '../../lib/utils';
 
 export const StreamingStatusIndicator: React.FC<{ status?: string; currentStep?: number }> = memo(({ status, currentStep }) => {
@@ -128,6 +129,10 @@ export const TimelineStep: React.FC<{ step: StepResult; isLast: boolean; onImage
                         </div>
                     )}
 
+                    {step.type === 'chart' && (
+                        <ChartSpecView spec={step.data} />
+                    )}
+
                     {step.type === 'table' && (
                         <div className="overflow-x-auto">
                             <MessageTable data={step.data} compact />
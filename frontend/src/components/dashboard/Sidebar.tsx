@@ -8,6 +8,8 @@ import { cn } from '../../lib/utils';
 interface SidebarProps {
     isSidebarOpen: boolean;
     userChats: ChatType[];
+    hasMoreChats: boolean;
+    onLoadMoreChats: () => void;
     activeChatId: string | null;
     onNewChat: () => void;
     onLoadChat: (id: string) => void;
@@ -18,6 +20,8 @@ interface SidebarProps {
 export const Sidebar: React.FC<SidebarProps> = memo(({
     isSidebarOpen,
     userChats,
+    hasMoreChats,
+    onLoadMoreChats,
     activeChatId,
     onNewChat,
     onLoadChat,
@@ -92,6 +96,15 @@ export const Sidebar: React.FC<SidebarProps> = memo(({
                             />
                         )
                     ))}
+
+                    {hasMoreChats && isSidebarOpen && (
+                        <button
+                            onClick={onLoadMoreChats}
+                            className="w-full p-2 text-xs text-muted-foreground hover:text-foreground transition-colors"
+                        >
+                            Load older
+                        </button>
+                    )}
                 </div>
             </div>
 
@@ -1,10 +1,21 @@
 import React from 'react';
 import { FileSpreadsheet, Cpu } from 'lucide-react';
 
+// Background job stages reported by /jobs/{id}/events
+const STAGE_LABELS: Record<string, string> = {
+    ingest: 'Loading dataset into memory',
+    profile: 'Profiling columns',
+    connect: 'Verifying database connection',
+    infer: 'Inferring table semantics',
+    dossier: 'Writing intelligence dossier',
+    save: 'Saving briefing',
+};
+
 interface UploadProgressOverlayProps {
     uploadProgress: {
         phase: 'uploading' | 'analyzing' | null;
         fileName?: string;
+        stage?: string;
     };
 }
 
@@ -35,7 +46,9 @@ export const UploadProgressOverlay: React.FC<UploadProgressOverlayProps> = ({ up
                     <p className="text-slate-400 text-sm">
                         {uploadProgress.phase === 'uploading' 
                             ? `Encrypting and uploading ${uploadProgress.fileName}...`
-                            : 'Initializing Data Agent for analysis...'}
+                            : uploadProgress.stage
+                                ? `${STAGE_LABELS[uploadProgress.stage] || uploadProgress.stage}...`
+                                : 'Initializing Data Agent for analysis...'}
                     </p>
                     
                     {/* Progress dots */}
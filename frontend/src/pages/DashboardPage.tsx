@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useSearchParams } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
-import { ChatType, Dossier, Message } from '../types';
+import { AnalysisResult, ChatType, Dossier, Message, MessageSummary } from '../types';
 import { chatService } from '../services/chat';
 import { fileService } from '../services/files';
 
@@ -12,6 +12,38 @@ import { HomeView } from '../components/dashboard/HomeView';
 import { ChatView } from '../components/dashboard/ChatView';
 import { WizardModal } from '../components/dashboard/WizardModal';
 
+// Step results are not part of the history page; they load when viewed
+const toMessage = (m: MessageSummary): Message => {
+    let content = m.content;
+    let tableData = null;
+    let imageData = null;
+
+    if (m.role === 'assistant') {
+        try {
+            const parsed = JSON.parse(m.content);
+            // Single-step response (backward compatible)
+            if (parsed && typeof parsed === 'object' && parsed.result) {
+                content = parsed.text || m.content;
+                if (parsed.result.type === 'table') {
+                    tableData = parsed.result.data;
+                } else if (parsed.result.type === 'image') {
+                    imageData = parsed.result.data;
+                }
+            }
+        } catch (_) { }
+    }
+
+    return {
+        id: m.id,
+        role: m.role,
+        content,
+        created_at: m.created_at,
+        tableData,
+        imageData,
+        step_count: m.step_count
+    };
+};
+
 export const DashboardPage: React.FC = () => {
     const { logout } = useAuth();
 
@@ -20,7 +52,9 @@ export const DashboardPage: React.FC = () => {
     const [isSidebarOpen, setSidebarOpen] = useState(true);
     const [activeChatId, setActiveChatId] = useState<string | null>(null);
     const [userChats, setUserChats] = useState<ChatType[]>([]);
+    const [chatsCursor, setChatsCursor] = useState<string | null>(null);
     const [messages, setMessages] = useState<Message[]>([]);
+    const [historyCursor, setHistoryCursor] = useState<string | null>(null);
     const [input, setInput] = useState('');
     const [isLoading, setIsLoading] = useState(false);
     const [currentDossier, setCurrentDossier] = useState<Dossier | null>(null);
@@ -29,6 +63,7 @@ export const DashboardPage: React.FC = () => {
     const [uploadProgress, setUploadProgress] = useState<{
         phase: 'uploading' | 'analyzing' | null;
         fileName?: string;
+        stage?: string;
     }>({ phase: null });
 
     const [loadingChatHistory, setLoadingChatHistory] = useState(false);
@@ -51,13 +86,25 @@ export const DashboardPage: React.FC = () => {
     // --- DATA LOADING ---
     const loadUserChats = useCallback(async () => {
         try {
-            const chats: ChatType[] = await chatService.loadUserChats();
-            setUserChats(chats);
+            const page = await chatService.loadUserChats();
+            setUserChats(page.chats);
+            setChatsCursor(page.next_cursor);
         } catch (error: any) {
             console.error("Failed to load user chats:", error);
         }
     }, []);
 
+    const loadMoreChats = useCallback(async () => {
+        if (!chatsCursor) return;
+        try {
+            const page = await chatService.loadUserChats(chatsCursor);
+            setUserChats(prev => [...prev, ...page.chats]);
+            setChatsCursor(page.next_cursor);
+        } catch (error: any) {
+            console.error("Failed to load more chats:", error);
+        }
+    }, [chatsCursor]);
+
     useEffect(() => {
         loadUserChats();
     }, [loadUserChats]);
@@ -82,6 +129,7 @@ export const DashboardPage: React.FC = () => {
         setView('chat');
         setLoadingChatHistory(true);
         setMessages([]);
+        setHistoryCursor(null);
 
         try {
             const [history, dossier] = await Promise.all([
@@ -91,52 +139,8 @@ export const DashboardPage: React.FC = () => {
 
             setCurrentDossier(dossier);
 
-            // Map backend messages to frontend format
-            const mapped: Message[] = history.map((m: any) => {
-                let content = m.content;
-                let tableData = null;
-                let imageData = null;
-                let steps = null;
-                let plan = null;
-
-                if (m.role === 'assistant') {
-                    try {
-                        const parsed = JSON.parse(m.content);
-
-                        if (parsed && typeof parsed === 'object') {
-                            content = parsed.text || m.content;
-
-                            // Multi-step response
-                            if (parsed.steps && Array.isArray(parsed.steps)) {
-                                steps = parsed.steps;
-                                plan = parsed.plan;
-                            }
-                            // Single-step response (backward compatible)
-                            else if (parsed.result) {
-                                if (parsed.result.type === 'table') {
-                                    tableData = parsed.result.data;
-                                } else if (parsed.result.type === 'image') {
-                                    imageData = parsed.result.data;
-                                }
-                            }
-                        }
-                    } catch (_) { }
-                }
-
-                return {
-                    id: m.id,
-                    role: m.role,
-                    content,
-                    created_at: m.created_at,
-                    tableData,
-                    imageData,
-                    steps,
-                    plan,
-                    related_code: m.related_code
-                } as Message;
-            });
-
-            setMessages(mapped);
+            setMessages(history.messages.map(toMessage));
+            setHistoryCursor(history.next_cursor);
 
         } catch (error: any) {
             setActiveChatId(null);
@@ -149,6 +153,30 @@ export const DashboardPage: React.FC = () => {
         }
     }, []);
 
+    const loadOlderMessages = useCallback(async () => {
+        if (!activeChatId || !historyCursor) return;
+        try {
+            const page = await chatService.loadChatHistory(activeChatId, historyCursor);
+            setMessages(prev => [...page.messages.map(toMessage), ...prev]);
+            setHistoryCursor(page.next_cursor);
+        } catch (error) {
+            console.error("Failed to load older messages:", error);
+        }
+    }, [activeChatId, historyCursor]);
+
+    const loadMessageSteps = useCallback(async (messageId: string) => {
+        if (!activeChatId) return;
+        try {
+            const detail = await chatService.loadMessageSteps(activeChatId, messageId);
+            setMessages(prev => prev.map(m => m.id === messageId
+                ? { ...m, steps: detail.steps, related_code: detail.related_code }
+                : m
+            ));
+        } catch (error) {
+            console.error("Failed to load message steps:", error);
+        }
+    }, [activeChatId]);
+
     // --- URL SYNC ---
     const handleChatSelect = useCallback((id: string) => {
         setSearchParams({ chatId: id });
@@ -236,12 +264,25 @@ export const DashboardPage: React.FC = () => {
                                     : msg
                             ));
                         }
+                        else if (chunk.type === 'summary_delta') {
+                            // First token replaces the "step..." placeholder
+                            setMessages(prev => prev.map(msg =>
+                                msg.id === assistantMsgId
+                                    ? {
+                                        ...msg,
+                                        content: (msg.isStreamingText ? msg.content : '') + chunk.delta,
+                                        isStreamingText: true
+                                    }
+                                    : msg
+                            ));
+                        }
                         else if (chunk.type === 'final_result') {
                             setMessages(prev => prev.map(msg =>
                                 msg.id === assistantMsgId
                                     ? {
                                         ...msg,
                                         content: chunk.data.text,
+                                        isStreamingText: false,
                                         steps: chunk.data.steps || [],
                                         plan: chunk.data.plan || null,
                                         related_code: chunk.data.code ? { type: 'python', code: chunk.data.code } : null
@@ -299,7 +340,10 @@ export const DashboardPage: React.FC = () => {
             const uploadData = await fileService.uploadFileOnly(file);
 
             setUploadProgress({ phase: 'analyzing', fileName: file.name });
-            const analysisData = await fileService.createDossier(uploadData.file_id);
+            const job = await fileService.createDossier(uploadData.file_id);
+            const analysisData = await fileService.followJob<AnalysisResult>(job, stage =>
+                setUploadProgress({ phase: 'analyzing', fileName: file.name, stage })
+            );
 
             setSearchParams({ chatId: analysisData.chat_id });
             await loadUserChats();
@@ -326,26 +370,14 @@ export const DashboardPage: React.FC = () => {
             // Show the user we are working on it
             setUploadProgress({ phase: 'analyzing', fileName: dbData.name });
 
-            const response = await fetch('http://localhost:8000/connections', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${localStorage.getItem('token')}`
-                },
-                body: JSON.stringify(dbData)
-            });
-
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(errorData.detail || 'Connection failed');
-            }
-
-            const data = await response.json();
+            const job = await fileService.connectDatabase(dbData);
 
-            // The backend creates the Connection, Dossier, and Chat automatically.
-            // It returns the 'connection_id' which maps to the 'chat' for this connection.
-            // We use this ID to switch context.
-            setSearchParams({ chatId: data.connection_id });
+            // The job creates the Connection, Dossier, and Chat; its result
+            // names the chat to switch to.
+            const data = await fileService.followJob<{ chat_id: string }>(job, stage =>
+                setUploadProgress({ phase: 'analyzing', fileName: dbData.name, stage })
+            );
+            setSearchParams({ chatId: data.chat_id });
 
             await loadUserChats();
             setUploadProgress({ phase: null });
@@ -375,6 +407,8 @@ export const DashboardPage: React.FC = () => {
             <Sidebar
                 isSidebarOpen={isSidebarOpen}
                 userChats={userChats}
+                hasMoreChats={chatsCursor !== null}
+                onLoadMoreChats={loadMoreChats}
                 activeChatId={activeChatId}
                 onNewChat={handleNewChat}
                 onLoadChat={handleChatSelect}
@@ -404,6 +438,9 @@ export const DashboardPage: React.FC = () => {
                             onInputChange={setInput}
                             onSendMessage={handleSendMessage}
                             onActionClick={handleRecommendedAction}
+                            hasOlderMessages={historyCursor !== null}
+                            onLoadOlderMessages={loadOlderMessages}
+                            onLoadSteps={loadMessageSteps}
                         />
                     )}
 
@@ -1,12 +1,17 @@
 import { api, fetchStream } from '../utils/api';
+import { ChatPage, MessageDetail, MessagePage } from '../types';
 
 export const chatService = {
-  loadUserChats: async () => {
-    const response = await api.get('/chats');
+  loadUserChats: async (cursor?: string, q?: string): Promise<ChatPage> => {
+    const response = await api.get<ChatPage>('/chats', { params: { cursor, q } });
     return response.data;
   },
-  loadChatHistory: async (chatId: string) => {
-    const response = await api.get(`/messages/${chatId}`);
+  loadChatHistory: async (chatId: string, cursor?: string): Promise<MessagePage> => {
+    const response = await api.get<MessagePage>(`/messages/${chatId}`, { params: { cursor } });
+    return response.data;
+  },
+  loadMessageSteps: async (chatId: string, messageId: string): Promise<MessageDetail> => {
+    const response = await api.get<MessageDetail>(`/messages/${chatId}/${messageId}/steps`);
     return response.data;
   },
   sendMessage: async (chatId: string, content: string) => {
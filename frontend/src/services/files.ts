@@ -1,5 +1,5 @@
-import { api } from '../utils/api';
-import { Dossier, FileUploadResult, AnalysisResult } from '../types';
+import { api, API_BASE_URL } from '../utils/api';
+import { Dossier, FileUploadResult, JobAccepted, JobEvent } from '../types';
 
 export const fileService = {
   uploadFileOnly: async (file: File): Promise<FileUploadResult> => {
@@ -11,18 +11,49 @@ export const fileService = {
     return res.data;
   },
 
-  createDossier: async (fileId: string): Promise<AnalysisResult> => {
-    const res = await api.post<AnalysisResult>(`/files/${fileId}/analyze`);
+  // Queues the analysis; follow it with followJob for an AnalysisResult
+  createDossier: async (fileId: string): Promise<JobAccepted> => {
+    const res = await api.post<JobAccepted>(`/files/${fileId}/analyze`);
     return res.data;
   },
 
+  // Streams a job's stage events and resolves with its result
+  followJob: async <T = any>(job: JobAccepted, onStage?: (stage: string) => void): Promise<T> => {
+    const response = await fetch(`${API_BASE_URL}${job.events_url}`, {
+      headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+    });
+    const reader = response.body?.getReader();
+    if (!response.ok || !reader) throw new Error(`Job stream failed: ${response.status}`);
+
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() || '';
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event: JobEvent = JSON.parse(line);
+        if (event.type === 'stage' && event.status === 'running') {
+          onStage?.(event.stage);
+        } else if (event.type === 'job') {
+          if (event.status === 'failed') throw new Error(event.error || 'Job failed');
+          return event.result as T;
+        }
+      }
+    }
+    throw new Error('Job stream ended before the job finished');
+  },
+
   loadDossier: async (chatId: string): Promise<Dossier> => {
     const res = await api.get<Dossier>(`/chats/${chatId}/dossier`);
     return res.data;
   },
 
-  connectDatabase: async (dbData: any) => {
-    const res = await api.post('/connections', dbData);
+  connectDatabase: async (dbData: any): Promise<JobAccepted> => {
+    const res = await api.post<JobAccepted>('/connections', dbData);
     return res.data;
   }
 };
\ No newline at end of file
@@ -1,13 +1,61 @@
+export interface ChartSpec {
+    version: number;
+    chart_type: 'bar' | 'line' | 'pie' | 'scatter';
+    title: string;
+    encoding: {
+        x: { field: string; type: 'nominal' | 'temporal' | 'quantitative'; title: string };
+        y: Array<{ field: string; type: 'quantitative'; title: string }>;
+        y_title: string;
+    };
+    values: Array<Record<string, any>>;
+    total_rows: number;
+    sampled: boolean;
+}
+
+export interface SpanTiming {
+    count: number;
+    ms: number;
+    prompt_tokens?: number;
+    completion_tokens?: number;
+    rows?: number;
+    model?: string;
+    hits?: number;
+}
+
+export interface MessageSummary {
+    id: string;
+    role: 'user' | 'assistant';
+    content: string;
+    created_at: string;
+    step_count: number;
+}
+
+export interface MessagePage {
+    messages: MessageSummary[];
+    next_cursor: string | null;
+}
+
+export interface MessageDetail {
+    id: string;
+    steps: StepResult[];
+    related_code: {
+        type: string;
+        code: string;
+    } | null;
+}
+
 export interface StepResult {
     step_number: number;
     step_description: string;
     step_type: 'chart' | 'table' | 'metric' | 'summary';
-    type: 'image' | 'table' | 'text' | 'error';
+    type: 'image' | 'chart' | 'table' | 'text' | 'error';
     data: any;
     description?: string;
     columns?: string[];
     total_rows?: number;
     mime?: string;
+    error_kind?: 'timeout' | 'memory' | 'crashed' | 'security' | 'validation' | 'execution';
+    timings?: Record<string, SpanTiming>;
 }
 
 export interface ExecutionPlan {
@@ -31,6 +79,14 @@ export interface ChatType {
         file_path: string;
         filename: string;
     };
+    connection?: {
+        name: string;
+    };
+}
+
+export interface ChatPage {
+    chats: ChatType[];
+    next_cursor: string | null;
 }
 
 export interface Dossier {
@@ -39,6 +95,28 @@ export interface Dossier {
     recommended_actions: string[];
 }
 
+export interface FileUploadResult {
+    status: string;
+    file_id: string;
+    filename: string;
+}
+
+export interface AnalysisResult {
+    status: string;
+    chat_id: string;
+    dossier: Dossier;
+}
+
+export interface JobAccepted {
+    job_id: string;
+    status: string;
+    events_url: string;
+}
+
+export type JobEvent =
+    | { type: 'stage'; stage: string; status: 'running' | 'done' | 'failed'; ms?: number }
+    | { type: 'job'; status: 'succeeded' | 'failed'; result: any; error: string | null };
+
 export interface Message {
     id?: string;
     role: 'user' | 'assistant';
@@ -52,16 +130,19 @@ export interface Message {
         type: string;
         code: string;
     } | null;
+    // Steps of stored messages are fetched when first viewed
+    step_count?: number;
     // New streaming status fields
     streamingStatus?: 'planning' | 'executing' | 'complete' | 'error';
     currentStep?: number;
+    isStreamingText?: boolean;
 }
 
 export interface StepResult {
     step_number: number;
     step_description: string;
     step_type: 'table' | 'chart' | 'image' | 'text' | 'metric' | 'error';
-    type: 'table' | 'image' | 'text' | 'error';
+    type: 'table' | 'image' | 'chart' | 'text' | 'error';
     data: any;
     columns?: string[];
     total_rows?: number;
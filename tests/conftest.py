@@ -0,0 +1,9 @@
+import os
+
+from cryptography.fernet import Fernet
+
+# Modules read configuration at import time; keep the units importable
+# without a database or provider keys
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
@@ -0,0 +1,62 @@
+import pandas as pd
+
+from app.services.chart_spec import (
+    MAX_CATEGORIES,
+    MAX_PIE_SLICES,
+    build_chart_spec,
+    describe_chart_spec,
+)
+
+
+def test_bar_keeps_largest_bars_in_original_order():
+    df = pd.DataFrame({"name": [f"c{i}" for i in range(50)], "value": range(50)})
+    spec = build_chart_spec(df, "bar")
+
+    names = [row["name"] for row in spec["values"]]
+    assert names == [f"c{i}" for i in range(50 - MAX_CATEGORIES, 50)]
+    assert spec["sampled"] is True
+    assert spec["total_rows"] == 50
+
+
+def test_bar_downsampling_ignores_duplicate_index_labels():
+    df = pd.DataFrame(
+        {"name": [f"c{i}" for i in range(50)], "value": range(50)}, index=[0] * 50
+    )
+    spec = build_chart_spec(df, "bar")
+
+    assert len(spec["values"]) == MAX_CATEGORIES
+
+
+def test_duplicate_categories_are_summed():
+    df = pd.DataFrame({"region": ["eu", "us", "eu"], "sales": [1, 2, 3]})
+    spec = build_chart_spec(df, "bar")
+
+    assert spec["values"] == [{"region": "eu", "sales": 4}, {"region": "us", "sales": 2}]
+
+
+def test_pie_folds_the_tail_into_other():
+    df = pd.DataFrame({"k": list("abcdefghij"), "v": range(10, 0, -1)})
+    spec = build_chart_spec(df, "pie")
+
+    assert len(spec["values"]) == MAX_PIE_SLICES
+    assert spec["values"][-1] == {"k": "Other", "v": sum(range(1, 5))}
+
+
+def test_line_prefers_temporal_x_and_describes_axes():
+    df = pd.DataFrame(
+        {
+            "label": ["b", "a", "c"],
+            "day": pd.to_datetime(["2024-01-03", "2024-01-01", "2024-01-02"]),
+            "n": [3, 1, 2],
+        }
+    )
+    spec = build_chart_spec(df, "line", title="Daily", y_label="Count")
+
+    assert spec["encoding"]["x"] == {"field": "day", "type": "temporal", "title": "day"}
+    assert [row["n"] for row in spec["values"]] == [1, 2, 3]
+    assert describe_chart_spec(spec) == "Chart Title: Daily; X-Axis: day; Y-Axis: Count"
+
+
+def test_no_numeric_column_returns_none():
+    assert build_chart_spec(pd.DataFrame({"a": ["x", "y"]}), "bar") is None
+    assert build_chart_spec(pd.DataFrame(), "bar") is None
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from app.services import code_sandbox
+from app.services.code_sandbox import SandboxPool, decode_frame, execute_snippet
+from app.services.excel_agent_cache import DataCache
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = str(tmp_path / "sales.parquet")
+    pd.DataFrame({"region": ["eu", "us", "eu"], "amount": [1, 2, 3]}).to_parquet(path)
+    yield path
+    DataCache().invalidate(path)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(code_sandbox, "SANDBOX_WORKERS", 1)
+    monkeypatch.setattr(SandboxPool, "_instance", None)
+    pool = SandboxPool()
+    if not pool.enabled:
+        pytest.skip("fork start method unavailable")
+    yield pool
+    pool.shutdown()
+
+
+def test_execute_snippet_returns_frames_without_touching_the_input():
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    outcome = execute_snippet(df, "df['a'] = 0\nresult = df.groupby('a').size()")
+
+    assert outcome["kind"] == "frame"
+    assert decode_frame(outcome["frame"]).to_dict("list") == {"a": [0], "0": [3]}
+    assert df["a"].tolist() == [1, 2, 3]
+
+
+def test_execute_snippet_reports_errors():
+    outcome = execute_snippet(pd.DataFrame(), "result = missing_name")
+    assert outcome["kind"] == "error"
+    assert "missing_name" in outcome["data"]
+
+
+def test_workers_inherit_the_cached_frame(pool, dataset):
+    pool.start()
+    outcome = pool.run(dataset, "result = int(df['amount'].sum())")
+
+    assert outcome["data"] == "6"
+    version = DataCache().cached_versions()[dataset]
+    assert [worker.datasets.get(dataset) for worker in pool._workers] == [version]
+
+
+def test_invalidated_frames_retire_their_workers(pool, dataset):
+    pool.start()
+    pool.run(dataset, "result = len(df)")
+    before = pool._workers[0].process.pid
+
+    DataCache().invalidate(dataset)
+    assert pool.recycle_stale() == 1
+    assert pool._workers[0].process.pid != before
+    assert dataset not in pool._workers[0].datasets
+    assert pool.recycle_stale() == 0
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import uuid
+
+import pytest
+from sqlalchemy import JSON, MetaData, create_engine, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.models.db_models import Chat, Connection, Dossier, File, FileBlob, User
+from app.services.file_store import FileStore, blob_key
+
+
+class _Result:
+    def __init__(self, row=None):
+        self._row = row
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self._row
+
+
+class _BlobsTable:
+    """file_blobs keyed by (user_id, content_sha256), as the statements expect."""
+
+    def __init__(self):
+        self.rows = {}
+        self.locked = []
+
+    def execute(self, statement, params):
+        sql = " ".join(str(statement).split())
+        key = (params["user_id"], params["sha"])
+        row = self.rows.get(key)
+        if "pg_advisory_xact_lock" in sql:
+            self.locked.append(key)
+        elif sql.startswith("SELECT file_path"):
+            return _Result(row)
+        elif "ref_count = ref_count + 1" in sql:
+            if row is not None:
+                row["ref_count"] += 1
+            return _Result(row)
+        elif sql.startswith("INSERT INTO file_blobs"):
+            self.rows[key] = {
+                "file_path": params["file_path"],
+                "row_count": params["row_count"],
+                "columns": json.loads(params["columns"]),
+                "ref_count": 1,
+            }
+        elif sql.startswith("UPDATE file_blobs SET file_path"):
+            row.update(file_path=params["file_path"], row_count=params["row_count"])
+        elif "ref_count = ref_count - 1" in sql:
+            if row is not None:
+                row["ref_count"] -= 1
+            return _Result(row)
+        elif sql.startswith("DELETE FROM file_blobs"):
+            if row is not None and row["ref_count"] <= 0:
+                del self.rows[key]
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+        return _Result()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    return tmp_path
+
+
+def _upload(content: bytes):
+    path = os.path.join("data", f"temp_{hashlib.md5(os.urandom(8)).hexdigest()}.csv")
+    with open(path, "wb") as out:
+        out.write(content)
+    return path, hashlib.sha256(content).hexdigest()
+
+
+CSV = b"Order Date,Amount\n2024-01-02,5\n2024-01-01,3\n"
+
+
+def test_same_user_reuses_the_parquet(workdir):
+    db, store = _BlobsTable(), FileStore()
+    temp, sha = _upload(CSV)
+    first = store.acquire(db, "user-a", sha, len(CSV), temp, "orders.csv")
+    temp, _ = _upload(CSV)
+    second = store.acquire(db, "user-a", sha, len(CSV), temp, "orders.csv")
+
+    assert first["filename"] == second["filename"]
+    assert first["filename"].startswith(blob_key("user-a", sha))
+    assert first["columns"] == ["order_date", "amount"]
+    assert "deduplicated" not in first
+    assert db.rows[("user-a", sha)]["ref_count"] == 2
+    # Temp uploads and staged parquets never linger
+    assert os.listdir("data") == [first["filename"]]
+
+
+def test_identical_content_is_never_shared_across_users(workdir):
+    db, store = _BlobsTable(), FileStore()
+    temp, sha = _upload(CSV)
+    mine = store.acquire(db, "user-a", sha, len(CSV), temp, "orders.csv")
+    temp, _ = _upload(CSV)
+    theirs = store.acquire(db, "user-b", sha, len(CSV), temp, "copy.csv")
+
+    assert mine["filename"] != theirs["filename"]
+    assert set(db.rows) == {("user-a", sha), ("user-b", sha)}
+    assert db.rows[("user-a", sha)]["ref_count"] == 1
+
+
+def test_missing_parquet_is_ingested_again(workdir):
+    db, store = _BlobsTable(), FileStore()
+    temp, sha = _upload(CSV)
+    first = store.acquire(db, "user-a", sha, len(CSV), temp, "orders.csv")
+    os.remove(os.path.join("data", first["filename"]))
+
+    temp, _ = _upload(CSV)
+    second = store.acquire(db, "user-a", sha, len(CSV), temp, "orders.csv")
+
+    assert os.path.exists(os.path.join("data", second["filename"]))
+    assert second["rows"] == 2
+    assert db.rows[("user-a", sha)]["ref_count"] == 2
+
+
+def test_release_deletes_with_the_last_reference(workdir):
+    db, store = _BlobsTable(), FileStore()
+    for _ in range(2):
+        temp, sha = _upload(CSV)
+        metadata = store.acquire(db, "user-a", sha, len(CSV), temp, "orders.csv")
+    path = os.path.join("data", metadata["filename"])
+
+    assert store.release(db, "user-a", sha) is None
+    assert os.path.exists(path)
+    assert store.release(db, "user-a", sha) == path
+    # Removing the file is left to the caller, after its commit
+    assert os.path.exists(path)
+    assert db.rows == {}
+
+
+@pytest.fixture
+def session():
+    """
+    A real SQLite session with the files -> file_blobs FK enforced. Postgres
+    casts and the advisory lock are translated; defaults are left to Python.
+    """
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def _connect(connection, _):
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.create_function("hashtextextended", 2, lambda value, seed: hash(value))
+        connection.create_function("pg_advisory_xact_lock", 1, lambda key: None)
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _casts(conn, cursor, statement, parameters, context, executemany):
+        # UUID columns are stored as 32-digit hex strings on SQLite
+        statement = re.sub(r"CAST\((\?) AS uuid\)", r"REPLACE(\1, '-', '')", statement)
+        statement = re.sub(r"CAST\((\?) AS jsonb\)", r"\1", statement)
+        return statement, parameters
+
+    metadata = MetaData()
+    for model in (User, FileBlob, File, Connection, Dossier, Chat):
+        table = model.__table__.to_metadata(metadata)
+        for column in table.columns:
+            column.server_default = None
+            if isinstance(column.type, JSONB):
+                column.type = JSON()
+    metadata.create_all(engine)
+
+    with Session(engine) as db:
+        yield db
+    engine.dispose()
+
+
+def _stored_file(db):
+    user = User(id=uuid.uuid4(), email="a@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    temp, sha = _upload(CSV)
+    metadata = FileStore().acquire(db, user.id, sha, len(CSV), temp, "orders.csv")
+    db_file = File(
+        id=uuid.uuid4(),
+        user_id=user.id,
+        filename="orders.csv",
+        file_path=metadata["filename"],
+        content_sha256=sha,
+    )
+    db.add(db_file)
+    db.commit()
+    return db_file, os.path.join("data", metadata["filename"])
+
+
+def test_deleting_the_last_file_releases_its_blob(workdir, session):
+    db_file, path = _stored_file(session)
+
+    # As delete_chat does it
+    session.delete(db_file)
+    session.flush()
+    assert FileStore().release(session, db_file.user_id, db_file.content_sha256) == path
+    session.commit()
+
+    assert session.query(FileBlob).count() == 0
+    assert os.path.exists(path)
+
+
+def test_failed_release_keeps_the_parquet(workdir, session):
+    db_file, path = _stored_file(session)
+
+    # Without the flush the files row still references its blob
+    session.delete(db_file)
+    with pytest.raises(IntegrityError):
+        FileStore().release(session, db_file.user_id, db_file.content_sha256)
+    session.rollback()
+
+    assert session.query(FileBlob).one().ref_count == 1
+    assert os.path.exists(path)
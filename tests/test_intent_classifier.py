@@ -0,0 +1,81 @@
+import pytest
+
+from app.services import intent_classifier
+from app.services.intent_classifier import (
+    IntentClassifier,
+    schema_vocabulary,
+    schema_vocabulary_from_json,
+)
+
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier()
+
+
+@pytest.mark.parametrize(
+    "message, intent",
+    [
+        ("hi", "GENERAL_CHAT"),
+        ("Thanks a lot!", "GENERAL_CHAT"),
+        ("who are you?", "GENERAL_CHAT"),
+        ("you are useless and stupid", "OFFENSIVE"),
+        ("fuck off", "OFFENSIVE"),
+    ],
+)
+def test_fast_path(classifier, message, intent):
+    result = classifier.classify(message)
+    assert result["intent"] == intent
+    assert result["plan"] == []
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Shitake sales by month",
+        "what can you tell me about churn",
+        "show me total sales by region",
+        "how many orders were placed in 2023",
+        "top 5 products",
+        "and for last quarter",
+        "which product sucks the most",
+        "what sucks in our funnel",
+    ],
+)
+def test_data_questions_fall_through(classifier, message):
+    assert classifier.classify(message) is None
+
+
+def test_schema_vocabulary_overrides_abuse_terms(classifier):
+    vocabulary = schema_vocabulary(["stupid_errors", "Customer ID"])
+    assert classifier.classify("count stupid errors", vocabulary) is None
+    assert classifier.classify("stupid", vocabulary) is None
+
+
+@pytest.mark.parametrize(
+    "text, abusive",
+    [
+        ("shitake", False),
+        ("assholes_count", False),
+        ("which product sucks", False),
+        ("this is shit", True),
+        ("idiots", True),
+        ("you suck", True),
+    ],
+)
+def test_abuse_terms_match_whole_words_only(text, abusive):
+    assert bool(intent_classifier._ABUSE_TERMS.search(text)) is abusive
+
+
+def test_disabled_fast_path_always_falls_through(classifier, monkeypatch):
+    monkeypatch.setattr(intent_classifier, "INTENT_FAST_PATH_ENABLED", False)
+    assert classifier.classify("hi") is None
+
+
+def test_schema_vocabulary_splits_identifiers():
+    vocabulary = schema_vocabulary(["order_items", "unitPrice", "id"])
+    assert {"order_items", "order", "items", "unitprice", "id"} <= vocabulary
+
+    schema = '{"tables": [{"name": "Sales", "columns": [{"name": "net_amount"}]}]}'
+    assert {"sales", "net_amount", "net", "amount"} <= schema_vocabulary_from_json(schema)
+    assert schema_vocabulary_from_json("not json") == set()
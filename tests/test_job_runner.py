@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.services import job_runner
+from app.services.job_runner import FAILED, QUEUED, SUCCEEDED, JobRunner
+
+
+class _Result:
+    def __init__(self, rows=()):
+        self._rows = list(rows)
+
+    def first(self):
+        return self._rows[0] if self._rows else None
+
+    def scalar(self):
+        return self._rows[0][0]
+
+    def mappings(self):
+        return self
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class _JobsTable:
+    """Just enough of the jobs table for the runner's statements."""
+
+    def __init__(self):
+        self.rows = {}
+        self.claims = 0
+        self.heartbeats = []
+        self.lock = threading.Lock()
+
+    def add(self, kind, payload=None, status=QUEUED):
+        job_id = str(uuid.uuid4())
+        self.rows[job_id] = {
+            "user_id": str(uuid.uuid4()),
+            "kind": kind,
+            "payload": payload or {},
+            "status": status,
+            "stage": None,
+            "progress": [],
+            "result": None,
+            "error": None,
+        }
+        return job_id
+
+    def execute(self, statement, params=None):
+        sql = " ".join(str(statement).split())
+        params = params or {}
+        with self.lock:
+            if sql.startswith("INSERT INTO jobs"):
+                job_id = self.add(params["kind"], json.loads(params["payload"]))
+                self.rows[job_id]["user_id"] = params["user_id"]
+                return _Result([(job_id,)])
+            if "SET status = 'running'" in sql:
+                row = self.rows.get(params["id"])
+                if row is None or row["status"] != QUEUED:
+                    return _Result()
+                row["status"] = "running"
+                self.claims += 1
+                return _Result([(row["user_id"], row["kind"], row["payload"])])
+            if "progress = progress ||" in sql:
+                row = self.rows[params["id"]]
+                row["stage"] = params["stage"]
+                row["progress"].append(json.loads(params["event"]))
+                return _Result()
+            if "SET status = :status" in sql:
+                row = self.rows[params["id"]]
+                result = params["result"]
+                row.update(
+                    status=params["status"],
+                    result=None if result is None else json.loads(result),
+                    error=params["error"],
+                )
+                return _Result()
+            if "ANY(CAST(:ids AS uuid[]))" in sql:
+                self.heartbeats.append(list(params["ids"]))
+                return _Result()
+            if "SET status = 'queued'" in sql:
+                return _Result()
+            if sql.startswith("SELECT id FROM jobs"):
+                return _Result([(i,) for i, r in self.rows.items() if r["status"] == QUEUED])
+            if sql.startswith("SELECT status, stage"):
+                row = self.rows.get(params["id"])
+                return _Result([row] if row else [])
+        raise AssertionError(f"unexpected SQL: {sql}")
+
+
+class _Session:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        return self.table.execute(statement, params)
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = _JobsTable()
+    monkeypatch.setattr(job_runner, "SessionLocal", lambda: _Session(table))
+    monkeypatch.setattr(job_runner, "JOB_POLL_INTERVAL", 0.01)
+    return table
+
+
+@pytest.fixture
+def runner(table, monkeypatch):
+    monkeypatch.setattr(JobRunner, "_instance", None)
+    runner = JobRunner()
+    yield runner
+    runner.shutdown()
+
+
+def _drain(runner):
+    executor = runner._executor
+    runner.shutdown()
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def test_submit_without_start_runs_the_job_once(runner, table):
+    calls = []
+
+    def handler(job):
+        calls.append(job.job_id)
+        with job.stage("work", rows=3):
+            pass
+        return {"answer": job.payload["n"] * 2}
+
+    runner.register("double", handler)
+    job_id = runner.submit(_Session(table), "user", "double", {"n": 21})
+    _drain(runner)
+
+    assert calls == [job_id]
+    assert table.claims == 1
+    row = table.rows[job_id]
+    assert row["status"] == SUCCEEDED
+    assert row["result"] == {"answer": 42}
+    assert [event["status"] for event in row["progress"]] == ["running", "done"]
+    assert runner._live == {}
+    stats = runner.get_stats()
+    assert (stats["succeeded"], stats["resumed"]) == (1, 0)
+
+
+def test_start_resumes_pending_jobs_without_duplicates(runner, table):
+    calls = []
+    release = threading.Event()
+
+    def handler(job):
+        calls.append(job.job_id)
+        release.wait(5)
+
+    runner.register("slow", handler)
+    pending = [table.add("slow"), table.add("slow")]
+    table.add("slow", status=SUCCEEDED)
+
+    runner.start()
+    runner.start()  # already queued here: nothing new
+    release.set()
+    _drain(runner)
+
+    assert sorted(calls) == sorted(pending)
+    assert runner.get_stats()["resumed"] == 2
+
+
+def test_long_running_jobs_are_heartbeated(runner, table, monkeypatch):
+    monkeypatch.setattr(job_runner, "JOB_HEARTBEAT_INTERVAL", 0.01)
+    started, release = threading.Event(), threading.Event()
+
+    def handler(job):
+        started.set()
+        # One long stage: no progress events while it runs
+        release.wait(5)
+
+    runner.register("long", handler)
+    job_id = runner.submit(_Session(table), "user", "long", {})
+    assert started.wait(5)
+    deadline = time.monotonic() + 5
+    while not table.heartbeats and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    _drain(runner)
+
+    assert table.heartbeats
+    assert all(ids == [job_id] for ids in table.heartbeats)
+
+
+def test_jobs_claimed_elsewhere_are_left_alone(runner, table):
+    runner.register("noop", lambda job: pytest.fail("must not run"))
+    job_id = table.add("noop", status="running")
+
+    assert runner._enqueue(job_id) is True
+    _drain(runner)
+
+    assert runner._live == {}
+    assert table.rows[job_id]["status"] == "running"
+
+
+def test_failures_are_recorded_and_streamed(runner, table):
+    def handler(job):
+        with job.stage("explode"):
+            raise ValueError("bad input")
+
+    runner.register("boom", handler)
+    job_id = runner.submit(_Session(table), "user", "boom", {})
+    _drain(runner)
+
+    assert table.rows[job_id]["status"] == FAILED
+    assert table.rows[job_id]["error"] == "bad input"
+
+    lines = [json.loads(line) for line in runner.stream(job_id)]
+    assert [line.get("status") for line in lines] == ["running", "failed", FAILED]
+    assert lines[-1] == {"type": "job", "status": FAILED, "result": None, "error": "bad input"}
+
+
+def test_unknown_kinds_are_rejected(runner, table):
+    with pytest.raises(ValueError):
+        runner.submit(_Session(table), "user", "missing", {})
@@ -0,0 +1,19 @@
+import json
+
+from app.api.messages import _message_text
+
+
+def test_legacy_assistant_rows_are_reduced_to_their_text():
+    content = json.dumps({"text": "Revenue grew 4%.", "steps": [{"type": "table"}], "code": "x"})
+    assert _message_text("assistant", content) == "Revenue grew 4%."
+
+
+def test_malformed_legacy_rows_fall_back_to_the_stored_content():
+    truncated = '{"text": "Revenue grew'
+    assert _message_text("assistant", truncated) == truncated
+
+
+def test_other_rows_are_left_untouched():
+    literal = '{"text": "a user pasting JSON"}'
+    assert _message_text("user", literal) == literal
+    assert _message_text("assistant", "Plain answer") == "Plain answer"
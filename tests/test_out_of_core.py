@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.services import out_of_core
+from app.services.out_of_core import StreamedDataset, is_out_of_core
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(7)
+    return pd.DataFrame(
+        {
+            "ts": pd.date_range("2024-01-01", periods=5000, freq="min"),
+            "g": rng.choice(["a", "b", "c", None], size=5000),
+            "k": rng.integers(0, 3, size=5000),
+            "x": rng.normal(size=5000),
+        }
+    )
+
+
+@pytest.fixture
+def dataset(frame, tmp_path, monkeypatch):
+    # Many small batches, merged several times over
+    monkeypatch.setattr(out_of_core, "OUT_OF_CORE_BATCH_ROWS", 97)
+    monkeypatch.setattr(out_of_core, "_MERGE_EVERY", 4)
+    path = str(tmp_path / "big.parquet")
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), path, row_group_size=500)
+    return StreamedDataset(path)
+
+
+def test_incremental_aggregates_match_pandas(dataset, frame):
+    result = dataset.aggregate(by=["g", "k"], aggs={"x": ["sum", "mean", "min", "max", "count"]})
+    expected = (
+        frame.groupby(["g", "k"], dropna=False)["x"]
+        .agg(["sum", "mean", "min", "max", "count"])
+        .add_prefix("x_")
+        .reset_index()
+    )
+
+    result = result.sort_values(["g", "k"], na_position="last", ignore_index=True)
+    expected = expected.sort_values(["g", "k"], na_position="last", ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_row_counts_and_filters(dataset, frame):
+    result = dataset.aggregate(by="k", where="x > 0").sort_values("k", ignore_index=True)
+    expected = frame[frame["x"] > 0].groupby("k").size()
+
+    assert result.columns.tolist() == ["k", "rows"]
+    assert result["rows"].tolist() == expected.tolist()
+    assert dataset.count(where="x > 0") == int((frame["x"] > 0).sum())
+
+
+def test_ungrouped_aggregate_is_one_row(dataset, frame):
+    result = dataset.aggregate(aggs={"x": "mean"})
+    assert len(result) == 1
+    assert result["x"].iloc[0] == pytest.approx(frame["x"].mean())
+
+
+def test_empty_results_keep_the_group_columns(dataset):
+    by_one = dataset.aggregate(by="g", where="x > 100")
+    by_two = dataset.aggregate(by=["g", "k"], aggs={"x": ["sum", "mean"]}, where="x > 100")
+    ungrouped = dataset.aggregate(aggs={"x": "sum"}, where="x > 100")
+
+    assert (by_one.columns.tolist(), len(by_one)) == (["g", "rows"], 0)
+    assert by_two.columns.tolist() == ["g", "k", "x_sum", "x_mean"]
+    assert (ungrouped.columns.tolist(), len(ungrouped)) == (["x"], 0)
+
+
+def test_unsupported_aggregations_are_rejected(dataset):
+    with pytest.raises(ValueError, match="median"):
+        dataset.aggregate(by="g", aggs={"x": "median"})
+
+
+def test_head_stops_early_and_projects(dataset, frame):
+    head = dataset.head(5, columns=["x"], where="k == 2")
+    assert head.columns.tolist() == ["x"]
+    assert head["x"].tolist() == frame.loc[frame["k"] == 2, "x"].head(5).tolist()
+    assert dataset.head(3, where="x > 100").columns.tolist() == ["ts", "g", "k", "x"]
+
+
+def test_time_window_is_pushed_down(frame, tmp_path):
+    path = str(tmp_path / "window.parquet")
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), path, row_group_size=500)
+    window = {"column": "ts", "start": "2024-01-01T02:00:00", "stop": "2024-01-01T03:00:00"}
+    dataset = StreamedDataset(path, window)
+
+    assert dataset.num_rows == 60
+    assert dataset.pruning == {"read": 1, "pruned": 9}
+    assert dataset.column_range("k") == (0, 2)
+
+
+def test_threshold_uses_uncompressed_parquet_size(tmp_path, monkeypatch):
+    path = str(tmp_path / "zeros.parquet")
+    # ~8 MB of int64 zeros compresses to almost nothing on disk
+    pq.write_table(pa.table({"z": np.zeros(1_000_000, dtype="int64")}), path, compression="zstd")
+    monkeypatch.setattr(out_of_core, "OUT_OF_CORE_THRESHOLD_MB", 1)
+
+    assert is_out_of_core(path)
+    monkeypatch.setattr(out_of_core, "OUT_OF_CORE_THRESHOLD_MB", 0)
+    assert not is_out_of_core(path)
+    assert not is_out_of_core(str(tmp_path / "missing.parquet"))
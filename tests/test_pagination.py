@@ -0,0 +1,75 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    select,
+    tuple_,
+)
+
+from app.core.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_timezone_aware_timestamps():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    row_id = uuid.uuid4()
+    cursor = encode_cursor(created_at, row_id)
+
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+    assert decode_cursor(cursor) == (created_at, row_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "garbage", "bm90IGEgY3Vyc29y", "MjAyNHx4eXo"])
+def test_malformed_cursors_are_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+def test_keyset_pages_neither_skip_nor_repeat_rows_with_equal_timestamps():
+    """Walks pages with the same (created_at, id) predicate the list endpoints use."""
+    engine = create_engine("sqlite://")
+    rows = Table(
+        "rows",
+        MetaData(),
+        Column("id", String, primary_key=True),
+        Column("created_at", DateTime),
+        Column("n", Integer),
+    )
+    rows.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    data = [
+        # Runs of identical timestamps straddle page boundaries
+        {"id": str(uuid.UUID(int=i)), "created_at": start + timedelta(minutes=i // 4), "n": i}
+        for i in range(23)
+    ]
+    with engine.begin() as conn:
+        conn.execute(rows.insert(), data)
+
+    seen, cursor, limit = [], None, 5
+    with engine.connect() as conn:
+        while True:
+            query = select(rows)
+            if cursor:
+                created_at, row_id = decode_cursor(cursor)
+                query = query.where(
+                    tuple_(rows.c.created_at, rows.c.id) < (created_at, str(row_id))
+                )
+            page = conn.execute(
+                query.order_by(rows.c.created_at.desc(), rows.c.id.desc()).limit(limit + 1)
+            ).all()
+            seen.extend(row.n for row in page[:limit])
+            if len(page) <= limit:
+                break
+            last = page[limit - 1]
+            cursor = encode_cursor(last.created_at, uuid.UUID(last.id))
+
+    assert seen == list(range(22, -1, -1))
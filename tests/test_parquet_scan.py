@@ -0,0 +1,96 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.services.ingestion import _sort_column
+from app.services.parquet_scan import scan, slice_window, sort_column, time_window
+
+
+@pytest.fixture
+def daily(tmp_path):
+    """Ten days of hourly rows sorted by time, one day per row group."""
+    df = pd.DataFrame({"ts": pd.date_range("2024-01-01", periods=240, freq="h")})
+    df["n"] = range(len(df))
+    path = str(tmp_path / "daily.parquet")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**table.schema.metadata, b"consigliere.sort_column": b"ts"}
+    )
+    pq.write_table(table, path, row_group_size=24)
+    return path, df
+
+
+def test_end_dates_cover_their_whole_day():
+    window = time_window("ts", {"start": "2024-01-03", "end": "2024-01-04"})
+    assert window == {
+        "column": "ts",
+        "start": "2024-01-03T00:00:00",
+        "stop": "2024-01-05T00:00:00",
+    }
+
+
+def test_end_timestamps_are_kept_exact():
+    window = time_window("ts", {"end": "2024-01-04 12:30"})
+    assert window == {"column": "ts", "start": None, "stop": "2024-01-04T12:30:00"}
+
+
+@pytest.mark.parametrize(
+    "time_range",
+    [None, {}, {"start": "not a date"}, {"start": "2024-02-01", "end": "2024-01-01"}],
+)
+def test_unusable_ranges_give_no_window(time_range):
+    assert time_window("ts", time_range) is None
+    assert time_window("", {"start": "2024-01-01"}) is None
+
+
+def test_scan_reads_only_overlapping_row_groups(daily):
+    path, df = daily
+    window = time_window("ts", {"start": "2024-01-03", "end": "2024-01-04"})
+    frame, counts = scan(path, window)
+
+    assert counts == {"read": 2, "pruned": 8}
+    assert frame["ts"].min() == pd.Timestamp("2024-01-03")
+    assert frame["ts"].max() == pd.Timestamp("2024-01-04 23:00")
+    assert frame["n"].tolist() == slice_window(df, window)["n"].tolist()
+
+
+def test_scan_bounds_are_half_open(daily):
+    path, _ = daily
+    window = {"column": "ts", "start": "2024-01-02T05:00:00", "stop": "2024-01-02T07:00:00"}
+    frame, counts = scan(path, window)
+
+    assert frame["ts"].dt.hour.tolist() == [5, 6]
+    assert counts == {"read": 1, "pruned": 9}
+
+
+def test_scan_outside_the_data_reads_nothing(daily):
+    path, _ = daily
+    frame, counts = scan(path, time_window("ts", {"start": "2025-01-01"}))
+
+    assert frame.empty
+    assert list(frame.columns) == ["ts", "n"]
+    assert counts == {"read": 0, "pruned": 10}
+
+
+def test_slice_window_matches_timezones():
+    df = pd.DataFrame({"ts": pd.date_range("2024-01-01", periods=48, freq="h", tz="UTC")})
+    window = time_window("ts", {"start": "2024-01-02", "end": "2024-01-02"})
+    assert len(slice_window(df, window)) == 24
+
+
+def test_sort_column_is_read_from_file_metadata(daily, tmp_path):
+    path, _ = daily
+    assert sort_column(path) == "ts"
+    assert sort_column(str(tmp_path / "missing.parquet")) is None
+
+
+def test_ingestion_prefers_time_then_parsed_dates_then_keys():
+    assert _sort_column(pd.DataFrame({"id": [2, 1], "at": pd.to_datetime(["2024", "2023"])})) == "at"
+
+    text_dates = pd.DataFrame({"order_date": ["2024-01-02", "2024-01-01"], "v": [1, 2]})
+    assert _sort_column(text_dates) == "order_date"
+    assert pd.api.types.is_datetime64_any_dtype(text_dates["order_date"])
+
+    assert _sort_column(pd.DataFrame({"ship_date": ["soon", "2024-01-01"], "id": [2, 1]})) == "id"
+    assert _sort_column(pd.DataFrame({"name": ["a"], "v": [1.5]})) is None
@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+
+from app.services import plot_store
+from app.services.plot_store import PLOTS_URL_PREFIX, PlotStore
+
+
+class _Result:
+    def __init__(self, row):
+        self._row = row
+
+    def first(self):
+        return self._row
+
+
+class _FakeDB:
+    """Answers the per-URL reference probe from a set of referenced URLs."""
+
+    def __init__(self, referenced=()):
+        self.referenced = set(referenced)
+        self.probes = []
+
+    def execute(self, statement, params):
+        self.probes.append(params["probe"])
+        hit = any(f'"{url}"' in params["probe"] for url in self.referenced)
+        return _Result((1,) if hit else None)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(plot_store, "PLOTS_DIR", str(tmp_path))
+    monkeypatch.setattr(PlotStore, "_instance", None)
+    return PlotStore()
+
+
+def _age(url, seconds):
+    path = os.path.join(plot_store.PLOTS_DIR, url[len(PLOTS_URL_PREFIX) :])
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+    return path
+
+
+def test_identical_pngs_share_one_file(store):
+    first = store.save_png(b"png-bytes")
+    second = store.save_png(b"png-bytes")
+
+    assert first == second
+    assert store.get_stats()["plot_files"] == 1
+
+
+def test_release_keeps_plots_inside_the_grace_period(store):
+    url = store.save_png(b"fresh")
+    path = os.path.join(plot_store.PLOTS_DIR, url[len(PLOTS_URL_PREFIX) :])
+
+    assert store.release(_FakeDB(), [url]) == 0
+    assert os.path.exists(path)
+
+
+def test_reuse_refreshes_the_grace_period(store):
+    url = store.save_png(b"shared")
+    path = _age(url, plot_store.PLOT_GC_GRACE + 60)
+    store.save_png(b"shared")  # an in-flight answer reuses the chart
+
+    store.release(_FakeDB(), [url])
+    assert os.path.exists(path)
+
+
+def test_release_removes_old_unreferenced_plots_only(store):
+    orphan = store.save_png(b"orphan")
+    kept = store.save_png(b"kept")
+    orphan_path = _age(orphan, plot_store.PLOT_GC_GRACE + 60)
+    kept_path = _age(kept, plot_store.PLOT_GC_GRACE + 60)
+    db = _FakeDB(referenced=[kept])
+
+    assert store.release(db, [orphan, kept, "https://elsewhere/x.png"]) == len(b"orphan")
+    assert not os.path.exists(orphan_path)
+    assert os.path.exists(kept_path)
+    # Only the released plot URLs are probed
+    assert len(db.probes) == 2
+    assert store.get_stats()["plot_files"] == 1
+
+
+def test_plot_urls_in_steps_only_picks_stored_images():
+    steps = [
+        {"type": "image", "data": f"{PLOTS_URL_PREFIX}a.png"},
+        {"type": "image", "data": "data:image/png;base64,xx"},
+        {"type": "table", "data": f"{PLOTS_URL_PREFIX}b.png"},
+        "not a step",
+    ]
+    assert PlotStore.plot_urls_in_steps(steps) == {f"{PLOTS_URL_PREFIX}a.png"}
+    assert PlotStore.plot_urls_in_steps(None) == set()
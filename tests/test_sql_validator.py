@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from app.services.sql_validator import SQLValidator
+
+SCHEMA = json.dumps(
+    {
+        "tables": [
+            {
+                "name": "Orders",
+                "columns": [
+                    {"name": "id"},
+                    {"name": "Amount"},
+                    {"name": "customer_id"},
+                    {"name": "created_at"},
+                ],
+            },
+            {"name": "customers", "columns": [{"name": "id"}, {"name": "name"}]},
+        ]
+    }
+)
+
+
+@pytest.fixture
+def validator():
+    return SQLValidator(SCHEMA, "postgresql")
+
+
+def test_case_mistakes_are_fixed_locally(validator):
+    report = validator.check("SELECT amount FROM orders")
+
+    assert report["sql"] == 'SELECT "Amount" FROM "Orders"'
+    assert report["problems"] == []
+    assert report["fixes"] == ['orders -> "Orders"', 'amount -> "Amount"']
+
+
+def test_unknown_column_suggests_close_matches(validator):
+    report = validator.check("SELECT amout FROM Orders")
+    assert report["problems"] == [
+        "Unknown column 'amout' (tables in query: Orders). Did you mean: Amount?"
+    ]
+
+
+def test_unknown_table_lists_known_tables(validator):
+    report = validator.check("SELECT * FROM invoices")
+    assert report["problems"] == ["Unknown table 'invoices'. Known tables: Orders, customers"]
+
+
+def test_ambiguous_unqualified_column(validator):
+    report = validator.check("SELECT id FROM Orders o JOIN customers c ON o.customer_id = c.id")
+    assert report["problems"] == [
+        "Column 'id' is ambiguous: it exists in Orders, customers. "
+        "Qualify it with a table alias."
+    ]
+
+
+def test_qualified_columns_resolve_through_aliases(validator):
+    report = validator.check("SELECT o.amount, c.nme FROM Orders o JOIN customers c ON true")
+
+    assert 'o."Amount"' in report["sql"]
+    assert len(report["problems"]) == 1
+    assert report["problems"][0].startswith(
+        "Column 'nme' does not exist in table 'customers'. Did you mean: name?"
+    )
+
+
+def test_derived_tables_and_ctes_are_not_second_guessed(validator):
+    derived = validator.check("SELECT x.total FROM (SELECT SUM(Amount) AS total FROM Orders) x")
+    cte = validator.check("WITH t AS (SELECT Amount FROM Orders) SELECT foo FROM t")
+    assert derived["problems"] == []
+    assert cte["problems"] == []
+
+
+def test_string_literals_are_not_identifiers(validator):
+    report = validator.check("SELECT Amount FROM Orders WHERE created_at > 'amout'")
+    assert report["problems"] == []
+
+
+def test_mysql_double_quotes_in_comparisons_are_strings():
+    validator = SQLValidator(SCHEMA, "mysql")
+    report = validator.check('SELECT Amount FROM Orders WHERE created_at > "2024-01-01"')
+    assert report["problems"] == []
+
+
+def test_without_a_schema_nothing_is_checked():
+    validator = SQLValidator("not json", "postgresql")
+    assert not validator.enabled
+    assert validator.check("SELECT nope FROM nowhere")["problems"] == []
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from app.services import user_cache
+from app.services.user_cache import UserCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(UserCache, "_instance", None)
+    return UserCache()
+
+
+def test_hits_after_put_and_tracks_the_ratio(cache):
+    assert cache.get("token") is None
+    cache.put("token", "u1", {"id": "u1"})
+
+    assert cache.get("token") == {"id": "u1"}
+    assert cache.get_stats() == {
+        "hits": 1,
+        "misses": 1,
+        "invalidations": 0,
+        "entries": 1,
+        "hit_ratio": 0.5,
+    }
+
+
+def test_tokens_are_stored_as_digests(cache):
+    cache.put("secret-token", "u1", "user")
+    assert "secret-token" not in cache._store
+
+
+def test_entries_expire_with_the_ttl_or_the_token(cache, monkeypatch):
+    monkeypatch.setattr(user_cache, "USER_CACHE_TTL", 30)
+    cache.put("expired", "u1", "user", token_expires=time.time() - 1)
+    assert cache.get("expired") is None
+
+    monkeypatch.setattr(user_cache, "USER_CACHE_TTL", -1)
+    cache.put("stale", "u1", "user")
+    assert cache.get("stale") is None
+
+
+def test_least_recently_used_entries_are_evicted(cache, monkeypatch):
+    monkeypatch.setattr(user_cache, "USER_CACHE_MAX_ENTRIES", 2)
+    cache.put("a", "u1", "a")
+    cache.put("b", "u2", "b")
+    cache.get("a")
+    cache.put("c", "u3", "c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
+
+
+def test_invalidate_user_drops_all_their_tokens(cache):
+    cache.put("phone", "u1", "user")
+    cache.put("laptop", "u1", "user")
+    cache.put("other", "u2", "someone")
+
+    cache.invalidate_user("u1")
+    assert cache.get("phone") is None
+    assert cache.get("laptop") is None
+    assert cache.get("other") == "someone"